@@ -1,10 +1,12 @@
 """Endpoints description for api."""
 import logging
+from collections.abc import Iterator
 
+import orjson
 import sqlalchemy as sa
 from celery.result import AsyncResult
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import ORJSONResponse
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 from app.db import models
 from app.dependencies import DependsOnModel, DependsOnParser, DependsOnSession, DependsOnSettings
@@ -15,6 +17,16 @@ LOGGER = logging.getLogger(__name__)
 
 router = APIRouter(tags=["predict"])
 
+
+def _iter_ndjson(tracks_meta: Iterator[TrackMeta]) -> Iterator[bytes]:
+    """Serialize tracks meta to NDJSON lines."""
+    n_found = 0
+    for track_meta in tracks_meta:
+        n_found += 1
+        yield orjson.dumps(track_meta.to_dict()) + b"\n"
+    LOGGER.info("Stream search finished, found %s tracks.", n_found)
+
+
 @router.post(
     "/search",
     # response_model=,
@@ -29,12 +41,18 @@ router = APIRouter(tags=["predict"])
 async def search(
     song_list: list[Song],
     parser: DependsOnParser,
-) -> ORJSONResponse:
+    stream: bool = False,
+) -> Response:
     """Endpoint for search tracks meta without Auth.
 
     - **name**: track name in Spotify
     - **artist**: artist name
+    - **stream**: return NDJSON stream, each line is sent as soon as track is parsed
     """
+    if stream:
+        tracks_meta = parser.iter_parse(song_list=song_list)
+        return StreamingResponse(_iter_ndjson(tracks_meta), media_type="application/x-ndjson")
+
     tracks_meta = parser.parse(song_list=song_list)
     LOGGER.info("Search %s tracks, found %s.", len(song_list), len(tracks_meta))
     tracks_meta = list(map(TrackMeta.to_dict, tracks_meta))
@@ -1,18 +1,42 @@
 """Initital database script."""
-import ast
 import logging
 import os
 
 import boto3
 import pandas as pd
 import sqlalchemy as sa
+from botocore.exceptions import ClientError
 from sqlalchemy.orm import Session
 
 from app.config import Settings, get_settings
 from app.db import models
+from playlist_selection.tracks.catalog import (
+    CATALOG_KEY,
+    catalog_from_pandas,
+    load_catalog_from_s3,
+    save_catalog_to_s3,
+)
 
 LOGGER = logging.getLogger(__name__)
 
+LEGACY_DATASET_KEY = "dataset/filtered_data_30_11_23.csv" # Dataset of deploys created before Parquet catalog
+SONG_COLUMNS = ["track_id", "track_name", "artist_name"]
+
+
+def load_catalog(client, bucket_name: str) -> pd.DataFrame:
+    """Load song columns of catalog, catalog is created from legacy csv dataset if it doesn't exist yet."""
+    try:
+        return load_catalog_from_s3(s3_client=client, bucket_name=bucket_name, key=CATALOG_KEY, columns=SONG_COLUMNS)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+
+    LOGGER.warning("Catalog %s not found, migrate legacy dataset %s to it.", CATALOG_KEY, LEGACY_DATASET_KEY)
+    body = client.get_object(Bucket=bucket_name, Key=LEGACY_DATASET_KEY)["Body"]
+    catalog = catalog_from_pandas(pd.read_csv(body, index_col=0))
+    save_catalog_to_s3(catalog, client, bucket_name, key=CATALOG_KEY)
+    return load_catalog_from_s3(s3_client=client, bucket_name=bucket_name, key=CATALOG_KEY, columns=SONG_COLUMNS)
+
 
 def load_songs(settings: Settings):
     """Load songs data from S3."""
@@ -20,15 +44,9 @@ def load_songs(settings: Settings):
     session = boto3.Session()
     client = session.client("s3")
 
-    bucket = settings.S3_BUCKET_NAME
-    dataset_key = "dataset/filtered_data_30_11_23.csv"
-
-    body = client.get_object(Bucket=bucket, Key=dataset_key)["Body"]
-    dataset = pd.read_csv(body, index_col=0)
-
-    tracks = dataset[["track_id", "track_name", "artist_name"]].copy()
+    tracks = load_catalog(client, settings.S3_BUCKET_NAME)
     tracks = tracks.dropna()
-    tracks["artist_name"] = tracks["artist_name"].apply(ast.literal_eval)
+    tracks["artist_name"] = tracks["artist_name"].apply(list)
     tracks["link"] = tracks["track_id"].apply(lambda track_id: f"https://open.spotify.com/track/{track_id}")
     tracks = tracks.rename(columns={"track_id": "id", "track_name": "name"})
     tracks = tracks.dropna()
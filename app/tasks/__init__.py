@@ -1,4 +1,5 @@
 """Package with Celery's tasks implementation."""
+from app.tasks.crawl import crawl_chunk, download_chunk, finalize_crawl, start_crawl
 from app.tasks.predict import predict
 
-__all__ = ["predict"]
+__all__ = ["crawl_chunk", "download_chunk", "finalize_crawl", "predict", "start_crawl"]
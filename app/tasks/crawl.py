@@ -0,0 +1,204 @@
+"""Distributed crawl tasks for Celery.
+
+Crawl is a chord: its header is a group of per-chunk tasks parsing meta and downloading audio of seeds,
+they are routed to I/O queue `CRAWL_QUEUE` (see `app.worker`). Chunk tasks are idempotent: meta shards
+have content based names and existing audio is skipped, so retried or repeated chunks don't duplicate data.
+Chunk task failed after all retries returns failure report instead of raising, otherwise chord callback isn't run.
+Chord callback incrementally rescans dataset, saves catalog snapshot and trains new model version on it.
+"""
+import datetime
+import functools
+import logging
+from collections.abc import Callable
+from typing import Any
+from urllib.parse import urlsplit
+
+import boto3
+from botocore.exceptions import ClientError
+from celery import chord, group, shared_task
+from celery.result import AsyncResult
+
+from app.config import Settings, get_settings
+from playlist_selection.downloading import S3AudioDumper, YouTubeDownloader
+from playlist_selection.models import get_model_class
+from playlist_selection.parsing.crawl import CRAWL_CHUNK_SIZE, SpotifyCrawler, read_seeds
+from playlist_selection.parsing.parser import SpotifyParser
+from playlist_selection.tracks.catalog import CATALOG_KEY, catalog_from_pandas, save_catalog_to_s3
+from playlist_selection.tracks.dataset import S3Dataset
+from playlist_selection.tracks.manifest import ScanManifest
+from playlist_selection.tracks.meta import Song
+
+LOGGER = logging.getLogger(__name__)
+
+CRAWL_QUEUE = "io" # Queue of I/O bound crawl tasks
+CRAWL_MAX_RETRIES = 3 # Number of retries of failed chunk task
+SCAN_MANIFEST_KEY = "dataset/scan_manifest.json" # Manifest of last catalog snapshot scan
+
+
+def _get_s3_client(settings: Settings):
+    session = boto3.Session(profile_name=settings.S3_PROFILE_NAME or None)
+    return session.client("s3", endpoint_url=str(settings.S3_ENDPOINT_URL))
+
+
+def _report_last_failure(fn: Callable[..., dict[str, Any]]) -> Callable[..., dict[str, Any]]:
+    """Make bound chunk task return failure report on its last retry, earlier failures are retried."""
+    @functools.wraps(fn)
+    def wrapper(task, chunk_index: int, seeds: list[tuple[str, str, str]], *args, **kwargs) -> dict[str, Any]:
+        try:
+            return fn(task, chunk_index, seeds, *args, **kwargs)
+        except Exception as e:
+            if task.request.retries < task.max_retries:
+                raise
+            LOGGER.error(
+                "Task %s failed on chunk %s after %s retries.", task.name, chunk_index, task.max_retries, exc_info=e,
+            )
+            return {"chunk_index": chunk_index, "n_seeds": len(seeds), "failed_task": task.name, "error": repr(e)}
+
+    return wrapper
+
+
+@shared_task(
+    bind=True,
+    serializer="pickle",
+    acks_late=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=CRAWL_MAX_RETRIES,
+)
+@_report_last_failure
+def crawl_chunk(
+    self,
+    chunk_index: int,
+    seeds: list[tuple[str, str, str]],
+    prefix: str = "tracks",
+    file_format: str = "json",
+) -> dict[str, int]:
+    """Parse meta of seeds chunk and save it to S3 as packed shards of each genre."""
+    settings = get_settings()
+    endpoint_url = urlsplit(str(settings.S3_ENDPOINT_URL))
+    parser = SpotifyParser(
+        client_id=settings.CLIENT_ID.get_secret_value(),
+        client_secret=settings.CLIENT_SECRET.get_secret_value(),
+    )
+    crawler = SpotifyCrawler(
+        parser=parser,
+        schema=endpoint_url.scheme,
+        host=endpoint_url.netloc,
+        bucket_name=settings.S3_BUCKET_NAME,
+        prefix=prefix,
+        file_format=file_format,
+    )
+    n_tracks = crawler.crawl_chunk([(genre, Song(name=name, artist=artist)) for genre, name, artist in seeds])
+    LOGGER.info("Crawled meta of chunk %s: %s tracks of %s seeds.", chunk_index, n_tracks, len(seeds))
+    return {"chunk_index": chunk_index, "n_seeds": len(seeds), "n_tracks": n_tracks}
+
+
+@shared_task(
+    bind=True,
+    serializer="pickle",
+    acks_late=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=CRAWL_MAX_RETRIES,
+)
+@_report_last_failure
+def download_chunk(self, chunk_index: int, seeds: list[tuple[str, str, str]]) -> dict[str, int]:
+    """Download audio of seeds chunk to S3, already saved audio is skipped."""
+    settings = get_settings()
+    endpoint_url = urlsplit(str(settings.S3_ENDPOINT_URL))
+    dumper = S3AudioDumper(
+        schema=endpoint_url.scheme,
+        host=endpoint_url.netloc,
+        bucket_name=settings.S3_BUCKET_NAME,
+        # Dumper saves audio by relative path of song, prefix isn't used
+        prefix="",
+    )
+    report = YouTubeDownloader(dumper).download_audios(
+        [Song(name=name, artist=artist) for _, name, artist in seeds], progress=False,
+    )
+    LOGGER.info("Downloaded audio of chunk %s: %s.", chunk_index, report)
+    return {
+        "chunk_index": chunk_index,
+        "n_seeds": len(seeds),
+        "n_audio_tracks": report.n_tracks + report.n_skipped,
+        "n_audio_failed": report.n_failed,
+    }
+
+
+@shared_task(serializer="pickle", acks_late=True)
+def finalize_crawl(
+    results: list[dict[str, int]],
+    prefix: str = "tracks",
+    train_model: bool = True,
+) -> dict[str, Any]:
+    """Save catalog snapshot of crawled dataset and train new model version on it.
+
+    Results are of both `crawl_chunk` and `download_chunk` tasks, so tracks with meta and with audio
+    are counted separately, failure reports of chunk tasks are counted as failed chunks. Dataset is rescanned
+    incrementally with manifest of previous snapshot, so only new meta is downloaded.
+    """
+    settings = get_settings()
+    s3_client = _get_s3_client(settings)
+    try:
+        manifest = ScanManifest.load_from_s3(s3_client, settings.S3_BUCKET_NAME, SCAN_MANIFEST_KEY)
+    except ClientError:
+        manifest = None
+    dataset = S3Dataset(s3_client=s3_client, bucket_name=settings.S3_BUCKET_NAME, prefix=prefix)
+    if manifest is not None and (manifest.bucket_name, manifest.prefix) != (dataset.bucket_name, dataset.prefix):
+        manifest = None
+    dataset.scan(manifest=manifest)
+
+    catalog = dataset.to_pandas(deduplicate=True)
+    save_catalog_to_s3(catalog_from_pandas(catalog), s3_client, settings.S3_BUCKET_NAME, key=CATALOG_KEY)
+    dataset.manifest_.save_to_s3(s3_client, settings.S3_BUCKET_NAME, SCAN_MANIFEST_KEY)
+    summary = {
+        "n_chunks": len({result["chunk_index"] for result in results}),
+        "n_crawled_tracks": sum(result["n_tracks"] for result in results if "n_tracks" in result),
+        "n_downloaded_tracks": sum(result["n_audio_tracks"] for result in results if "n_audio_tracks" in result),
+        "n_failed_downloads": sum(result["n_audio_failed"] for result in results if "n_audio_failed" in result),
+        "n_failed_chunks": sum("error" in result for result in results),
+        "n_catalog_tracks": len(catalog),
+        "model_name": None,
+    }
+
+    if train_model:
+        model = get_model_class(settings.MODEL_CLASS)()
+        model.train(catalog)
+        # New version is saved next to served one, app switches to it with MODEL_NAME setting
+        summary["model_name"] = f"{settings.MODEL_CLASS.lower()}_{datetime.datetime.now():%Y%m%d_%H%M%S}"
+        model.dump(
+            bucket_name=settings.S3_BUCKET_NAME,
+            model_name=summary["model_name"],
+            profile_name=settings.S3_PROFILE_NAME or None,
+        )
+    LOGGER.info("Crawl finished: %s.", summary)
+    return summary
+
+
+def start_crawl(
+    seeds_path: str = "data/tracks.txt",
+    chunk_size: int = CRAWL_CHUNK_SIZE,
+    prefix: str = "tracks",
+    file_format: str = "json",
+    download_audio: bool = True,
+    train_model: bool = True,
+) -> AsyncResult:
+    """Fan out crawl of seed file over Celery workers.
+
+    :param str seeds_path: path to seed file with `genre<TAB>track name<TAB>artist name` lines
+    :param int chunk_size: number of seeds in single task
+    :param str prefix: dataset prefix
+    :param str file_format: "json" or "tmb" format of meta shards
+    :param bool download_audio: also download audio of seeds
+    :param bool train_model: train new model version on catalog snapshot
+
+    :return AsyncResult: result of chord callback
+    """
+    header = []
+    for chunk_index, chunk_seeds in read_seeds(seeds_path, chunk_size=chunk_size):
+        seeds = [(genre, song.name, song.artist) for genre, song in chunk_seeds]
+        header.append(crawl_chunk.s(chunk_index, seeds, prefix=prefix, file_format=file_format))
+        if download_audio:
+            header.append(download_chunk.s(chunk_index, seeds))
+    LOGGER.info("Start crawl of %s with %s tasks.", seeds_path, len(header))
+    return chord(group(header), finalize_crawl.s(prefix=prefix, train_model=train_model)).apply_async()
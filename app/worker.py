@@ -2,12 +2,15 @@
 from celery import Celery
 
 from app.config import get_settings
+from app.tasks.crawl import CRAWL_QUEUE
 
 settings = get_settings()
 
 app = Celery(
     "tasks",
     broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0",
+    # Results are used by crawl chords
+    backend=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/1",
     include=["app.tasks"],
 )
 
@@ -16,3 +19,9 @@ app.conf.event_serializer = "pickle"
 app.conf.task_serializer = "pickle"
 app.conf.result_serializer = "json"
 app.conf.accept_content = ['application/json', 'application/x-python-serialize']
+# I/O bound crawl chunks go to separate queue served by worker with thread pool,
+# like `celery -A app.worker worker -Q io --pool threads --concurrency 32`
+app.conf.task_routes = {
+    "app.tasks.crawl.crawl_chunk": {"queue": CRAWL_QUEUE},
+    "app.tasks.crawl.download_chunk": {"queue": CRAWL_QUEUE},
+}
@@ -1,6 +1,9 @@
 """CLI runner for train and infer proccesses."""
 import fire
 
+from playlist_selection.metrics.evaluation import evaluate  # noqa: F401
+from playlist_selection.metrics.sweep import sweep  # noqa: F401
+from playlist_selection.parsing.crawl import crawl  # noqa: F401
 from research.train import train  # noqa: F401
 
 # TODO: rewrite to pure argparse, it seems this might be more flexible and safe
@@ -1,4 +1,10 @@
 """Audio downloading package."""
-from .downloader import S3AudioDumper, YouTubeDownloader
+from .cache import SearchCache
+from .downloader import DownloadReport, S3AudioDumper, YouTubeDownloader
+from .manifest import DownloadManifest
+from .scheduler import AdaptiveLimit, DownloadScheduler
 
-__all__ = ["YouTubeDownloader", "S3AudioDumper"]
+__all__ = [
+    "YouTubeDownloader", "S3AudioDumper", "DownloadReport", "DownloadManifest", "AdaptiveLimit", "DownloadScheduler",
+    "SearchCache",
+]
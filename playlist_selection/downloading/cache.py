@@ -0,0 +1,92 @@
+"""Module with persistent cache of YouTube search results."""
+import sqlite3
+import threading
+import time
+
+from pydantic import BaseModel, Field
+
+YOUTUBE_SEARCH_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60 # Found videos rarely disappear
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_results (
+    query TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    itag INTEGER NOT NULL,
+    filesize INTEGER,
+    expire_time REAL NOT NULL
+)
+"""
+
+
+class SearchResult(BaseModel):
+    """Resolved audio stream of search query."""
+
+    video_id: str = Field()
+    itag: int = Field()
+    filesize: int | None = Field(default=None)
+
+
+class SearchCache:
+    """Thread safe SQLite cache of YouTube search results with expiration.
+
+    Only video id and itag of chosen stream are cached: stream urls expire in few hours,
+    so stream is resolved from video page on hit, but search request is skipped.
+    """
+
+    def __init__(self, path: str = ":memory:", ttl_seconds: float = YOUTUBE_SEARCH_CACHE_TTL_SECONDS):
+        """Constructor of cache.
+
+        :param str path: path to SQLite database, created if doesn't exist
+        :param float ttl_seconds: lifetime of search result in cache
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(_SCHEMA)
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.casefold().split())
+
+    def get(self, query: str) -> SearchResult | None:
+        """Return cached search result or None if it's missing or expired."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT video_id, itag, filesize FROM search_results WHERE query = ? AND expire_time >= ?",
+                (self._normalize_query(query), time.time()),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        video_id, itag, filesize = row
+        return SearchResult(video_id=video_id, itag=itag, filesize=filesize)
+
+    def set(self, query: str, result: SearchResult):
+        """Put search result to cache."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO search_results (query, video_id, itag, filesize, expire_time) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self._normalize_query(query), result.video_id, result.itag, result.filesize,
+                 time.time() + self.ttl_seconds),
+            )
+
+    def delete(self, query: str):
+        """Remove search result from cache, like when cached video isn't available anymore."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM search_results WHERE query = ?", (self._normalize_query(query),))
+
+    def hit_rate(self) -> float:
+        """Share of cache hits."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        """Close database connection."""
+        with self._lock:
+            self._connection.close()
@@ -1,19 +1,31 @@
 """Module with downloaders implementation."""
 import contextlib
+import os
 import shutil
 import tempfile
+import threading
 import typing as tp
 from abc import ABC, abstractmethod
 from concurrent.futures import ThreadPoolExecutor
 
 import boto3
-from pytube import Search, YouTube
+from botocore.exceptions import ClientError
+from pydantic import BaseModel, Field
+from pytube import Search, YouTube, request
+from pytube.exceptions import PytubeError
 
 from ..logging_config import get_logger
+from ..storage.s3 import S3_MULTIPART_PART_SIZE, upload_stream
 from ..tracks.meta import Song
+from .cache import SearchCache, SearchResult
+from .manifest import COMPLETED, DONE_STATUSES, FAILED, SKIPPED, DownloadManifest
+from .scheduler import RETRY_BACKOFF_SECONDS, SEARCH_MAX_WORKERS, DownloadScheduler, SchedulerStats
 
 LOGGER = get_logger(__name__)
 
+EXISTING_HEAD_MAX_PATHS = 1000 # Larger batches of paths are checked by listing keys instead of HEAD per key
+EXISTING_N_JOBS = 8 # Number of concurrent HEAD requests
+
 class BaseDownloader(ABC):
     """Base downloader class."""
     @abstractmethod
@@ -35,6 +47,27 @@ class BaseAudioDumper(ABC):
         """Save song from file_path."""
         pass
 
+    def dump_audio_stream(self, song: Song, chunks: tp.Iterable[bytes]) -> int:
+        """Save song from stream of chunks.
+
+        By default stream is written to temporary file and saved with `dump_audio`.
+
+        :param song Song: song
+        :param chunks Iterable[bytes]: audio content
+        :return int n_bytes: size of saved audio
+        """
+        with make_temp_directory() as temp_dir:
+            file_path = os.path.join(temp_dir, "audio.mp3")
+            with open(file_path, "wb") as fout:
+                for chunk in chunks:
+                    fout.write(chunk)
+            self.dump_audio(song=song, file_path=file_path)
+            return os.path.getsize(file_path)
+
+    def get_existing_paths(self, paths: tp.Iterable[str]) -> set[str]:
+        """Return relative paths of already saved audio, by default nothing is considered saved."""
+        return set()
+
     @staticmethod
     def get_relative_path(song: Song) -> str:
         """Return relative path to file for save."""
@@ -55,6 +88,7 @@ class S3AudioDumper(BaseAudioDumper):
         prefix: str,
         aws_access_key_id: str | None = None,
         aws_secret_access_key: str | None = None,
+        part_size: int = S3_MULTIPART_PART_SIZE,
     ):
         """Constructor for S3 dumper.
 
@@ -64,8 +98,10 @@ class S3AudioDumper(BaseAudioDumper):
         :param prefix str: save prefix on s3 bucket
         :param aws_access_key_id str | None: aws s3 access key id (statical)
         :param aws_secret_access_key str | None: aws s3 secret key (statical)
+        :param part_size int: size of multipart upload part for streamed audio
         """
         self.bucket_name = bucket_name
+        self.part_size = part_size
         self._s3_client = boto3.client(
             "s3",
             aws_access_key_id=aws_access_key_id,
@@ -83,6 +119,49 @@ class S3AudioDumper(BaseAudioDumper):
             Key=save_path,
         )
 
+    def dump_audio_stream(self, song: Song, chunks: tp.Iterable[bytes]) -> int:
+        """Save song from stream of chunks with multipart upload, audio isn't written to disk."""
+        save_path = self.get_relative_path(song)
+        LOGGER.info("Stream audio to S3 with key '%s'.", save_path)
+        return upload_stream(
+            self._s3_client, self.bucket_name, save_path, chunks, part_size=self.part_size,
+        )
+
+    def get_existing_paths(self, paths: tp.Iterable[str]) -> set[str]:
+        """Return relative paths of audio existing in bucket.
+
+        Small batches are checked with concurrent HEAD request per key. For batches larger than
+        `EXISTING_HEAD_MAX_PATHS` keys between smallest and largest path are listed in pages of 1000 keys,
+        it takes fewer requests unless bucket has much more keys than 1000 per path of batch.
+        """
+        paths = set(paths)
+        if not paths:
+            return set()
+        if len(paths) <= EXISTING_HEAD_MAX_PATHS:
+            with ThreadPoolExecutor(max_workers=min(EXISTING_N_JOBS, len(paths))) as executor:
+                return {path for path, exists in zip(paths, executor.map(self._exists, paths)) if exists}
+
+        first_path, last_path = min(paths), max(paths)
+        existing = set()
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        # Listing starts after given key, so start before first path
+        for page in paginator.paginate(Bucket=self.bucket_name, StartAfter=first_path[:-1]):
+            for obj in page.get("Contents", []):
+                if obj["Key"] > last_path:
+                    return existing
+                if obj["Key"] in paths:
+                    existing.add(obj["Key"])
+        return existing
+
+    def _exists(self, path: str) -> bool:
+        try:
+            self._s3_client.head_object(Bucket=self.bucket_name, Key=path)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
 
 @contextlib.contextmanager
 def make_temp_directory():
@@ -102,65 +181,264 @@ def _fix_song(song: Song | tuple):
             raise ValueError(f"Incorrect song format - {song}.")
     return song
 
+class DownloadReport(BaseModel):
+    """Audio download statistics."""
+
+    n_tracks: int = Field(default=0)
+    n_failed: int = Field(default=0)
+    n_skipped: int = Field(default=0)
+    n_resumed: int = Field(default=0)
+    n_retries: int = Field(default=0)
+    n_fallbacks: int = Field(default=0)
+    n_bytes: int = Field(default=0)
+    n_workers: int = Field(default=1)
+    peak_disk_bytes: int = Field(default=0)
+    elapsed_seconds: float = Field(default=0.0)
+
+    @property
+    def bytes_per_second_per_worker(self) -> float:
+        """Download throughput of single worker in bytes."""
+        return self.n_bytes / self.elapsed_seconds / self.n_workers if self.elapsed_seconds else 0.0
+
+    def __str__(self) -> str:
+        """Human readable report."""
+        return (
+            f"saved {self.n_tracks} tracks ({self.n_failed} failed, {self.n_skipped} already in storage, "
+            f"{self.n_resumed} done in previous runs, {self.n_retries} retries, {self.n_fallbacks} via temp files, "
+            f"{self.n_bytes / 2 ** 20:.2f} MB) in {self.elapsed_seconds:.2f}s: "
+            f"{self.bytes_per_second_per_worker / 2 ** 10:.1f} KB/s per worker, "
+            f"peak disk usage {self.peak_disk_bytes / 2 ** 20:.2f} MB"
+        )
+
+
 class YouTubeDownloader(BaseDownloader):
     """YouTube mp3 downloader class."""
 
-    def __init__(self, audio_dumper: BaseAudioDumper):
-        """Constructor of Downloader."""
+    def __init__(
+        self,
+        audio_dumper: BaseAudioDumper,
+        streaming: bool = True,
+        search_cache: SearchCache | None = None,
+    ):
+        """Constructor of Downloader.
+
+        :param audio_dumper BaseAudioDumper: dumper saving downloaded audio
+        :param streaming bool: stream audio to dumper without temp files,
+            temp files are used only to retry failed streams
+        :param search_cache SearchCache | None: persistent cache of search results, like SearchCache("search.sqlite")
+        """
         if not isinstance(audio_dumper, BaseAudioDumper):
             raise TypeError(f"Invalid value of audio dumper with type {type(audio_dumper)}.")
         self._audio_dumper = audio_dumper
+        self.streaming = streaming
+        self.search_cache = search_cache
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._report = DownloadReport()
+
+    def _add_disk_usage(self, n_bytes: int):
+        with self._lock:
+            self._disk_bytes += n_bytes
+            self._report.peak_disk_bytes = max(self._report.peak_disk_bytes, self._disk_bytes)
 
 
     def search_track_audio(self, song: Song | tuple) -> YouTube:
         """Search and return video metadata for mp3 download.
 
+        With search cache cached video and stream are resolved without search request.
+        Cached video which is removed, private or has no cached stream anymore is searched again.
+
         :param song Song | tp.Tuple: tuple, like (artist_name, song_name)
         :return YouTube: class with YouTube song metadata
         """
-        youtube_video = Search(f"{song.name} by {song.artist}").results[0]
+        query = f"{song.name} by {song.artist}"
+        if self.search_cache is not None and (cached := self.search_cache.get(query)) is not None:
+            try:
+                yt_video_metadata = YouTube.from_id(cached.video_id).streams.get_by_itag(cached.itag)
+            except PytubeError as e:
+                LOGGER.warning("Cached video of '%s' isn't available (%r), search again.", query, e)
+            else:
+                if yt_video_metadata is not None:
+                    return yt_video_metadata
+                LOGGER.warning("Cached stream of '%s' isn't available, search again.", query)
+            self.search_cache.delete(query)
+
+        youtube_video = Search(query).results[0]
         yt_video_metadata = youtube_video.streams.filter(only_audio=True).first()
 
+        if self.search_cache is not None and yt_video_metadata is not None:
+            self.search_cache.set(query, SearchResult(
+                video_id=youtube_video.video_id,
+                itag=yt_video_metadata.itag,
+                filesize=yt_video_metadata.filesize_approx,
+            ))
         return yt_video_metadata
 
 
-    def download_single_audio(self, song: Song | tuple, temp_dir: str = None) -> None:
+    def download_single_audio(self, song: Song | tuple, temp_dir: str = None, yt_video_metadata: tp.Any = None) -> str:
         """Download single audio to local fs.
 
         :param song Song | tp.Tuple: Song or tuple, like (artist_name, song_name)
         :param temp_dir: str | None: local directory for downloading
-        :return None
+        :param yt_video_metadata: audio stream found by `search_track_audio`, searched if not passed
+        :return str result_path: path to downloaded audio
         """
         song = _fix_song(song)
         if temp_dir is None:
             temp_dir = "."
 
-        self.yt_video_metadata = self.search_track_audio(song=song)
+        self.yt_video_metadata = yt_video_metadata or self.search_track_audio(song=song)
         result_path = f"{temp_dir}/{song.name}-{song.artist}.mp3"
         LOGGER.info("Download mp3 to %s.", result_path)
         self.yt_video_metadata.download(filename=result_path)
         return result_path
 
-    def download_and_save_audio(self, song: Song | tuple) -> None:
-        """Downloading mp3 audio to local temp and then to s3.
+    def stream_single_audio(self, song: Song | tuple, yt_video_metadata: tp.Any = None) -> tp.Iterator[bytes]:
+        """Return iterator of audio chunks, audio is downloaded while iterator is consumed.
 
-        :param song Song | Tuple: song or tuple, like (artist_name, song_name)
-        :return None
+        :param song Song | tp.Tuple: Song or tuple, like (artist_name, song_name)
+        :param yt_video_metadata: audio stream found by `search_track_audio`, searched if not passed
+        :return Iterator[bytes]: audio chunks
         """
         song = _fix_song(song)
-        with make_temp_directory() as temp_dir:
-            result_path = self.download_single_audio(song=song, temp_dir=temp_dir)
-            self._audio_dumper.dump_audio(song=song, file_path=result_path)
+        yt_video_metadata = yt_video_metadata or self.search_track_audio(song=song)
+        return request.stream(yt_video_metadata.url)
 
+    def _download_with_temp_file(self, song: Song, yt_video_metadata: tp.Any = None) -> int:
+        with make_temp_directory() as temp_dir:
+            result_path = self.download_single_audio(
+                song=song, temp_dir=temp_dir, yt_video_metadata=yt_video_metadata,
+            )
+            n_bytes = os.path.getsize(result_path)
+            self._add_disk_usage(n_bytes)
+            try:
+                self._audio_dumper.dump_audio(song=song, file_path=result_path)
+            finally:
+                self._add_disk_usage(-n_bytes)
+        return n_bytes
+
+    def download_and_save_audio(self, song: Song | tuple, yt_video_metadata: tp.Any = None) -> int:
+        """Download mp3 audio and save it with dumper.
+
+        With streaming audio is piped to dumper in chunks, failed stream is retried
+        via local temp file. Otherwise audio is downloaded to local temp and then dumped.
 
-    def download_audios(self, song_list: list[Song | tuple], max_workers_num: int = 9) -> None:
+        :param song Song | Tuple: song or tuple, like (artist_name, song_name)
+        :param yt_video_metadata: audio stream found by `search_track_audio`, searched if not passed
+        :return int n_bytes: size of saved audio
+        """
+        song = _fix_song(song)
+        yt_video_metadata = yt_video_metadata or self.search_track_audio(song=song)
+        if self.streaming:
+            try:
+                chunks = self.stream_single_audio(song, yt_video_metadata=yt_video_metadata)
+                return self._audio_dumper.dump_audio_stream(song=song, chunks=chunks)
+            except Exception as e:
+                LOGGER.warning("Failed to stream %s, retry with temp file: %s.", song, e)
+                with self._lock:
+                    self._report.n_fallbacks += 1
+        return self._download_with_temp_file(song, yt_video_metadata=yt_video_metadata)
+
+
+    def download_audios(
+        self,
+        song_list: list[Song | tuple],
+        max_workers_num: int = 9,
+        manifest: DownloadManifest | None = None,
+        skip_existing: bool = True,
+        max_retries: int = 2,
+        retry_backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+        search_max_workers: int = SEARCH_MAX_WORKERS,
+        postprocess: tp.Callable[[str, Song, int], tp.Any] | None = None,
+        n_processes: int | None = None,
+        progress: bool = True,
+    ) -> DownloadReport:
         """Feature for downloading tracks by artist name and song title and then uploading to s3 immediately.
 
+        Job is idempotent: songs completed according to manifest or already saved by dumper are skipped,
+        so rerun after crash does only remaining work. Search and download run in separate pools,
+        concurrency of each adapts to its latency and errors, see `scheduler.DownloadScheduler`.
+        Failed stages are retried with exponential backoff, then song is logged, counted in report
+        and marked as failed in manifest to be retried by next run.
+
         :param song_list tp.List: List of tuples, like (artist_name, song_name)
-        :param max_workers_num int: number of workers for ThreadPoolExecutor
-        :return None
+        :param max_workers_num int: max number of concurrent downloads
+        :param manifest DownloadManifest | None: manifest of processed songs, like DownloadManifest("audio.sqlite")
+        :param skip_existing bool: check in single batch which songs are already saved by dumper
+        :param max_retries int: number of retries of single stage
+        :param retry_backoff_seconds float: base of exponential backoff between retries
+        :param search_max_workers int: max number of concurrent searches
+        :param postprocess Callable | None: picklable CPU-bound postprocess(path, song, n_bytes) of saved songs
+            run in process pool, path is relative path of saved audio, like its key in S3 bucket,
+            results are saved to `postprocess_results_` attribute by relative path
+        :param n_processes int | None: size of process pool for postprocess
+        :param progress bool: show progress bar with live counters
+        :return DownloadReport: download statistics
         """
-        song_list = [_fix_song(song) for song in song_list]
+        songs = {}
+        for song in song_list:
+            song = _fix_song(song)
+            songs.setdefault(self._audio_dumper.get_relative_path(song), song)
+
+        report = DownloadReport()
+        if manifest is not None:
+            done = {path for path, status in manifest.get_statuses(songs).items() if status in DONE_STATUSES}
+            report.n_resumed = len(done)
+            songs = {path: song for path, song in songs.items() if path not in done}
+        if skip_existing:
+            existing = self._audio_dumper.get_existing_paths(songs)
+            report.n_skipped = len(existing)
+            if manifest is not None:
+                manifest.mark_many(existing, SKIPPED)
+            songs = {path: song for path, song in songs.items() if path not in existing}
+        self._report = report
+
+        def on_result(path: str, n_bytes: int | None, error: BaseException | None, attempts: int):
+            song = songs[path]
+            if error is not None:
+                LOGGER.error("Failed to download %s.", song, exc_info=error)
+                with self._lock:
+                    report.n_failed += 1
+                if manifest is not None:
+                    manifest.mark(path, FAILED, attempts=attempts, error=repr(error))
+                return
+            with self._lock:
+                report.n_tracks += 1
+                report.n_bytes += n_bytes
+            if manifest is not None:
+                manifest.mark(path, COMPLETED, attempts=attempts)
+
+        scheduler = DownloadScheduler(
+            search_fn=self.search_track_audio,
+            download_fn=self.download_and_save_audio,
+            postprocess_fn=postprocess,
+            search_max_workers=search_max_workers,
+            download_max_workers=max_workers_num,
+            n_processes=n_processes,
+            max_retries=max_retries,
+            retry_backoff_seconds=retry_backoff_seconds,
+            progress=progress,
+        )
+        cache_hits, cache_misses = (
+            (self.search_cache.hits, self.search_cache.misses) if self.search_cache is not None else (0, 0)
+        )
         LOGGER.info("start multiprocess audio downloading")
-        with ThreadPoolExecutor(min(max_workers_num, len(song_list))) as executor:
-            list(executor.map(lambda x: self.download_and_save_audio(x), song_list))
+        stats: SchedulerStats = scheduler.run(songs.items(), on_result=on_result, total=len(songs))
+        self.postprocess_results_ = scheduler.postprocess_results_
+
+        report.n_retries = stats.search.n_retries + stats.download.n_retries
+        report.n_workers = max(stats.download.peak_in_flight, 1)
+        report.elapsed_seconds = stats.elapsed_seconds
+        LOGGER.info(
+            "Downloaded audio: %s. Concurrency of search %.1f (peak %s), of download %.1f (peak %s).",
+            report, stats.search.limit, stats.search.peak_in_flight, stats.download.limit,
+            stats.download.peak_in_flight,
+        )
+        if self.search_cache is not None:
+            run_hits = self.search_cache.hits - cache_hits
+            run_total = run_hits + self.search_cache.misses - cache_misses
+            LOGGER.info(
+                "Search cache hit rate %.1f%% (%s of %s searches).",
+                100 * run_hits / run_total if run_total else 0.0, run_hits, run_total,
+            )
+        return report
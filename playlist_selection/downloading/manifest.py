@@ -0,0 +1,88 @@
+"""Module with manifest of bulk audio download jobs."""
+import sqlite3
+import threading
+import time
+import typing as tp
+
+COMPLETED = "completed"
+FAILED = "failed"
+SKIPPED = "skipped" # Audio already exists in storage
+DONE_STATUSES = (COMPLETED, SKIPPED) # Songs with these statuses aren't downloaded again
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    path TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL
+)
+"""
+_MAX_VARIABLES = 500 # Max number of parameters in single sqlite query
+
+
+class DownloadManifest:
+    """Thread safe SQLite manifest of songs processed by download jobs.
+
+    Songs are keyed by relative audio path of dumper, each status update is committed immediately,
+    so after crash rerun of job skips all songs finished before it.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """Constructor of manifest.
+
+        :param str path: path to SQLite database, created if doesn't exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(_SCHEMA)
+
+    def get_statuses(self, paths: tp.Iterable[str]) -> dict[str, str]:
+        """Return statuses of songs present in manifest."""
+        paths = list(paths)
+        statuses = {}
+        with self._lock:
+            for start in range(0, len(paths), _MAX_VARIABLES):
+                batch = paths[start:start + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    f"SELECT path, status FROM songs WHERE path IN ({', '.join('?' * len(batch))})", batch,
+                )
+                statuses.update(rows)
+        return statuses
+
+    def mark(self, path: str, status: str, attempts: int = 0, error: str | None = None):
+        """Save status of song, attempts of run are added to attempts of previous runs."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO songs (path, status, attempts, error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET status = excluded.status, attempts = attempts + excluded.attempts, "
+                "error = excluded.error, updated_at = excluded.updated_at",
+                (path, status, attempts, error, time.time()),
+            )
+
+    def get_attempts(self, path: str) -> int:
+        """Return total number of download attempts of song over all runs."""
+        with self._lock:
+            row = self._connection.execute("SELECT attempts FROM songs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def mark_many(self, paths: tp.Iterable[str], status: str):
+        """Save same status of many songs in single transaction."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO songs (path, status, attempts, error, updated_at) VALUES (?, ?, 0, NULL, ?)",
+                ((path, status, now) for path in paths),
+            )
+
+    def summary(self) -> dict[str, int]:
+        """Return number of songs by status."""
+        with self._lock:
+            return dict(self._connection.execute("SELECT status, COUNT(*) FROM songs GROUP BY status"))
+
+    def close(self):
+        """Close database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,301 @@
+"""Module with adaptive scheduler of two-stage (search, then download) jobs.
+
+Each stage has its own thread pool, number of concurrent items of stage is limited by `AdaptiveLimit`:
+limit grows additively while items finish faster than target latency and shrinks multiplicatively
+on errors and slow items (AIMD, like TCP congestion control). Item waits for download slot before
+it releases search slot, so search doesn't run ahead of slow downloads.
+"""
+import collections
+import contextlib
+import threading
+import time
+import typing as tp
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from pydantic import BaseModel, Field
+from tqdm.auto import tqdm
+
+from ..logging_config import get_logger
+
+LOGGER = get_logger(__name__)
+
+SEARCH_MAX_WORKERS = 16 # Max number of concurrent searches
+DOWNLOAD_MAX_WORKERS = 32 # Max number of concurrent downloads
+SEARCH_TARGET_LATENCY_SECONDS = 5.0 # Slower searches decrease concurrency
+DOWNLOAD_TARGET_LATENCY_SECONDS = 60.0 # Slower downloads decrease concurrency
+RETRY_BACKOFF_SECONDS = 0.5 # Base of exponential backoff between retries of stage
+
+
+class AdaptiveLimit:
+    """Thread safe AIMD concurrency limit."""
+
+    def __init__(
+        self,
+        max_limit: int,
+        target_latency_seconds: float,
+        initial_limit: int | None = None,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+    ):
+        """Constructor of limit.
+
+        :param int max_limit: max number of concurrent items
+        :param float target_latency_seconds: limit grows while items are faster
+        :param int | None initial_limit: initial number of concurrent items, by default half of max_limit
+        :param int min_limit: min number of concurrent items
+        :param float decrease_factor: limit is multiplied by it on error or slow item
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_latency_seconds = target_latency_seconds
+        self.decrease_factor = decrease_factor
+        self.limit = float(initial_limit or max(max_limit // 2, min_limit))
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._condition = threading.Condition()
+        self._last_decrease_time = -float("inf")
+
+    def acquire(self):
+        """Wait for free slot and take it."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self):
+        """Free slot."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, latency_seconds: float | None):
+        """Adapt limit to latency of finished call, None means failed call."""
+        with self._condition:
+            now = time.monotonic()
+            if latency_seconds is not None and latency_seconds <= self.target_latency_seconds:
+                # Additive increase: about +1 after limit fast calls
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            elif now - self._last_decrease_time >= self.target_latency_seconds:
+                # Multiplicative decrease at most once per target latency, calls in flight see same congestion
+                self.limit = max(self.limit * self.decrease_factor, self.min_limit)
+                self._last_decrease_time = now
+            self._condition.notify_all()
+
+
+class StageStats(BaseModel):
+    """Statistics of single scheduler stage."""
+
+    n_completed: int = Field(default=0)
+    n_failed: int = Field(default=0)
+    n_retries: int = Field(default=0)
+    limit: float = Field(default=0.0)
+    peak_in_flight: int = Field(default=0)
+
+
+class SchedulerStats(BaseModel):
+    """Statistics of scheduler run."""
+
+    search: StageStats = Field(default_factory=StageStats)
+    download: StageStats = Field(default_factory=StageStats)
+    postprocess: StageStats = Field(default_factory=StageStats)
+    n_bytes: int = Field(default=0)
+    elapsed_seconds: float = Field(default=0.0)
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Download throughput in bytes."""
+        return self.n_bytes / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class DownloadScheduler:
+    """Scheduler of items going through search, download and optional CPU-bound postprocess stages."""
+
+    def __init__(
+        self,
+        search_fn: tp.Callable[[tp.Any], tp.Any],
+        download_fn: tp.Callable[[tp.Any, tp.Any], tp.Any],
+        postprocess_fn: tp.Callable[[tp.Any, tp.Any], tp.Any] | None = None,
+        search_max_workers: int = SEARCH_MAX_WORKERS,
+        download_max_workers: int = DOWNLOAD_MAX_WORKERS,
+        n_processes: int | None = None,
+        max_retries: int = 2,
+        retry_backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+        search_target_latency_seconds: float = SEARCH_TARGET_LATENCY_SECONDS,
+        download_target_latency_seconds: float = DOWNLOAD_TARGET_LATENCY_SECONDS,
+        progress: bool = True,
+    ):
+        """Constructor of scheduler.
+
+        :param Callable search_fn: search_fn(item) returns what to download
+        :param Callable download_fn: download_fn(item, search_result) returns number of bytes or other result
+        :param Callable | None postprocess_fn: picklable postprocess_fn(key, item, download_result) run in process pool,
+            results are saved to `postprocess_results_` attribute
+        :param int search_max_workers: max number of concurrent searches
+        :param int download_max_workers: max number of concurrent downloads
+        :param int | None n_processes: size of process pool for postprocess, number of CPUs by default
+        :param int max_retries: number of retries of stage for single item
+        :param float retry_backoff_seconds: base of exponential backoff between retries
+        :param float search_target_latency_seconds: target latency of search
+        :param float download_target_latency_seconds: target latency of download
+        :param bool progress: show progress bar with live counters
+        """
+        self.search_fn = search_fn
+        self.download_fn = download_fn
+        self.postprocess_fn = postprocess_fn
+        self.n_processes = n_processes
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.progress = progress
+        self.search_limit = AdaptiveLimit(search_max_workers, search_target_latency_seconds)
+        self.download_limit = AdaptiveLimit(download_max_workers, download_target_latency_seconds)
+        self._lock = threading.Lock()
+
+    def _run_stage(
+        self,
+        key: tp.Hashable,
+        fn: tp.Callable[..., tp.Any],
+        limit: AdaptiveLimit,
+        stats: StageStats,
+        *args: tp.Any,
+    ) -> tp.Any:
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self._attempts[key] += 1
+            start_time = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                limit.record(None)
+                if attempt == self.max_retries:
+                    with self._lock:
+                        stats.n_failed += 1
+                    raise
+                LOGGER.warning("Failed %s (attempt %s): %s.", args[0], attempt + 1, e)
+                with self._lock:
+                    stats.n_retries += 1
+                time.sleep(self.retry_backoff_seconds * 2 ** attempt)
+            else:
+                limit.record(time.perf_counter() - start_time)
+                with self._lock:
+                    stats.n_completed += 1
+                return result
+
+    def run(
+        self,
+        items: tp.Iterable[tuple[tp.Hashable, tp.Any]],
+        on_result: tp.Callable[[tp.Hashable, tp.Any, BaseException | None, int], None] | None = None,
+        total: int | None = None,
+    ) -> SchedulerStats:
+        """Run all items through stages.
+
+        :param Iterable items: pairs of (key, item), consumed lazily as search slots free up
+        :param Callable | None on_result: on_result(key, download_result, error, attempts) called from worker threads
+            when item is downloaded or failed, attempts is number of calls of all stages including retries
+        :param int | None total: number of items for progress bar
+
+        :return SchedulerStats stats: statistics of run
+        """
+        stats = SchedulerStats()
+        self.postprocess_results_ = {}
+        self._attempts = collections.Counter()
+        start_time = time.perf_counter()
+        n_pending = 0
+        pending_condition = threading.Condition()
+
+        def finish_pending():
+            nonlocal n_pending
+            with pending_condition:
+                n_pending -= 1
+                pending_condition.notify_all()
+
+        def finish(key: tp.Hashable, result: tp.Any, error: BaseException | None):
+            with self._lock:
+                if error is None and isinstance(result, int):
+                    stats.n_bytes += result
+                attempts = self._attempts.pop(key)
+            try:
+                if on_result is not None:
+                    on_result(key, result, error, attempts)
+            except Exception as e:
+                # Item is finished anyway, otherwise run waits for it forever
+                LOGGER.error("Failed to handle result of %s.", key, exc_info=e)
+            finally:
+                with self._lock:
+                    progress.update()
+                    elapsed_seconds = time.perf_counter() - start_time
+                    progress.set_postfix(
+                        search=f"{self.search_limit.in_flight}/{int(self.search_limit.limit)}",
+                        download=f"{self.download_limit.in_flight}/{int(self.download_limit.limit)}",
+                        failed=stats.search.n_failed + stats.download.n_failed,
+                        MBps=f"{stats.n_bytes / elapsed_seconds / 2 ** 20:.2f}" if elapsed_seconds else "0",
+                        refresh=False,
+                    )
+                finish_pending()
+
+        def postprocess_done(key: tp.Hashable, future: Future):
+            try:
+                self.postprocess_results_[key] = future.result()
+            except Exception as e:
+                LOGGER.error("Failed to postprocess %s.", key, exc_info=e)
+                with self._lock:
+                    stats.postprocess.n_failed += 1
+            else:
+                with self._lock:
+                    stats.postprocess.n_completed += 1
+            finish_pending()
+
+        def download(key: tp.Hashable, item: tp.Any, found: tp.Any):
+            nonlocal n_pending
+            try:
+                result = self._run_stage(key, self.download_fn, self.download_limit, stats.download, item, found)
+            except Exception as e:
+                self.download_limit.release()
+                finish(key, None, e)
+                return
+            self.download_limit.release()
+            if process_executor is not None:
+                with pending_condition:
+                    n_pending += 1
+                try:
+                    future = process_executor.submit(self.postprocess_fn, key, item, result)
+                except Exception as e:
+                    # Submit fails on broken pool, item is counted as failed postprocess
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(lambda future: postprocess_done(key, future))
+            finish(key, result, None)
+
+        def search(key: tp.Hashable, item: tp.Any):
+            try:
+                found = self._run_stage(key, self.search_fn, self.search_limit, stats.search, item)
+            except Exception as e:
+                self.search_limit.release()
+                finish(key, None, e)
+                return
+            # Backpressure: search slot is kept until download slot is free
+            self.download_limit.acquire()
+            self.search_limit.release()
+            download_executor.submit(download, key, item, found)
+
+        postprocess_context = (
+            ProcessPoolExecutor(self.n_processes) if self.postprocess_fn is not None else contextlib.nullcontext()
+        )
+        with (
+            ThreadPoolExecutor(self.search_limit.max_limit) as search_executor,
+            ThreadPoolExecutor(self.download_limit.max_limit) as download_executor,
+            postprocess_context as process_executor,
+            tqdm(total=total, unit="song", disable=not self.progress) as progress,
+        ):
+            for key, item in items:
+                self.search_limit.acquire()
+                with pending_condition:
+                    n_pending += 1
+                search_executor.submit(search, key, item)
+            with pending_condition:
+                pending_condition.wait_for(lambda: n_pending == 0)
+
+        stats.elapsed_seconds = time.perf_counter() - start_time
+        for stage_stats, limit in ((stats.search, self.search_limit), (stats.download, self.download_limit)):
+            stage_stats.limit = limit.limit
+            stage_stats.peak_in_flight = limit.peak_in_flight
+        return stats
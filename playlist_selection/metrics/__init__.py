@@ -1,4 +1,5 @@
 """Package for metrics."""
+from .evaluation import evaluate_model, get_metrics
 from .metrics import (
     CorrectAlbumShare,
     CorrectArtistShare,
@@ -15,4 +16,6 @@ __all__ = [
     "CorrectArtistShare",
     "YearMeanDiff",
     "SoundParametersDiff",
+    "evaluate_model",
+    "get_metrics",
 ]
@@ -0,0 +1,204 @@
+"""Module with out-of-core evaluation of model over Parquet catalog.
+
+Queries are read from catalog in batches, neighbours of each batch are found with model and metrics
+accumulate (true, predicted) pairs of batch with `BasicMetric.update`. Predicted values are gathered
+from targets of train tracks by neighbour indexes, so only these targets (columns compared by metrics)
+and single batch are kept in memory, but never whole n x k x features tensor of queries. Memory still
+grows linearly with size of train catalog: its targets and fitted model are fully in memory.
+"""
+import os
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from tqdm.auto import tqdm
+
+from ..logging_config import get_logger
+from ..models import KnnModel
+from ..models.model import DROP_COLUMNS, drop_query_neighbors
+from ..tracks.catalog import iter_catalog, read_catalog
+from .metrics import (
+    BasicMetric,
+    CorrectAlbumShare,
+    CorrectArtistShare,
+    CorrectGenreShare,
+    CorrectMultipleGenreShare,
+    SoundParametersDiff,
+    YearMeanDiff,
+)
+
+LOGGER = get_logger(__name__)
+
+EVALUATION_BATCH_SIZE = 4096 # Number of queries in single batch
+ENV_PREFIX = "PLAYLIST_SELECTION_" # Same as in app settings
+SOUND_COLUMNS = [
+    "danceability",
+    "energy",
+    "loudness",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "valence",
+    "tempo",
+] # Audio features compared by SoundParametersDiff
+METRIC_TARGETS = {
+    "CorrectGenreShare": "genre",
+    "CorrectMultipleGenreShare": "genres",
+    "CorrectAlbumShare": "album_name",
+    "CorrectArtistShare": "artist_name",
+    "YearMeanDiff": "album_year",
+    "SoundParametersDiff": "sound_parameters",
+} # Target compared by each metric
+TARGET_COLUMNS = ["track_id", "genre", "genres", "album_name", "artist_name", "album_release_date", *SOUND_COLUMNS]
+LABELS_TARGETS = ["genres", "artist_name"]
+
+
+def get_metrics() -> list[BasicMetric]:
+    """Create all available metrics."""
+    return [
+        CorrectGenreShare(),
+        CorrectMultipleGenreShare(),
+        CorrectAlbumShare(),
+        CorrectArtistShare(),
+        YearMeanDiff(),
+        SoundParametersDiff(),
+    ]
+
+
+def get_targets(dataset: pd.DataFrame, track_ids: tp.Sequence[str] | None = None) -> dict[str, np.ndarray]:
+    """Get values compared by metrics from catalog dataframe.
+
+    Args:
+        dataset: catalog dataframe with `TARGET_COLUMNS`
+        track_ids: order of returned rows, like train tracks of model; by default order of dataset
+
+    Returns:
+        Mapping of target name (see `METRIC_TARGETS`) to array with value of each track
+    """
+    targets = pd.DataFrame({
+        "genre": dataset["genre"].astype(object).to_numpy(),
+        "genres": dataset["genres"].to_numpy(),
+        "album_name": dataset["album_name"].astype(object).to_numpy(),
+        "artist_name": dataset["artist_name"].to_numpy(),
+        "album_year": pd.to_datetime(dataset["album_release_date"], errors="coerce").dt.year.to_numpy(dtype=float),
+    }, index=dataset["track_id"].to_numpy())
+    sound_parameters = dataset[SOUND_COLUMNS].to_numpy(dtype=float, na_value=np.nan)
+    if track_ids is not None:
+        rows = pd.Index(targets.index).get_indexer(track_ids)
+        targets = targets.iloc[rows].set_axis(track_ids, axis=0)
+        sound_parameters = sound_parameters[rows]
+        # Tracks missing in dataset get empty values
+        targets.loc[rows < 0] = None
+        sound_parameters[rows < 0] = np.nan
+
+    arrays = {column: targets[column].to_numpy() for column in targets.columns}
+    arrays["album_year"] = arrays["album_year"].astype(float)
+    for column in LABELS_TARGETS:
+        arrays[column] = np.array(
+            [labels if isinstance(labels, list | tuple | np.ndarray) else () for labels in arrays[column]],
+            dtype=object,
+        )
+    arrays["sound_parameters"] = sound_parameters
+    return arrays
+
+
+def iter_neighbors(
+    model: KnnModel,
+    source: str,
+    batch_size: int = EVALUATION_BATCH_SIZE,
+) -> tp.Iterator[tuple[pd.DataFrame, np.ndarray]]:
+    """Find neighbours of catalog tracks batch by batch.
+
+    Args:
+        model: trained KNN model
+        source: path to parquet catalog with queries
+        batch_size: number of queries in single batch
+
+    Returns:
+        Iterator of (queries batch, indexes of k neighbours in train tracks of model with shape (n, k))
+    """
+    train_ids = np.array([model.mapping[i] for i in range(len(model.mapping))], dtype=object)
+    columns = [column for column in pq.read_schema(source).names if column not in DROP_COLUMNS]
+    for batch in iter_catalog(source, columns=columns, batch_size=batch_size):
+        # Same rows as after `KnnModel.prettify`
+        batch = batch.dropna(subset="track_name").reset_index(drop=True)
+        if batch.empty:
+            continue
+        data = model.model_pipeline[:-1].transform(batch)
+        neighbors_indexes = model.model_pipeline[-1].kneighbors(data, return_distance=False)
+        yield batch, drop_query_neighbors(neighbors_indexes, batch["track_id"].to_numpy(dtype=object), train_ids)
+
+
+def evaluate_model(
+    model: KnnModel,
+    source: str,
+    train_source: str | None = None,
+    metrics: tp.Sequence[BasicMetric] | None = None,
+    batch_size: int = EVALUATION_BATCH_SIZE,
+    progress: bool = True,
+) -> dict[str, float]:
+    """Evaluate model over parquet catalog batch by batch.
+
+    Memory of queries is bounded by `batch_size`, but targets of all train tracks are read to memory,
+    so it grows with size of train catalog.
+
+    Args:
+        model: trained KNN model
+        source: path to parquet catalog with queries
+        train_source: path to catalog model is trained on, `source` by default
+        metrics: metrics to evaluate, all available metrics by default
+        batch_size: number of queries in single batch
+        progress: show progress bar
+
+    Returns:
+        Mapping of metric name to its value
+    """
+    metrics = get_metrics() if metrics is None else metrics
+    for metric in metrics:
+        if metric.name not in METRIC_TARGETS:
+            raise ValueError(f"Unknown target of metric {metric.name}, expected one of {list(METRIC_TARGETS)}.")
+        metric.reset()
+
+    train_ids = [model.mapping[i] for i in range(len(model.mapping))]
+    train_targets = get_targets(read_catalog(train_source or source, columns=TARGET_COLUMNS), track_ids=train_ids)
+    with tqdm(total=pq.read_metadata(source).num_rows, unit="track", disable=not progress) as progress_bar:
+        for batch, neighbors_indexes in iter_neighbors(model, source, batch_size=batch_size):
+            batch_targets = get_targets(batch)
+            for metric in metrics:
+                target = METRIC_TARGETS[metric.name]
+                metric.update(batch_targets[target], np.take(train_targets[target], neighbors_indexes, axis=0))
+            progress_bar.update(len(batch))
+
+    results = {metric.name: metric.result() for metric in metrics}
+    LOGGER.info("Evaluated model over %s: %s.", source, results)
+    return results
+
+
+def evaluate(
+    source: str,
+    model_name: str,
+    bucket_name: str | None = None,
+    train_source: str | None = None,
+    batch_size: int = EVALUATION_BATCH_SIZE,
+    profile_name: str | None = None,
+) -> dict[str, float]:
+    """Evaluate model from S3 over parquet catalog with all available metrics.
+
+    Args:
+        source: path to parquet catalog with queries
+        model_name: name of model in S3
+        bucket_name: bucket name, `PLAYLIST_SELECTION_S3_BUCKET_NAME` by default
+        train_source: path to catalog model is trained on, `source` by default
+        batch_size: number of queries in single batch
+        profile_name: aws profile
+
+    Returns:
+        Mapping of metric name to its value
+    """
+    model = KnnModel.open(
+        bucket_name=bucket_name or os.environ[f"{ENV_PREFIX}S3_BUCKET_NAME"],
+        model_name=model_name,
+        profile_name=profile_name,
+    )
+    return evaluate_model(model, source, train_source=train_source, batch_size=batch_size)
@@ -19,19 +19,40 @@ Currently available metrics:
 6. SoundParametersDiff
 - Л2 норма для относительной разницы (берется max) параметров звука
 """
+import itertools
 from abc import ABC, abstractmethod
 from collections.abc import Sequence
 from typing import Any
 
 import numpy as np
 
+from .utils import encode_multi_hot, overlap_mask
+
+SOUND_DIFF_CHUNK_SIZE = 2 ** 20 # Max number of elements in (n, k, d) chunk of sound parameters
+
+
+def _overlap_share(y_true: Sequence[Sequence[Any]], y_pred: Sequence[Sequence[Sequence[Any]]]) -> float:
+    """Share of (true, predicted) pairs with at least one common label, see `utils.overlap_mask`."""
+    # Predictions gathered from catalog (see `prepare_for_metric`) share label lists, each list is encoded once
+    pred_labels = list(itertools.chain.from_iterable(y_pred))
+    pred_ids = np.fromiter(map(id, pred_labels), dtype=np.uint64, count=len(pred_labels))
+    _, first_indexes, neighbors_indexes = np.unique(pred_ids, return_index=True, return_inverse=True)
+    true_matrix, vocabulary = encode_multi_hot(y_true)
+    pred_matrix, _ = encode_multi_hot([pred_labels[i] for i in first_indexes], vocabulary)
+    return np.mean(overlap_mask(true_matrix, pred_matrix, neighbors_indexes))
+
 
 class BasicMetric(ABC):
-    """Basic metric class."""
+    """Basic metric class.
+
+    Besides `compute` over whole sequences, metric accumulates batches with `update` and `result`,
+    so it's evaluated over any number of objects in constant memory.
+    """
 
     def __init__(self, name):
         """Init method."""
         self.name = name
+        self.reset()
 
     @staticmethod
     @abstractmethod
@@ -63,12 +84,47 @@ class BasicMetric(ABC):
             )
         return self.compute(y_true, y_pred)
 
+    def reset(self):
+        """Clear accumulated batches."""
+        self.total_ = 0.0
+        self.count_ = 0
+
+    def update(self, batch_true: Sequence[Any], batch_pred: Sequence[Sequence[Any]]) -> "BasicMetric":
+        """Accumulate batch of objects.
+
+        All metrics are means over (true, predicted) pairs, so batch value is weighted by number of pairs.
+
+        Args:
+            batch_true: true labels of batch
+            batch_pred: predicted labels of batch (multiple for each true label)
+
+        Returns:
+            Metric itself
+        """
+        if len(batch_true) != len(batch_pred):
+            raise ValueError(
+                f"got not matching sequences: y_true size is {len(batch_true)}, y_pred size is {len(batch_pred)}"
+            )
+        n_pairs = len(batch_true) * len(batch_pred[0]) if len(batch_pred) else 0
+        if n_pairs:
+            self.total_ += self.compute(batch_true, batch_pred) * n_pairs
+            self.count_ += n_pairs
+        return self
+
+    def result(self) -> float:
+        """Metric value over accumulated batches, NaN if nothing was accumulated.
+
+        Returns:
+            Calculated metric value
+        """
+        return self.total_ / self.count_ if self.count_ else np.nan
+
 
 class CorrectGenreShare(BasicMetric):
     """Calculates share of genre-correct answers."""
     def __init__(self):
         """Init method."""
-        self.name = "CorrectGenreShare"
+        super().__init__("CorrectGenreShare")
 
     @staticmethod
     def compute(y_true: Sequence[str], y_pred: Sequence[Sequence[str]]) -> float:
@@ -104,7 +160,7 @@ class CorrectMultipleGenreShare(BasicMetric):
     """Calculates share of genre-сorrect intersections."""
     def __init__(self):
         """Init method."""
-        self.name = "CorrectMultipleGenreShare"
+        super().__init__("CorrectMultipleGenreShare")
 
     @staticmethod
     def compute(y_true: Sequence[Sequence[str]], y_pred: Sequence[Sequence[Sequence[str]]]) -> float:
@@ -134,22 +190,15 @@ class CorrectMultipleGenreShare(BasicMetric):
         Returns:
             Share of objects, where at least on genre is correct
         """
-        y_true_set = map(set, y_true)
-        y_pred_set = [[set(genres) for genres in predictions] for predictions in y_pred]
-
-        mask = [
-            [bool(true_genres & pred_genres) for pred_genres in pred_genres_lst]
-            for true_genres, pred_genres_lst in zip(y_true_set, y_pred_set)
-        ]
         # Count as positive if y_true and y_pred have at least one intersection
-        return np.mean(mask)
+        return _overlap_share(y_true, y_pred)
 
 
 class CorrectAlbumShare(BasicMetric):
     """Calculates share of album-correct answers."""
     def __init__(self):
         """Init method."""
-        self.name = "CorrectAlbumShare"
+        super().__init__("CorrectAlbumShare")
 
     @staticmethod
     def compute(y_true: Sequence[str], y_pred: Sequence[Sequence[str]]) -> float:
@@ -170,7 +219,7 @@ class CorrectArtistShare(BasicMetric):
     """Calculates share of artist-correct answers."""
     def __init__(self):
         """Init method."""
-        self.name = "CorrectArtistShare"
+        super().__init__("CorrectArtistShare")
 
     @staticmethod
     def compute(y_true: Sequence[Sequence[str]], y_pred: Sequence[Sequence[Sequence[str]]]) -> float:
@@ -183,22 +232,15 @@ class CorrectArtistShare(BasicMetric):
         Returns:
             Share of objects, where at least on artist is correct
         """
-        y_true_set = map(set, y_true)
-        y_pred_set = [[set(genres) for genres in predictions] for predictions in y_pred]
-
-        mask = [
-            [bool(true_genres & pred_genres) for pred_genres in pred_genres_lst]
-            for true_genres, pred_genres_lst in zip(y_true_set, y_pred_set)
-        ]
         # Count as positive if y_true and y_pred have at least one intersection
-        return np.mean(mask)
+        return _overlap_share(y_true, y_pred)
 
 
 class YearMeanDiff(BasicMetric):
     """Calculates difference of track release dates."""
     def __init__(self):
         """Init method."""
-        self.name = "YearMeanDiff"
+        super().__init__("YearMeanDiff")
 
     @staticmethod
     def compute(y_true: Sequence[int], y_pred: Sequence[Sequence[int]]) -> float:
@@ -219,26 +261,40 @@ class SoundParametersDiff(BasicMetric):
     """Calculates l2 norm for sound parameters relative difference."""
     def __init__(self):
         """Init method."""
-        self.name = "SoundParametersDiff"
+        super().__init__("SoundParametersDiff")
 
     @staticmethod
-    def compute(y_true: Sequence[Sequence[float]], y_pred: Sequence[Sequence[Sequence[float]]]) -> float:
+    def compute(
+        y_true: Sequence[Sequence[float]],
+        y_pred: Sequence[Sequence[Sequence[float]]],
+        chunk_size: int = SOUND_DIFF_CHUNK_SIZE,
+    ) -> float:
         """Calculates share of correct predicted artists.
 
+        Norms are broadcasted over (n, k, d) chunks of predictions, so memory is bounded for any n.
+        Precision follows input, like float32 tensor of parameters.
+
         Args:
             y_true: true sound parameters
             y_pred: predicted sound parameters (multiple for each input object)
+            chunk_size: max number of elements in chunk of predictions
 
         Returns:
             L2 norm of sound parameters relative difference
         """
-        def l2_norm(first, second):
-            first, second = np.array(first), np.array(second)
-            diff = np.abs(first - second) / np.abs(np.maximum(first, second))
-            return np.sqrt(np.nansum(np.square(diff))).mean()
-
-        sound_diff = [
-            [l2_norm(true_genres, pred_genres) for pred_genres in pred_genres_lst]
-            for true_genres, pred_genres_lst in zip(y_true, y_pred)
-        ]
-        return np.array(sound_diff).mean()
+        y_true = np.asarray(y_true)
+        n_rows = len(y_true)
+        if not n_rows:
+            return np.array([]).mean()
+        y_true = y_true.reshape(n_rows, 1, -1)
+        k_neighbors, n_params = len(y_pred[0]), y_true.shape[-1]
+        chunk_rows = max(chunk_size // max(k_neighbors * n_params, 1), 1)
+
+        sound_diff = []
+        for start in range(0, n_rows, chunk_rows):
+            true_chunk = y_true[start:start + chunk_rows]
+            pred_chunk = np.asarray(y_pred[start:start + chunk_rows]).reshape(len(true_chunk), k_neighbors, -1)
+            diff = np.abs(true_chunk - pred_chunk) / np.abs(np.maximum(true_chunk, pred_chunk))
+            # NaN parameters are skipped like in np.nansum
+            sound_diff.append(np.sqrt(np.nansum(np.square(diff), axis=-1)))
+        return np.concatenate(sound_diff).mean()
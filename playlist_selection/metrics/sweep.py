@@ -0,0 +1,279 @@
+"""Module with hyperparameter sweep of KNN model.
+
+Catalog is preprocessed once (prettify and preprocessing stages of `KnnModel` pipeline don't depend
+on swept parameters) and transformed matrix is saved to `.npy` file, which workers of process pool
+memory map read-only, so matrix isn't copied to each of them. Numeric targets of metrics are shared
+the same way, while label targets (strings and lists of them) are passed to each worker. Each
+configuration fits PCA and nearest neighbours on shared matrix, measures latency of single queries
+like in serving and streams neighbours of catalog tracks through all metrics. Memory is traced in
+separate fit, so tracing doesn't slow down timed fit and queries. Results table allows to choose
+configuration on quality/latency Pareto front.
+"""
+import itertools
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, Field
+from sklearn.decomposition import PCA
+from sklearn.neighbors import NearestNeighbors
+from sklearn.pipeline import Pipeline
+from threadpoolctl import threadpool_limits
+from tqdm.auto import tqdm
+
+from ..logging_config import get_logger
+from ..models import KnnModel
+from ..tracks.catalog import read_catalog
+from .evaluation import (
+    EVALUATION_BATCH_SIZE,
+    METRIC_TARGETS,
+    TARGET_COLUMNS,
+    drop_query_neighbors,
+    get_metrics,
+    get_targets,
+)
+
+LOGGER = get_logger(__name__)
+
+SWEEP_LATENCY_QUERIES = 200 # Number of single queries to measure latency
+LOWER_IS_BETTER = {"YearMeanDiff", "SoundParametersDiff"} # Metrics of differences, others are shares
+
+_WORKER_STATE: dict[str, tp.Any] = {}
+
+
+class SweepConfig(BaseModel):
+    """Swept parameters of KNN model."""
+
+    k_neighbors: int = Field()
+    metric: str = Field()
+    n_components: int = Field()
+
+
+class SweepResult(SweepConfig):
+    """Performance and quality of single configuration."""
+
+    fit_seconds: float = Field()
+    query_latency_ms: float = Field() # Median latency of single query
+    query_latency_p95_ms: float = Field()
+    peak_memory_mb: float = Field() # Peak of traced allocations during separate fit and queries batch
+    model_size_mb: float = Field() # Size of pickled PCA and neighbours index
+    metrics: dict[str, float] = Field(default_factory=dict)
+
+
+def _init_worker(matrix_path: str, target_paths: dict[str, str], label_targets: dict[str, np.ndarray]):
+    # Configurations run in parallel processes, so each of them uses single BLAS thread
+    threadpool_limits(limits=1)
+    _WORKER_STATE["matrix"] = np.load(matrix_path, mmap_mode="r")
+    _WORKER_STATE["targets"] = {
+        **label_targets,
+        **{name: np.load(path, mmap_mode="r") for name, path in target_paths.items()},
+    }
+
+
+def _fit(matrix: np.ndarray, config: SweepConfig) -> tuple[PCA, NearestNeighbors]:
+    pca = PCA(n_components=config.n_components).fit(matrix)
+    neighbors = NearestNeighbors(n_neighbors=config.k_neighbors + 1, metric=config.metric).fit(pca.transform(matrix))
+    return pca, neighbors
+
+
+def evaluate_config(
+    config: SweepConfig,
+    n_eval_queries: int | None = None,
+    batch_size: int = EVALUATION_BATCH_SIZE,
+    n_latency_queries: int = SWEEP_LATENCY_QUERIES,
+) -> SweepResult:
+    """Fit and evaluate single configuration on shared matrix of worker.
+
+    Args:
+        config: parameters of model
+        n_eval_queries: number of random catalog tracks to evaluate metrics on, all tracks by default
+        batch_size: number of queries in single batch
+        n_latency_queries: number of single queries to measure latency
+
+    Returns:
+        Result of configuration
+    """
+    matrix, targets = _WORKER_STATE["matrix"], _WORKER_STATE["targets"]
+    rng = np.random.default_rng(0)
+
+    start_time = time.perf_counter()
+    pca, neighbors = _fit(matrix, config)
+    fit_seconds = time.perf_counter() - start_time
+
+    latencies = []
+    for row in rng.choice(len(matrix), size=min(n_latency_queries, len(matrix)), replace=False):
+        start_time = time.perf_counter()
+        neighbors.kneighbors(pca.transform(matrix[row:row + 1]), return_distance=False)
+        latencies.append(time.perf_counter() - start_time)
+
+    metrics = get_metrics()
+    query_rows = np.arange(len(matrix))
+    if n_eval_queries is not None and n_eval_queries < len(matrix):
+        query_rows = np.sort(rng.choice(len(matrix), size=n_eval_queries, replace=False))
+    for start in range(0, len(query_rows), batch_size):
+        rows = query_rows[start:start + batch_size]
+        neighbors_indexes = neighbors.kneighbors(pca.transform(matrix[rows]), return_distance=False)
+        neighbors_indexes = drop_query_neighbors(neighbors_indexes, rows, np.arange(len(matrix)))
+        for metric in metrics:
+            target = targets[METRIC_TARGETS[metric.name]]
+            metric.update(target[rows], np.take(target, neighbors_indexes, axis=0))
+
+    # Tracing slows down allocations, so memory is measured apart from timings
+    tracemalloc.start()
+    try:
+        pca, neighbors = _fit(matrix, config)
+        neighbors.kneighbors(pca.transform(matrix[:batch_size]), return_distance=False)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return SweepResult(
+        **config.model_dump(),
+        fit_seconds=fit_seconds,
+        query_latency_ms=float(np.median(latencies)) * 1000,
+        query_latency_p95_ms=float(np.percentile(latencies, 95)) * 1000,
+        peak_memory_mb=peak_memory / 2 ** 20,
+        model_size_mb=len(pickle.dumps((pca, neighbors))) / 2 ** 20,
+        metrics={metric.name: metric.result() for metric in metrics},
+    )
+
+
+def pareto_front(table: pd.DataFrame, objective: str, cost: str = "query_latency_ms") -> pd.Series:
+    """Mark configurations not dominated by others in quality objective and cost.
+
+    Args:
+        table: sweep results table
+        objective: metric name, it's maximized unless it's in `LOWER_IS_BETTER`
+        cost: minimized column, like query latency
+
+    Returns:
+        Boolean series, True for configurations on Pareto front
+    """
+    quality = table[objective].to_numpy(dtype=float)
+    if objective in LOWER_IS_BETTER:
+        quality = -quality
+    costs = table[cost].to_numpy(dtype=float)
+    not_worse = (quality[:, None] >= quality[None, :]) & (costs[:, None] <= costs[None, :])
+    better = (quality[:, None] > quality[None, :]) | (costs[:, None] < costs[None, :])
+    # dominated[j] if some i is not worse in both and better in one
+    dominated = (not_worse & better).any(axis=0)
+    return pd.Series(~dominated, index=table.index, name="pareto")
+
+
+def run_sweep(
+    source: str,
+    configs: tp.Sequence[SweepConfig],
+    n_processes: int | None = None,
+    n_eval_queries: int | None = None,
+    batch_size: int = EVALUATION_BATCH_SIZE,
+    objective: str = "CorrectGenreShare",
+) -> pd.DataFrame:
+    """Evaluate configurations of KNN model over parquet catalog in process pool.
+
+    Args:
+        source: path to parquet catalog from `S3Dataset.to_parquet`
+        configs: configurations to evaluate
+        n_processes: size of process pool, number of CPUs by default
+        n_eval_queries: number of random catalog tracks to evaluate metrics on, all tracks by default
+        batch_size: number of queries in single batch
+        objective: metric of Pareto front
+
+    Returns:
+        Table with parameters, fit time, query latency, memory and metrics of each configuration
+    """
+    dataset = KnnModel.read_catalog(source)
+    model = KnnModel()
+    start_time = time.perf_counter()
+    preprocessor = Pipeline(model.get_pipeline().steps[:2]).fit(dataset)
+    matrix = np.asarray(preprocessor.transform(dataset), dtype=np.float64)
+    LOGGER.info("Preprocessed catalog to %s matrix in %.1f s.", matrix.shape, time.perf_counter() - start_time)
+
+    train_ids = model.prettify(dataset).index
+    targets = get_targets(read_catalog(source, columns=TARGET_COLUMNS), track_ids=train_ids)
+    del dataset
+
+    max_components = min(matrix.shape)
+    valid_configs = [config for config in configs if config.n_components <= max_components]
+    if len(valid_configs) < len(configs):
+        LOGGER.warning("Skip %s configs with n_components > %s.", len(configs) - len(valid_configs), max_components)
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        matrix_path = os.path.join(temp_dir, "matrix.npy")
+        np.save(matrix_path, matrix)
+        del matrix
+        target_paths = {}
+        for name, values in targets.items():
+            if values.dtype != object:
+                target_paths[name] = os.path.join(temp_dir, f"target_{name}.npy")
+                np.save(target_paths[name], values)
+        # Object arrays can't be memory mapped, they are copied to each worker
+        label_targets = {name: values for name, values in targets.items() if name not in target_paths}
+        del targets
+        with (
+            ProcessPoolExecutor(
+                n_processes, initializer=_init_worker, initargs=(matrix_path, target_paths, label_targets),
+            ) as executor,
+            tqdm(total=len(valid_configs), unit="config") as progress,
+        ):
+            futures = {
+                executor.submit(evaluate_config, config, n_eval_queries, batch_size): config
+                for config in valid_configs
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    LOGGER.error("Failed to evaluate %s.", futures[future], exc_info=e)
+                else:
+                    results.append({**result.model_dump(exclude={"metrics"}), **result.metrics})
+                progress.update()
+
+    table = pd.DataFrame(results)
+    if not table.empty:
+        table["pareto"] = pareto_front(table, objective)
+        table = table.sort_values(objective, ascending=objective in LOWER_IS_BETTER, ignore_index=True)
+    return table
+
+
+def sweep(
+    source: str,
+    k_neighbors: tp.Sequence[int] = (3, 5, 10),
+    metric: tp.Sequence[str] = ("manhattan", "euclidean", "cosine"),
+    n_components: tp.Sequence[int] = (50, 100, 141),
+    n_processes: int | None = None,
+    n_eval_queries: int | None = None,
+    objective: str = "CorrectGenreShare",
+    output_path: str = "sweep_results.csv",
+) -> pd.DataFrame:
+    """Sweep grid of KNN model hyperparameters over parquet catalog and save results table.
+
+    Args:
+        source: path to parquet catalog from `S3Dataset.to_parquet`
+        k_neighbors: numbers of neighbours to predict
+        metric: distance metrics of nearest neighbours
+        n_components: numbers of PCA components
+        n_processes: size of process pool, number of CPUs by default
+        n_eval_queries: number of random catalog tracks to evaluate metrics on, all tracks by default
+        objective: metric of Pareto front with query latency
+        output_path: path to csv with results
+
+    Returns:
+        Results table, configurations on Pareto front have `pareto` flag
+    """
+    # Single values from command line aren't wrapped in list
+    grid = [[values] if isinstance(values, int | str) else values for values in (k_neighbors, metric, n_components)]
+    configs = [
+        SweepConfig(k_neighbors=k, metric=distance, n_components=components)
+        for k, distance, components in itertools.product(*grid)
+    ]
+    table = run_sweep(source, configs, n_processes=n_processes, n_eval_queries=n_eval_queries, objective=objective)
+    table.to_csv(output_path, index=False)
+    LOGGER.info("Saved results of %s configs to %s.", len(table), output_path)
+    return table
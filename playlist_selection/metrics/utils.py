@@ -1,7 +1,9 @@
 """Utils for metrics calculation."""
+from collections.abc import Hashable, Sequence
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
 
 def prepare_for_metric(
@@ -32,3 +34,74 @@ def prepare_for_metric(
         y_pred = y_pred.reshape(*y_pred.shape[:-1])
 
     return y_true, y_pred
+
+
+def encode_multi_hot(
+    sequences: Sequence[Sequence[Hashable]],
+    vocabulary: dict[Hashable, int] | None = None,
+) -> tuple[sparse.csr_matrix, dict[Hashable, int]]:
+    """Encode label sequences (like genres or artists of tracks) as sparse multi-hot matrix.
+
+    Args:
+        sequences: labels of each row
+        vocabulary: mapping of labels to columns shared between matrices, it's extended with new labels
+
+    Returns:
+        Tuple of (matrix of shape (len(sequences), len(vocabulary)), vocabulary)
+    """
+    vocabulary = {} if vocabulary is None else vocabulary
+    lengths = np.fromiter((len(labels) for labels in sequences), dtype=np.int64, count=len(sequences))
+    indices = np.fromiter(
+        (vocabulary.setdefault(label, len(vocabulary)) for labels in sequences for label in labels),
+        dtype=np.int64,
+        count=int(lengths.sum()),
+    )
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, indptr),
+        shape=(len(lengths), len(vocabulary)),
+    )
+    # Repeated labels of row are merged
+    matrix.sum_duplicates()
+    return matrix, vocabulary
+
+
+def _with_columns(matrix: sparse.csr_matrix, n_columns: int) -> sparse.csr_matrix:
+    """Widen matrix encoded with smaller vocabulary, new columns are empty."""
+    if matrix.shape[1] == n_columns:
+        return matrix
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_columns))
+
+
+def overlap_mask(
+    true_matrix: sparse.csr_matrix,
+    pred_matrix: sparse.csr_matrix,
+    neighbors_indexes: np.ndarray | None = None,
+) -> np.ndarray:
+    """Check if true rows share at least one label with their predicted rows.
+
+    Predicted rows are either aligned with neighbours (n * k rows, k consecutive rows for each true row)
+    or gathered from catalog matrix by `neighbors_indexes`, so catalog is encoded only once.
+
+    Args:
+        true_matrix: multi-hot matrix of shape (n, vocabulary size)
+        pred_matrix: multi-hot matrix of predictions or of whole catalog
+        neighbors_indexes: catalog rows of neighbours with shape (n, k)
+
+    Returns:
+        Boolean mask of shape (n, k)
+    """
+    n_rows = true_matrix.shape[0]
+    if neighbors_indexes is not None:
+        neighbors_indexes = np.asarray(neighbors_indexes).reshape(n_rows, -1) if n_rows else np.empty(0, dtype=int)
+        pred_matrix = pred_matrix[neighbors_indexes.ravel()]
+    k_neighbors = pred_matrix.shape[0] // n_rows if n_rows else 0
+    n_columns = max(true_matrix.shape[1], pred_matrix.shape[1])
+    true_matrix = _with_columns(true_matrix, n_columns)
+    pred_matrix = _with_columns(pred_matrix, n_columns)
+
+    # Row-wise dot product of each true row with its k predicted rows
+    true_rows = true_matrix[np.repeat(np.arange(n_rows), k_neighbors)]
+    overlap = np.asarray(true_rows.multiply(pred_matrix).sum(axis=1)).ravel()
+    return overlap.reshape(n_rows, k_neighbors) > 0
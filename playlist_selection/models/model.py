@@ -9,6 +9,7 @@ import boto3
 import joblib
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from pandas.core.api import DataFrame as DataFrame
 from sklearn.base import BaseEstimator
 from sklearn.compose import ColumnTransformer, make_column_selector, make_column_transformer
@@ -18,15 +19,29 @@ from sklearn.neighbors import NearestNeighbors
 from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
 
+from ..tracks.catalog import read_catalog
+from ..tracks.columnar import TrackBatch
+
 DROP_COLUMNS = [
     "key",
     "audio_path",
     "album_id",
     "artist_id",
+    "genre_labels",
     # "track_id"
 ]
 
 
+def drop_query_neighbors(neighbors_indexes: np.ndarray, query_ids: np.ndarray, train_ids: np.ndarray) -> np.ndarray:
+    """Drop query track from its k + 1 neighbours, queries missing in train tracks drop farthest neighbour."""
+    n_queries, n_neighbors = neighbors_indexes.shape
+    is_query = train_ids[neighbors_indexes] == query_ids.reshape(-1, 1)
+    dropped = np.where(is_query.any(axis=1), is_query.argmax(axis=1), n_neighbors - 1)
+    keep = np.ones_like(is_query)
+    keep[np.arange(n_queries), dropped] = False
+    return neighbors_indexes[keep].reshape(n_queries, n_neighbors - 1)
+
+
 def safe_eval(value: str | tp.Any) -> tp.Any:
     """Evaluate expression if value is instance of string."""
     if isinstance(value, str):
@@ -104,8 +119,9 @@ class KnnModel(BaseModel):
         else:
             dataset["artist_name"] = dataset["artist_name"].apply(set)
 
-        bad_date = ~dataset["album_release_date"].str.fullmatch("\d{4}-\d{2}-\d{2}")
-        dataset.loc[bad_date, "album_release_date"] = dataset.loc[bad_date, "album_release_date"].str[:10]
+        if pd.api.types.is_string_dtype(dataset["album_release_date"]):
+            bad_date = ~dataset["album_release_date"].str.fullmatch("\d{4}-\d{2}-\d{2}")
+            dataset.loc[bad_date, "album_release_date"] = dataset.loc[bad_date, "album_release_date"].str[:10]
         dataset["album_year"] = pd.to_datetime(dataset["album_release_date"]).dt.year
         dataset[["explicit", "is_local"]] = dataset[["explicit", "is_local"]].astype("int")
         model_columns = dataset.columns.difference(
@@ -128,7 +144,7 @@ class KnnModel(BaseModel):
             (numeric_transformer,
              make_column_selector(dtype_include=np.number)),
             (categorical_transformer,
-             make_column_selector(dtype_include=object))
+             make_column_selector(dtype_include=[object, "category"]))
         ).set_output(transform="pandas")
 
         return preprocessor
@@ -151,13 +167,34 @@ class KnnModel(BaseModel):
         return model_pipeline
 
 
+    @staticmethod
+    def read_catalog(
+        source: str,
+        filters: list[tuple[str, str, tp.Any]] | None = None,
+    ) -> DataFrame:
+        """Read train dataset from parquet catalog, dropped by model columns aren't read.
+
+        :param str source: path to catalog from S3Dataset.to_parquet
+        :param list | None filters: pyarrow row filters, like [("genre", "in", ["rock"])]
+
+        :return pd.DataFrame dataset: meta dataset
+        """
+        columns = [column for column in pq.read_schema(source).names if column not in DROP_COLUMNS]
+        return read_catalog(source, columns=columns, filters=filters)
+
+
     def train(self, dataset) -> Pipeline:
         """Trains KNN model.
 
-        :param pd.Dataframe dataset: meta dataset from S3Dataset
+        :param pd.Dataframe | TrackBatch | str dataset: meta dataset from S3Dataset or path to parquet catalog
 
         :return Pipeline model_pipeline: fitted sklearn model pipeline
         """
+        if isinstance(dataset, str):
+            dataset = self.read_catalog(dataset)
+        elif isinstance(dataset, TrackBatch):
+            dataset = dataset.to_pandas()
+
         self.model_pipeline = self.get_pipeline().fit(dataset)
         self.mapping = {
             i: j for i, j in enumerate(self.prettify(dataset).index)
@@ -258,15 +295,20 @@ class KnnModel(BaseModel):
     def predict(self, dataset) -> list:
         """Predict neighbor tracks with KNN model.
 
-        :param pd.Dataframe dataset: S3Dataset
+        :param pd.Dataframe | TrackBatch dataset: S3Dataset
 
-        :return List neighbor_tracks: list of neighbor tracks
+        :return List neighbor_tracks: k neighbor tracks of each query, query track itself is excluded
         """
+        if isinstance(dataset, TrackBatch):
+            dataset = dataset.to_pandas()
         data = self.model_pipeline[:-1].transform(dataset)
 
-        prediction = self.model_pipeline[-1].kneighbors(data, return_distance=True)
-        distance_tracks = [list(x) for x in zip(prediction[0].flatten(), prediction[1].flatten())]
-        track_ids = [x[1] for x in filter(lambda c: c[0] > 1.e-9, distance_tracks)]
-        neighbor_tracks = list(map(self.mapping.get, np.array(track_ids).flatten()))
+        neighbors_indexes = self.model_pipeline[-1].kneighbors(data, return_distance=False)
+        # Query is excluded by track_id, not by zero distance: float32 features (from catalog or TrackBatch)
+        # and float64 ones give small nonzero distance of track to itself
+        train_ids = np.array([self.mapping[i] for i in range(len(self.mapping))], dtype=object)
+        query_ids = dataset.dropna(subset="track_name")["track_id"].to_numpy(dtype=object)
+        neighbors_indexes = drop_query_neighbors(neighbors_indexes, query_ids, train_ids)
+        neighbor_tracks = list(train_ids[neighbors_indexes.flatten()])
 
         return neighbor_tracks
@@ -0,0 +1,74 @@
+"""Module with in-memory caches for parsers."""
+import threading
+import time
+import typing as tp
+from collections import OrderedDict
+
+SEARCH_CACHE_TTL_SECONDS = 24 * 60 * 60 # Spotify search results are quite stable
+SEARCH_CACHE_MAX_SIZE = 100_000 # Search cache values are small tuples of ids
+TRACKS_CACHE_MAX_SIZE = 10_000 # Track items are few KB each
+ARTISTS_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60 # Artist genres rarely change
+ARTISTS_CACHE_MAX_SIZE = 50_000
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread safe LRU cache with expiration of values.
+
+    Cache is dropped on pickling, so objects with cache can be sent to Celery workers.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        """Constructor of cache.
+
+        :param float ttl_seconds: lifetime of value in cache
+        :param int max_size: max number of values in cache, least recently used are removed
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._init_storage()
+
+    def _init_storage(self):
+        self._data: OrderedDict[tp.Hashable, tuple[float, tp.Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        """Return cached value or default if it's missing or expired."""
+        with self._lock:
+            expire_time, value = self._data.get(key, (None, _MISSING))
+            if value is _MISSING or expire_time < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: tp.Hashable, value: tp.Any):
+        """Put value to cache."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all values from cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        """Number of values in cache (including expired ones)."""
+        return len(self._data)
+
+    def __getstate__(self) -> dict[str, tp.Any]:
+        """Pickle only cache settings."""
+        return {"ttl_seconds": self.ttl_seconds, "max_size": self.max_size}
+
+    def __setstate__(self, state: dict[str, tp.Any]):
+        """Restore empty cache."""
+        self.__dict__.update(state)
+        self._init_storage()
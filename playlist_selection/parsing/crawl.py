@@ -0,0 +1,273 @@
+"""Module with resumable crawl of tracks meta from seed file.
+
+Seed file (like `data/tracks.txt`) has tab separated lines `genre<TAB>track name<TAB>artist name`.
+File is read in chunks, chunks are parsed concurrently and meta of every chunk is saved to S3 as packed
+shards `{prefix}/{genre}/_packed/part-*` in bulk. Checkpoint with finished chunks is saved after each chunk,
+so crawl restarted after crash parses only unfinished chunks. Shard names depend only on content,
+so chunk parsed twice overwrites its shards.
+"""
+import datetime
+import itertools
+import os
+import time
+import typing as tp
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel, Field
+from tqdm.auto import tqdm
+
+from ..logging_config import get_logger
+from ..tracks.codec import CODEC_FILE_FORMAT
+from ..tracks.meta import Song
+from .parser import SpotifyParser
+
+LOGGER = get_logger(__name__)
+
+CRAWL_CHUNK_SIZE = 200 # Number of seeds in single chunk
+CRAWL_N_WORKERS = 4 # Number of chunks parsed concurrently
+CRAWL_CHECKPOINT_PATH = "crawl_checkpoint.json" # Default local path of checkpoint
+ENV_PREFIX = "PLAYLIST_SELECTION_" # Same as in app settings
+
+
+def read_seeds(path: str, chunk_size: int = CRAWL_CHUNK_SIZE) -> tp.Iterator[tuple[int, list[tuple[str, Song]]]]:
+    """Read seed file lazily in chunks, malformed lines are skipped.
+
+    :param str path: path to seed file
+    :param int chunk_size: number of lines in chunk
+
+    :return Iterator: pairs of (chunk index, list of (genre, song))
+    """
+    with open(path, encoding="utf-8") as fin:
+        for index in itertools.count():
+            lines = list(itertools.islice(fin, chunk_size))
+            if not lines:
+                return
+            seeds = []
+            for line in lines:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3 or not all(parts):
+                    LOGGER.warning("Skip malformed seed line %r.", line)
+                    continue
+                genre, track_name, artist_name = parts
+                seeds.append((genre, Song(name=track_name, artist=artist_name)))
+            yield index, seeds
+
+
+class CrawlCheckpoint(BaseModel):
+    """Progress of crawl, persisted after each chunk."""
+
+    seeds_path: str = Field()
+    chunk_size: int = Field()
+    n_seeds_total: int = Field(default=0)
+    done_chunks: set[int] = Field(default_factory=set)
+    n_seeds: int = Field(default=0)
+    n_tracks: int = Field(default=0)
+    elapsed_seconds: float = Field(default=0.0)
+
+    @property
+    def seeds_per_second(self) -> float:
+        """Crawl throughput in seeds."""
+        return self.n_seeds / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def eta_seconds(self) -> float | None:
+        """Estimated time to finish crawl."""
+        if not self.seeds_per_second:
+            return None
+        return max(self.n_seeds_total - self.n_seeds, 0) / self.seeds_per_second
+
+    def __str__(self) -> str:
+        """Human readable progress."""
+        eta = "unknown" if self.eta_seconds is None else str(datetime.timedelta(seconds=round(self.eta_seconds)))
+        return (
+            f"{self.n_seeds}/{self.n_seeds_total} seeds ({len(self.done_chunks)} chunks), {self.n_tracks} tracks, "
+            f"{self.seeds_per_second:.1f} seeds/s, ETA {eta}"
+        )
+
+    def save(self, path: str):
+        """Save checkpoint to local file, file is replaced atomically."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as fout:
+            fout.write(self.model_dump_json().encode())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CrawlCheckpoint":
+        """Load checkpoint from local file."""
+        with open(path, "rb") as fin:
+            return cls.model_validate_json(fin.read())
+
+
+class SpotifyCrawler:
+    """Resumable crawler of tracks meta from seed file to S3."""
+
+    def __init__(
+        self,
+        parser: SpotifyParser,
+        schema: str,
+        host: str,
+        bucket_name: str,
+        prefix: str = "tracks",
+        checkpoint_path: str = CRAWL_CHECKPOINT_PATH,
+        chunk_size: int = CRAWL_CHUNK_SIZE,
+        n_workers: int = CRAWL_N_WORKERS,
+        file_format: str = "json",
+    ):
+        """Constructor of crawler.
+
+        :param SpotifyParser parser: spotify parser, shared by workers
+        :param str schema: S3 transfer protocol
+        :param str host: S3 host
+        :param str bucket_name: bucket name to save meta to
+        :param str prefix: dataset prefix, meta is saved to `{prefix}/{genre}` shards
+        :param str checkpoint_path: local path of checkpoint
+        :param int chunk_size: number of seeds in single chunk
+        :param int n_workers: number of chunks parsed concurrently
+        :param str file_format: "json" for NDJSON shards or "tmb" for compact binary encoding
+        """
+        self.parser = parser
+        self.schema = schema
+        self.host = host
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.n_workers = n_workers
+        self.file_format = file_format
+
+    def crawl_chunk(self, seeds: list[tuple[str, Song]]) -> int:
+        """Parse seeds of single chunk and save meta of each genre in bulk, return number of tracks.
+
+        Raises if meta of some genre isn't saved (see `SpotifyParser.load_to_s3`), so chunk isn't marked as done.
+        """
+        n_tracks = 0
+        for genre, genre_seeds in itertools.groupby(sorted(seeds, key=lambda seed: seed[0]), key=lambda seed: seed[0]):
+            tracks_meta = self.parser.parse(song_list=[song for _, song in genre_seeds])
+            if not tracks_meta:
+                continue
+            self.parser.load_to_s3(
+                schema=self.schema,
+                host=self.host,
+                bucket_name=self.bucket_name,
+                tracks_meta=tracks_meta,
+                prefix=f"{self.prefix}/{genre}",
+                packed=True,
+                file_format=self.file_format,
+            )
+            n_tracks += len(tracks_meta)
+        return n_tracks
+
+    def _load_checkpoint(self, seeds_path: str) -> CrawlCheckpoint:
+        if not os.path.exists(self.checkpoint_path):
+            return CrawlCheckpoint(seeds_path=seeds_path, chunk_size=self.chunk_size)
+        checkpoint = CrawlCheckpoint.load(self.checkpoint_path)
+        if (checkpoint.seeds_path, checkpoint.chunk_size) != (seeds_path, self.chunk_size):
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} of {checkpoint.seeds_path} with chunk size {checkpoint.chunk_size} "
+                "doesn't match crawl, remove it to start from scratch."
+            )
+        LOGGER.info("Resume crawl from checkpoint: %s.", checkpoint)
+        return checkpoint
+
+    def run(self, seeds_path: str) -> CrawlCheckpoint:
+        """Crawl all unfinished chunks of seed file.
+
+        Failed chunks are logged and left unfinished, so they are retried by next run.
+
+        :param str seeds_path: path to seed file
+
+        :return CrawlCheckpoint checkpoint: checkpoint after crawl
+        """
+        checkpoint = self._load_checkpoint(seeds_path)
+        with open(seeds_path, encoding="utf-8") as fin:
+            checkpoint.n_seeds_total = sum(1 for _ in fin)
+        n_failed = 0
+        start_time = time.perf_counter()
+        previous_elapsed_seconds = checkpoint.elapsed_seconds
+
+        def collect(futures: tp.Iterable[Future]):
+            nonlocal n_failed
+            for future in futures:
+                index, n_seeds = in_flight.pop(future)
+                try:
+                    n_tracks = future.result()
+                except Exception as e:
+                    LOGGER.error("Failed to crawl chunk %s.", index, exc_info=e)
+                    n_failed += 1
+                    continue
+                checkpoint.done_chunks.add(index)
+                checkpoint.n_seeds += n_seeds
+                checkpoint.n_tracks += n_tracks
+                checkpoint.elapsed_seconds = previous_elapsed_seconds + time.perf_counter() - start_time
+                checkpoint.save(self.checkpoint_path)
+                progress.update(n_seeds)
+                progress.set_postfix(tracks=checkpoint.n_tracks, refresh=False)
+                LOGGER.info("Crawled chunk %s: %s.", index, checkpoint)
+
+        in_flight: dict[Future, tuple[int, int]] = {}
+        with (
+            ThreadPoolExecutor(max_workers=self.n_workers) as executor,
+            tqdm(total=checkpoint.n_seeds_total, initial=checkpoint.n_seeds, unit="seed") as progress,
+        ):
+            for index, seeds in read_seeds(seeds_path, chunk_size=self.chunk_size):
+                if index in checkpoint.done_chunks:
+                    continue
+                if len(in_flight) >= 2 * self.n_workers:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(self.crawl_chunk, seeds)] = (index, len(seeds))
+            done, _ = wait(in_flight)
+            collect(done)
+
+        LOGGER.info("Crawl finished (%s chunks failed): %s.", n_failed, checkpoint)
+        return checkpoint
+
+
+def crawl(
+    seeds_path: str = "data/tracks.txt",
+    bucket_name: str | None = None,
+    endpoint_url: str | None = None,
+    prefix: str = "tracks",
+    checkpoint_path: str = CRAWL_CHECKPOINT_PATH,
+    chunk_size: int = CRAWL_CHUNK_SIZE,
+    n_workers: int = CRAWL_N_WORKERS,
+    file_format: str = "json",
+    client_id: str | None = None,
+    client_secret: str | None = None,
+):
+    """Crawl tracks meta of seed file to S3, rerun with same params resumes crawl from checkpoint.
+
+    Not passed settings are read from `PLAYLIST_SELECTION_*` environment variables like in app settings,
+    AWS credentials are taken from default boto3 chain.
+
+    :param str seeds_path: path to seed file with `genre<TAB>track name<TAB>artist name` lines
+    :param str | None bucket_name: bucket name, `PLAYLIST_SELECTION_S3_BUCKET_NAME` by default
+    :param str | None endpoint_url: S3 endpoint url, `PLAYLIST_SELECTION_S3_ENDPOINT_URL` by default
+    :param str prefix: dataset prefix
+    :param str checkpoint_path: local path of checkpoint
+    :param int chunk_size: number of seeds in single chunk
+    :param int n_workers: number of chunks parsed concurrently
+    :param str file_format: "json" or "tmb"
+    :param str | None client_id: spotify app id, `PLAYLIST_SELECTION_CLIENT_ID` by default
+    :param str | None client_secret: spotify app secret, `PLAYLIST_SELECTION_CLIENT_SECRET` by default
+    """
+    if file_format not in ("json", CODEC_FILE_FORMAT):
+        raise ValueError(f"Unknown file format {file_format}, expected 'json' or '{CODEC_FILE_FORMAT}'.")
+    endpoint_url = urlsplit(endpoint_url or os.environ[f"{ENV_PREFIX}S3_ENDPOINT_URL"])
+    parser = SpotifyParser(
+        client_id=client_id or os.environ[f"{ENV_PREFIX}CLIENT_ID"],
+        client_secret=client_secret or os.environ[f"{ENV_PREFIX}CLIENT_SECRET"],
+    )
+    crawler = SpotifyCrawler(
+        parser=parser,
+        schema=endpoint_url.scheme,
+        host=endpoint_url.netloc,
+        bucket_name=bucket_name or os.environ[f"{ENV_PREFIX}S3_BUCKET_NAME"],
+        prefix=prefix,
+        checkpoint_path=checkpoint_path,
+        chunk_size=chunk_size,
+        n_workers=n_workers,
+        file_format=file_format,
+    )
+    crawler.run(seeds_path)
@@ -1,23 +1,52 @@
 """Module with parsers."""
 import functools
+import hashlib
+import itertools
 import typing as tp
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-import boto3
 import numpy as np
+import orjson
 import spotipy
 from spotipy.exceptions import SpotifyException
 from spotipy.oauth2 import SpotifyClientCredentials
 
 from ..logging_config import get_logger
-from ..tracks.meta import Song, TrackDetails, TrackMeta
+from ..storage.s3 import S3_MAX_POOL_CONNECTIONS, S3_N_JOBS, S3BulkWriter, get_s3_client
+from ..tracks.codec import CODEC_FILE_FORMAT, encode_batch, encode_meta
+from ..tracks.meta import PACKED_SHARDS_FOLDER, Song, TrackDetails, TrackMeta
+from .cache import (
+    ARTISTS_CACHE_MAX_SIZE,
+    ARTISTS_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_MAX_SIZE,
+    SEARCH_CACHE_TTL_SECONDS,
+    TRACKS_CACHE_MAX_SIZE,
+    TTLCache,
+)
 
 LOGGER = get_logger(__name__)
 
 SPOTIFY_TOKEN_REFRESH_TIME_MINUTES = 55 # In minutes
 ARTIST_TOP_TRACKS = 5 # Number of tracks to collect by artist search
 PARSER_N_JOBS = 1 # Number of threads to create while parsing
+ARTISTS_N_JOBS = 4 # Number of concurrent artists requests
+SPOTIFY_BATCH_SIZE = 50 # Max number of ids in spotify batch requests
+PACKED_SHARD_SIZE = 1000 # Max number of tracks in single NDJSON shard
+
+
+def normalize_search_term(value: str | None) -> str:
+    """Fold case and whitespaces of search term."""
+    return " ".join((value or "").casefold().split())
+
+
+def get_search_query(song_name: str | None, artist_name: str | None) -> str:
+    """Create spotify search query, query is also used as cache key."""
+    song_name = normalize_search_term(song_name).replace('"', '\\"')
+    artist_name = normalize_search_term(artist_name).replace('"', '\\"')
+    return f'track:"{song_name}" artist:"{artist_name}"'
 
 
 class BaseParser(ABC):
@@ -69,6 +98,11 @@ class SpotifyParser(BaseParser):
         self._aws_access_key_id = aws_access_key_id
         self._aws_secret_access_key = aws_secret_access_key
 
+        # Shared between requests to parser
+        self._search_cache = TTLCache(ttl_seconds=SEARCH_CACHE_TTL_SECONDS, max_size=SEARCH_CACHE_MAX_SIZE)
+        self._tracks_cache = TTLCache(ttl_seconds=SEARCH_CACHE_TTL_SECONDS, max_size=TRACKS_CACHE_MAX_SIZE)
+        self._artists_cache = TTLCache(ttl_seconds=ARTISTS_CACHE_TTL_SECONDS, max_size=ARTISTS_CACHE_MAX_SIZE)
+
     def refresh_token(self) -> None:
         """Refresh token in case if previous is expired.
 
@@ -180,13 +214,12 @@ class SpotifyParser(BaseParser):
 
         return track_meta, track_details
 
-    def _get_audio_features(self, base_meta):
+    def _iter_audio_features(self, base_meta) -> tp.Iterator[TrackMeta]:
         track_ids = list(map(lambda x: x.get("id"), base_meta))
         audio_features = self.sp.audio_features(tracks=track_ids)
 
         artist_ids = list(map(lambda x: x["artists"][0]["id"], base_meta))
-        artist_infos = self.sp.artists(artists=artist_ids)["artists"]
-        tracks_meta = []
+        artist_infos = self._get_artists(artist_ids)
         for track_feats, audio_feats, artist_info in zip(base_meta, audio_features, artist_infos):
             # Merge all info into specific format
             try:
@@ -195,8 +228,37 @@ class SpotifyParser(BaseParser):
                 LOGGER.error(e, exc_info=e)
                 continue
             track_meta["track_details"] = TrackDetails(**track_details)
-            tracks_meta.append(TrackMeta(**track_meta))
-        return tracks_meta
+            yield TrackMeta(**track_meta)
+
+    def _get_artists(self, artist_ids: tp.Sequence[str]) -> list[dict[str, tp.Any] | None]:
+        """Return artist infos for given ids, only unique and missing in cache ones are requested."""
+        artist_infos = {artist_id: self._artists_cache.get(artist_id) for artist_id in artist_ids}
+        missing_ids = [artist_id for artist_id, artist_info in artist_infos.items() if artist_info is None]
+        batches = [
+            missing_ids[batch_start:batch_start + SPOTIFY_BATCH_SIZE]
+            for batch_start in range(0, len(missing_ids), SPOTIFY_BATCH_SIZE)
+        ]
+
+        def get_batch(artist_ids_slice: list[str]) -> list[dict[str, tp.Any] | None]:
+            return self.sp.artists(artists=artist_ids_slice)["artists"]
+
+        if len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(ARTISTS_N_JOBS, len(batches))) as executor:
+                found_batches = list(executor.map(get_batch, batches))
+        else:
+            # Tracks of single page have at most one batch, pool adds nothing to it
+            found_batches = [get_batch(artist_ids_slice) for artist_ids_slice in batches]
+
+        for artist_ids_slice, found_infos in zip(batches, found_batches):
+            for artist_id, artist_info in zip(artist_ids_slice, found_infos):
+                if artist_info:
+                    self._artists_cache.set(artist_id, artist_info)
+                artist_infos[artist_id] = artist_info
+
+        return [artist_infos[artist_id] for artist_id in artist_ids]
+
+    def _get_audio_features(self, base_meta):
+        return list(self._iter_audio_features(base_meta))
 
     def _parse_single_song(
         self,
@@ -215,12 +277,19 @@ class SpotifyParser(BaseParser):
 
                 # Create search query
                 if not track_ids:
-                    q = f'track:"{song_name}" artist:"{artist_name}"'
-                    search_type = "track"
-                    limit = 1 if song_name else ARTIST_TOP_TRACKS
-
-                    LOGGER.info("collecting meta for %s" % q)
-                    items = self.sp.search(q=q, type=search_type, limit=limit)["tracks"]["items"]
+                    q = get_search_query(song_name=song_name, artist_name=artist_name)
+                    cached_track_ids = self._search_cache.get(q)
+                    if cached_track_ids is not None:
+                        items = self._get_tracks(cached_track_ids)
+                    else:
+                        search_type = "track"
+                        limit = 1 if song_name else ARTIST_TOP_TRACKS
+
+                        LOGGER.info("collecting meta for %s" % q)
+                        items = self.sp.search(q=q, type=search_type, limit=limit)["tracks"]["items"]
+                        # Not found results are cached too
+                        self._search_cache.set(q, tuple(item["id"] for item in items))
+                        self._cache_tracks(items)
 
                     if not items:
                         if raise_not_found:
@@ -228,9 +297,7 @@ class SpotifyParser(BaseParser):
                         LOGGER.info("no song found for %s" % q)
                         return list()
                 else:
-                    for batch_start in range(0, len(track_ids), 50):
-                        track_ids_slice = track_ids[batch_start:batch_start + 50]
-                        items = self.sp.tracks(tracks=track_ids_slice)["tracks"]
+                    items = self._get_tracks(track_ids)
             except SpotifyException as e:
                 LOGGER.error("Got exception in parser.", exc_info=e)
             else:
@@ -238,6 +305,107 @@ class SpotifyParser(BaseParser):
 
         return items
 
+    def _cache_tracks(self, items: list[dict[str, tp.Any] | None]):
+        for item in filter(bool, items):
+            self._tracks_cache.set(item["id"], item)
+
+    def _get_tracks(self, track_ids: tp.Sequence[str]) -> list[dict[str, tp.Any] | None]:
+        """Return track items for given ids, only missing in cache ones are requested."""
+        items = {track_id: self._tracks_cache.get(track_id) for track_id in track_ids}
+        missing_ids = [track_id for track_id, item in items.items() if item is None]
+        for batch_start in range(0, len(missing_ids), SPOTIFY_BATCH_SIZE):
+            track_ids_slice = missing_ids[batch_start:batch_start + SPOTIFY_BATCH_SIZE]
+            found_items = self.sp.tracks(tracks=track_ids_slice)["tracks"]
+            self._cache_tracks(found_items)
+            items.update(zip(track_ids_slice, found_items))
+        return [items[track_id] for track_id in track_ids]
+
+    def _iter_base_meta(
+        self,
+        song_list: list[Song] | None,
+        track_id_list: list[str] | None,
+        raise_not_found: bool,
+        n_jobs: int,
+    ) -> tp.Iterator[Future]:
+        """Submit search requests, keeping at most `n_jobs` of them in flight.
+
+        Futures are yielded in input order, each one resolves to list of spotify track items.
+        """
+        calls = []
+        if song_list:
+            # Same songs are searched only once
+            search_terms = dict.fromkeys(
+                (normalize_search_term(song.name), normalize_search_term(song.artist))
+                for song in song_list
+            )
+            calls.extend(
+                functools.partial(
+                    self._parse_single_song,
+                    song_name=song_name,
+                    artist_name=artist_name,
+                    raise_not_found=raise_not_found,
+                )
+                for song_name, artist_name in search_terms
+            )
+        if track_id_list:
+            calls.extend(
+                functools.partial(self._parse_single_song, track_ids=track_id_list[i:i + SPOTIFY_BATCH_SIZE])
+                for i in range(0, len(track_id_list), SPOTIFY_BATCH_SIZE)
+            )
+
+        calls = iter(calls)
+        executor = ThreadPoolExecutor(max_workers=n_jobs)
+        try:
+            in_flight = deque(executor.submit(call) for call in itertools.islice(calls, n_jobs))
+            while in_flight:
+                future = in_flight.popleft()
+                for call in itertools.islice(calls, 1):
+                    in_flight.append(executor.submit(call))
+                yield future
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_parse(
+        self,
+        song_list: list[Song] | None  = None,
+        track_id_list: list[str] | None = None,
+        raise_not_found: bool = False,
+        batch_size: int = SPOTIFY_BATCH_SIZE,
+        n_jobs: int = PARSER_N_JOBS,
+        eager: bool = True,
+    ) -> tp.Iterator[TrackMeta]:
+        """Parse tracks meta data lazily.
+
+        Searches are executed in background threads with at most `n_jobs` requests in flight.
+        Found tracks are grouped into batches for features requests. Batch is flushed when it's full,
+        with `eager` it's also flushed when the next search isn't finished yet, so first tracks are
+        yielded without waiting for the whole input (at the cost of smaller batches).
+
+        :param song_list list[Song] | None: List of songs
+        :param list[str] | None track_id_list: List of spotify track ids
+        :param bool raise_not_found: if True raises for not found songs
+        :param int batch_size: max number of tracks in single features request
+        :param int n_jobs: number of search requests in flight
+        :param bool eager: if True don't wait for full batch while searches are in progress
+
+        :return Iterator[TrackMeta]: Iterator over collected meta
+        """
+        batch_size = min(batch_size, SPOTIFY_BATCH_SIZE)
+        base_meta = []
+        for future in self._iter_base_meta(song_list, track_id_list, raise_not_found, n_jobs):
+            if eager and base_meta and not future.done():
+                # Don't wait for search while there is something to process
+                yield from self._iter_audio_features(base_meta)
+                base_meta = []
+
+            base_meta.extend(filter(bool, future.result()))
+            while len(base_meta) >= batch_size:
+                yield from self._iter_audio_features(base_meta[:batch_size])
+                base_meta = base_meta[batch_size:]
+
+        if base_meta:
+            yield from self._iter_audio_features(base_meta)
+
     def parse(
         self,
         song_list: list[Song] | None  = None,
@@ -252,35 +420,55 @@ class SpotifyParser(BaseParser):
 
         :return list[TrackMeta]: List of collected meta
         """
-        executor_fn = functools.partial(
-            self._parse_single_song,
+        tracks_iterator = self.iter_parse(
+            song_list=song_list,
+            track_id_list=track_id_list,
             raise_not_found=raise_not_found,
+            eager=False,
         )
+        return list(tracks_iterator)
 
-        base_meta = []
-        tracks_meta = []
-        # Both song name and artist
-        if song_list:
-            for song in song_list:
-                base_meta.extend(executor_fn(song_name=song.name, artist_name=song.artist))
-                if len(base_meta) >= 50:
-                    tracks_meta.extend(self._get_audio_features(base_meta))
-                    base_meta = base_meta[50:]
-        if base_meta:
-            tracks_meta.extend(self._get_audio_features(base_meta))
-
+    def _iter_s3_objects(
+        self,
+        tracks_meta: tp.Iterable[TrackMeta],
+        prefix: str,
+        raise_wrong_type: bool,
+        packed: bool,
+        shard_size: int,
+        file_format: str,
+    ) -> tp.Iterator[tuple[str, bytes]]:
+        shard = []
+        for track in tracks_meta:
+            if not isinstance(track, TrackMeta):
+                if raise_wrong_type:
+                    raise ValueError("expected type TrackMeta, got: %s" % track)
+                LOGGER.info("expected type TrackMeta, got: %s" % track)
+                continue
 
-        if track_id_list:
-            base_meta = self._parse_single_song(track_ids=track_id_list)
-            for batch_start in range(0, len(base_meta), 50):
-                base_meta_slice = base_meta[batch_start:batch_start + 50]
-                tracks_meta.extend(self._get_audio_features(base_meta_slice))
+            if not packed:
+                filename = f"{track.get_s3_save_filename(prefix=prefix)}.{file_format}"
+                if file_format == CODEC_FILE_FORMAT:
+                    yield filename, encode_meta(track)
+                else:
+                    yield filename, orjson.dumps(track.model_dump())
+                continue
 
+            shard.append(track)
+            if len(shard) == shard_size:
+                yield self._get_packed_shard(shard, prefix=prefix, file_format=file_format)
+                shard = []
 
-        if len(tracks_meta) == 0:
-            return list()
+        if shard:
+            yield self._get_packed_shard(shard, prefix=prefix, file_format=file_format)
 
-        return tracks_meta
+    @staticmethod
+    def _get_packed_shard(tracks_meta: list[TrackMeta], prefix: str, file_format: str) -> tuple[str, bytes]:
+        # Name depends only on content, so reupload of same tracks overwrites shard
+        digest = hashlib.sha1("\n".join(track.track_id for track in tracks_meta).encode()).hexdigest()
+        if file_format == CODEC_FILE_FORMAT:
+            return f"{prefix}/{PACKED_SHARDS_FOLDER}/part-{digest[:16]}.{file_format}", encode_batch(tracks_meta)
+        body = b"".join(orjson.dumps(track.model_dump()) + b"\n" for track in tracks_meta)
+        return f"{prefix}/{PACKED_SHARDS_FOLDER}/part-{digest[:16]}.ndjson", body
 
     def load_to_s3(
         self,
@@ -292,9 +480,20 @@ class SpotifyParser(BaseParser):
         aws_access_key_id: str | None = None,
         aws_secret_access_key: str | None = None,
         raise_wrong_type=False,
+        packed: bool = False,
+        shard_size: int = PACKED_SHARD_SIZE,
+        n_jobs: int = S3_N_JOBS,
+        file_format: str = "json",
     ) -> str:
         """Save object to s3 bucket.
 
+        By default every track is saved to its own `{prefix}/{folder}/meta.json` object.
+        With `packed` tracks are saved as NDJSON shards `{prefix}/_packed/part-*.ndjson`
+        with up to `shard_size` tracks each, prefix is expected to be genre folder like `tracks/rock`.
+        With `file_format="tmb"` meta is saved in compact binary encoding (see `tracks.codec`),
+        objects are `meta.tmb` and shards are `part-*.tmb`.
+        Raises RuntimeError if some objects weren't uploaded after retries, so callers can retry them.
+
         :param str schema: Transfer protocol
         :param str host: S3 host
         :param str bucket_name: Bucket name to save files to
@@ -302,29 +501,36 @@ class SpotifyParser(BaseParser):
         :param str aws_access_key_id: AWS access key
         :param str aws_secret_access_key: AWS secret key
         :param bool raise_wrong_type: if True raises for wrong type elements in tracks_meta
+        :param bool packed: if True saves NDJSON shards instead of object per track
+        :param int shard_size: max number of tracks in single shard
+        :param int n_jobs: number of concurrent uploads
+        :param str file_format: "json" or "tmb" for compact binary encoding
 
         :return str: Path to S3 bucket
         """
+        if file_format not in ("json", CODEC_FILE_FORMAT):
+            raise ValueError(f"Unknown file format {file_format}, expected 'json' or '{CODEC_FILE_FORMAT}'.")
         aws_access_key_id = aws_access_key_id or self._aws_access_key_id
         aws_secret_access_key = aws_secret_access_key or self._aws_secret_access_key
 
-        s3_client = boto3.client(
-            "s3",
+        s3_client = get_s3_client(
+            endpoint_url=f"{schema}://{host}",
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
-            endpoint_url=f"{schema}://{host}",
+            max_pool_connections=max(n_jobs, S3_MAX_POOL_CONNECTIONS),
         )
-
-        for track in tracks_meta:
-            if not isinstance(track, TrackMeta):
-                if raise_wrong_type:
-                    raise ValueError("expected type TrackMeta, got: %s" % track)
-                LOGGER.info("expected type TrackMeta, got: %s" % track)
-                continue
-
-            filename = f"{track.get_s3_save_filename(prefix=prefix)}.json"
-            obj_body = track.json()
-            LOGGER.info("saving %s" % filename)
-            s3_client.put_object(Bucket=bucket_name, Key=filename, Body=obj_body)
+        writer = S3BulkWriter(s3_client=s3_client, bucket_name=bucket_name, n_jobs=n_jobs)
+        objects = self._iter_s3_objects(
+            tracks_meta,
+            prefix=prefix,
+            raise_wrong_type=raise_wrong_type,
+            packed=packed,
+            shard_size=shard_size,
+            file_format=file_format,
+        )
+        report = writer.put_objects(objects)
+        LOGGER.info("Saving to %s/%s: %s.", bucket_name, prefix, report)
+        if report.n_failed:
+            raise RuntimeError(f"Failed to save {report.n_failed} objects to {bucket_name}/{prefix}: {report}.")
 
         return f"{schema}://{host}/{bucket_name}"
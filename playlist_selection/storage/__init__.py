@@ -0,0 +1,4 @@
+"""Storage package."""
+from .s3 import S3BulkWriter, UploadReport, get_s3_client, upload_stream
+
+__all__ = ["S3BulkWriter", "UploadReport", "get_s3_client", "upload_stream"]
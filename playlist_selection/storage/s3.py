@@ -0,0 +1,211 @@
+"""Module with S3 helpers for bulk operations."""
+import functools
+import time
+import typing as tp
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import boto3
+import botocore
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from pydantic import BaseModel, Field
+
+from ..logging_config import get_logger
+
+LOGGER = get_logger(__name__)
+
+S3_MAX_POOL_CONNECTIONS = 32 # Size of urllib3 connection pool of client
+S3_MAX_ATTEMPTS = 5 # Number of botocore attempts for single request
+S3_N_JOBS = 16 # Number of concurrent requests in bulk operations
+S3_RETRY_BACKOFF_SECONDS = 0.5 # Base of exponential backoff for object retries
+S3_MULTIPART_PART_SIZE = 8 * 2 ** 20 # Size of multipart upload part, S3 minimum is 5 MB
+
+
+@functools.cache
+def get_s3_client(
+    endpoint_url: str | None = None,
+    aws_access_key_id: str | None = None,
+    aws_secret_access_key: str | None = None,
+    max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+) -> "botocore.client.S3":
+    """Return S3 client, clients are cached and shared between calls with same params.
+
+    Client is thread safe, pool size should be not less than number of threads using it.
+
+    :param str | None endpoint_url: S3 endpoint url, like https://storage.yandexcloud.net
+    :param str | None aws_access_key_id: AWS access key
+    :param str | None aws_secret_access_key: AWS secret key
+    :param int max_pool_connections: max number of connections kept in pool
+
+    :return: boto3 S3 client
+    """
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "adaptive"},
+    )
+    # Sessions aren't thread safe, so use new one instead of default
+    session = boto3.session.Session()
+    return session.client(
+        "s3",
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        endpoint_url=endpoint_url,
+        config=config,
+    )
+
+
+def upload_stream(
+    s3_client: "botocore.client.S3",
+    bucket_name: str,
+    key: str,
+    chunks: tp.Iterable[bytes],
+    part_size: int = S3_MULTIPART_PART_SIZE,
+) -> int:
+    """Upload stream of chunks to S3 object without writing it to disk.
+
+    Chunks are buffered until `part_size` bytes and sent as parts of multipart upload, so at most
+    `part_size` plus one chunk is kept in memory. Streams smaller than single part are uploaded
+    with single put request. Multipart upload is aborted on any error.
+
+    :param botocore.client.S3 s3_client: S3 client
+    :param str bucket_name: bucket name
+    :param str key: object key
+    :param Iterable[bytes] chunks: object content, like HTTP response chunks
+    :param int part_size: size of multipart upload part
+
+    :return int n_bytes: size of uploaded object
+    """
+    buffer = bytearray()
+    n_bytes = 0
+    upload_id = None
+    parts = []
+
+    def upload_part(body: bytes):
+        nonlocal upload_id
+        if upload_id is None:
+            upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=key)["UploadId"]
+        part_number = len(parts) + 1
+        response = s3_client.upload_part(
+            Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body,
+        )
+        parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            n_bytes += len(chunk)
+            while len(buffer) >= part_size:
+                upload_part(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+
+        if upload_id is None:
+            s3_client.put_object(Bucket=bucket_name, Key=key, Body=bytes(buffer))
+            return n_bytes
+        if buffer:
+            upload_part(bytes(buffer))
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        if upload_id is not None:
+            s3_client.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        raise
+    return n_bytes
+
+
+class UploadReport(BaseModel):
+    """Bulk upload statistics."""
+
+    n_objects: int = Field(default=0)
+    n_failed: int = Field(default=0)
+    n_bytes: int = Field(default=0)
+    elapsed_seconds: float = Field(default=0.0)
+
+    @property
+    def objects_per_second(self) -> float:
+        """Upload throughput in objects."""
+        return self.n_objects / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Upload throughput in bytes."""
+        return self.n_bytes / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __str__(self) -> str:
+        """Human readable report."""
+        return (
+            f"uploaded {self.n_objects} objects ({self.n_failed} failed, {self.n_bytes / 2 ** 20:.2f} MB) "
+            f"in {self.elapsed_seconds:.2f}s: {self.objects_per_second:.1f} objects/s, "
+            f"{self.bytes_per_second / 2 ** 10:.1f} KB/s"
+        )
+
+
+class S3BulkWriter:
+    """Concurrent writer of many small objects to S3."""
+
+    def __init__(
+        self,
+        s3_client: "botocore.client.S3",
+        bucket_name: str,
+        n_jobs: int = S3_N_JOBS,
+        max_retries: int = 3,
+    ):
+        """Constructor of bulk writer.
+
+        :param botocore.client.S3 s3_client: S3 client, see `get_s3_client`
+        :param str bucket_name: bucket name to save objects to
+        :param int n_jobs: number of concurrent put requests
+        :param int max_retries: number of retries for single object on top of botocore ones
+        """
+        self._s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.n_jobs = n_jobs
+        self.max_retries = max_retries
+
+    def _put_object(self, key: str, body: bytes) -> int:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=body)
+            except (BotoCoreError, ClientError) as e:
+                if attempt == self.max_retries:
+                    raise
+                LOGGER.warning("Failed to put %s (attempt %s): %s.", key, attempt + 1, e)
+                time.sleep(S3_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            else:
+                return len(body)
+
+    def put_objects(self, objects: tp.Iterable[tuple[str, bytes]]) -> UploadReport:
+        """Upload objects concurrently.
+
+        At most 2 * n_jobs bodies are kept in memory, so `objects` may be a lazy iterator.
+        Failed objects are logged and counted in report.
+
+        :param Iterable[tuple[str, bytes]] objects: pairs of (key, body)
+
+        :return UploadReport: upload statistics
+        """
+        report = UploadReport()
+        start_time = time.perf_counter()
+
+        def collect(futures: set[Future]):
+            for future in futures:
+                key = in_flight.pop(future)
+                try:
+                    report.n_bytes += future.result()
+                    report.n_objects += 1
+                except Exception as e:
+                    LOGGER.error("Failed to put %s.", key, exc_info=e)
+                    report.n_failed += 1
+
+        in_flight: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            for key, body in objects:
+                if len(in_flight) >= 2 * self.n_jobs:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(self._put_object, key, body)] = key
+            done, _ = wait(in_flight)
+            collect(done)
+
+        report.elapsed_seconds = time.perf_counter() - start_time
+        return report
@@ -1,6 +1,24 @@
 """Tracks package."""
 from .audio import Track
+from .columnar import TrackBatch, meta_to_arrow, meta_to_pandas
 from .dataset import S3Dataset
+from .decoding import AudioCache
+from .dedupe import DedupeReport, deduplicate_tracks
+from .features import AudioFeaturesExtractor, read_audio_features
+from .manifest import ScanManifest
 from .meta import TrackMeta
 
-__all__ = ["S3Dataset", "Track", "TrackMeta"]
+__all__ = [
+    "AudioCache",
+    "AudioFeaturesExtractor",
+    "DedupeReport",
+    "S3Dataset",
+    "ScanManifest",
+    "Track",
+    "TrackBatch",
+    "TrackMeta",
+    "deduplicate_tracks",
+    "meta_to_arrow",
+    "meta_to_pandas",
+    "read_audio_features",
+]
@@ -1,10 +1,16 @@
 """Track dataclass."""
-import typing as tp
+import os
 
+import botocore
+import numpy as np
 from pydantic import BaseModel, Field
 
+from ..logging_config import get_logger
+from .decoding import AUDIO_SAMPLE_RATE, STREAM_CHUNK_SIZE, AudioCache, decode_audio
 from .meta import TrackMeta
 
+LOGGER = get_logger(__name__)
+
 
 class Track(BaseModel):
     """Track dataclass."""
@@ -12,6 +18,43 @@ class Track(BaseModel):
     meta: TrackMeta = Field(title="Track meta", repr=True)
     audio_path: str = Field(repr=False)
 
-    def get_audio(self) -> tp.Any:
-        """Load track audio from audio_path."""
-        raise NotImplementedError()
+    def get_audio(
+        self,
+        s3_client: "botocore.client.S3 | None" = None,
+        bucket_name: str | None = None,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        cache: AudioCache | None = None,
+    ) -> np.ndarray:
+        """Load track audio from audio_path as mono float32 array.
+
+        Audio is streamed from S3 object (or read from local file without s3_client) and decoded with ffmpeg.
+        With cache decoded audio is returned as memory map and is reused while object ETag
+        (modification time and size of local file) doesn't change.
+
+        Args:
+            s3_client: boto3 S3 client, audio_path is local path if not passed;
+            bucket_name: bucket name with audio;
+            sample_rate: sample rate of decoded audio;
+            cache: cache of decoded audio.
+        """
+        if s3_client is None:
+            stat = os.stat(self.audio_path)
+            etag = f"{stat.st_mtime_ns}-{stat.st_size}"
+            if cache is not None and (audio := cache.get(self.audio_path, etag, sample_rate)) is not None:
+                return audio
+            audio = decode_audio(self.audio_path, sample_rate=sample_rate)
+        else:
+            if bucket_name is None:
+                raise ValueError("bucket_name is required to load audio from S3.")
+            if cache is not None:
+                etag = s3_client.head_object(Bucket=bucket_name, Key=self.audio_path)["ETag"]
+                if (audio := cache.get(self.audio_path, etag, sample_rate)) is not None:
+                    return audio
+            response = s3_client.get_object(Bucket=bucket_name, Key=self.audio_path)
+            etag = response["ETag"]
+            audio = decode_audio(response["Body"].iter_chunks(STREAM_CHUNK_SIZE), sample_rate=sample_rate)
+
+        LOGGER.debug("Decoded %s: %.1f seconds of audio.", self.audio_path, len(audio) / sample_rate)
+        if cache is not None:
+            return cache.set(self.audio_path, etag, sample_rate, audio)
+        return audio
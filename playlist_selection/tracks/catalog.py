@@ -0,0 +1,158 @@
+"""Module with Parquet catalog snapshot of tracks.
+
+Catalog is a typed snapshot of `S3Dataset.to_pandas()`: list columns are stored as native Arrow lists,
+`genre` is dictionary encoded, release date is a date and flags are booleans. Rows are sorted by `genre`,
+so filters by genre skip whole row groups.
+"""
+import io
+import typing as tp
+from ast import literal_eval
+
+import botocore
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .columnar import ARROW_TYPES, DETAILS_TYPES, PANDAS_TYPES
+
+CATALOG_KEY = "dataset/catalog.parquet" # Default S3 key of catalog snapshot
+CATALOG_ROW_GROUP_SIZE = 16_384
+
+LIST_COLUMNS = ["artist_name", "artist_id", "genres", "genre_labels"]
+
+
+def _get_catalog_schema() -> pa.Schema:
+    fields = [
+        pa.field("key", pa.string()),
+        pa.field("track_id", pa.string()),
+        pa.field("track_name", pa.string()),
+        pa.field("album_name", pa.string()),
+        pa.field("album_id", pa.string()),
+        pa.field("album_release_date", pa.date32()),
+        *(pa.field(column, pa.list_(pa.string())) for column in LIST_COLUMNS),
+        pa.field("genre", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("href", pa.string()),
+        pa.field("audio_path", pa.string()),
+    ]
+    fields.extend(pa.field(name, ARROW_TYPES[python_type]) for name, python_type in DETAILS_TYPES.items())
+    return pa.schema(fields)
+
+
+CATALOG_SCHEMA = _get_catalog_schema()
+# Nullable pandas types, same as in `tracks.columnar.meta_to_pandas`
+_PANDAS_TYPES_MAPPING = {
+    ARROW_TYPES[python_type]: pd.api.types.pandas_dtype(PANDAS_TYPES[python_type]) for python_type in (bool, int)
+}
+
+
+def _to_list(value: tp.Any) -> list[str] | None:
+    """Convert list-like value (including repr of list from csv) to list."""
+    if isinstance(value, str):
+        value = literal_eval(value)
+    if value is None or (not hasattr(value, "__len__") and pd.isna(value)):
+        return None
+    return list(value)
+
+
+def catalog_from_pandas(dataset: pd.DataFrame) -> pa.Table:
+    """Create typed catalog table from tracks dataframe.
+
+    Args:
+        dataset: dataframe from `S3Dataset.to_pandas()` or legacy csv dataset
+
+    Returns:
+        Arrow table, known columns follow `CATALOG_SCHEMA`, others keep inferred types
+    """
+    dataset = dataset.sort_values("genre", kind="stable") if "genre" in dataset else dataset
+    arrays, fields = [], []
+    for column in dataset.columns:
+        values = dataset[column]
+        if column in LIST_COLUMNS:
+            values = values.map(_to_list)
+        elif column == "album_release_date":
+            # There are some dates like 1970-01-01-01
+            values = pd.to_datetime(values.astype("string").str[:10], errors="coerce").dt.date
+
+        if column in CATALOG_SCHEMA.names:
+            field = CATALOG_SCHEMA.field(column)
+            if pa.types.is_dictionary(field.type):
+                array = pa.array(values, type=field.type.value_type, from_pandas=True).dictionary_encode()
+            else:
+                array = pa.array(values, type=field.type, from_pandas=True)
+        else:
+            array = pa.array(values, from_pandas=True)
+            field = pa.field(column, array.type)
+        arrays.append(array)
+        fields.append(field)
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_catalog(table: pa.Table, where: str | tp.BinaryIO, row_group_size: int = CATALOG_ROW_GROUP_SIZE):
+    """Write catalog table to parquet file."""
+    pq.write_table(table, where, row_group_size=row_group_size, compression="zstd")
+
+
+def save_catalog_to_s3(
+    table: pa.Table,
+    s3_client: "botocore.client.S3",
+    bucket_name: str,
+    key: str = CATALOG_KEY,
+    row_group_size: int = CATALOG_ROW_GROUP_SIZE,
+):
+    """Write catalog table to S3 object."""
+    buffer = io.BytesIO()
+    write_catalog(table, buffer, row_group_size=row_group_size)
+    buffer.seek(0)
+    s3_client.upload_fileobj(Fileobj=buffer, Bucket=bucket_name, Key=key)
+
+
+def read_catalog(
+    source: str | tp.BinaryIO,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, tp.Any]] | None = None,
+) -> pd.DataFrame:
+    """Read catalog to pandas.
+
+    Args:
+        source: path or file-like object with parquet catalog
+        columns: columns to read, all by default
+        filters: row filters in pyarrow format, like [("genre", "in", ["rock", "pop"])],
+            row groups not matching filters aren't decoded
+
+    Returns:
+        Catalog dataframe, list columns contain numpy arrays, `genre` is categorical, ints and flags are nullable
+    """
+    table = pq.read_table(source, columns=columns, filters=filters)
+    return table.to_pandas(types_mapper=_PANDAS_TYPES_MAPPING.get)
+
+
+def iter_catalog(
+    source: str | tp.BinaryIO,
+    columns: list[str] | None = None,
+    batch_size: int = CATALOG_ROW_GROUP_SIZE,
+) -> tp.Iterator[pd.DataFrame]:
+    """Read catalog to pandas lazily, only single batch is kept in memory.
+
+    Args:
+        source: path or file-like object with parquet catalog
+        columns: columns to read, all by default
+        batch_size: max number of rows in batch
+
+    Returns:
+        Iterator of catalog dataframes with same types as in `read_catalog`
+    """
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas(types_mapper=_PANDAS_TYPES_MAPPING.get)
+
+
+def load_catalog_from_s3(
+    s3_client: "botocore.client.S3",
+    bucket_name: str,
+    key: str = CATALOG_KEY,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, tp.Any]] | None = None,
+) -> pd.DataFrame:
+    """Read catalog from S3 object, see `read_catalog`."""
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+    return read_catalog(io.BytesIO(body), columns=columns, filters=filters)
@@ -0,0 +1,171 @@
+"""Module with compact binary encoding of track meta.
+
+Layout (little-endian) of version 1:
+    header: magic b"TMB", version (uint8), number of details fields (uint8), number of records (uint32)
+    record: record size (uint32), sizes of `LIST_FIELDS` (uint32 each), size of strings (uint32),
+        strings, null bitmap of details (uint64) and details values packed in `DETAILS_LAYOUT` order.
+    strings: utf-8 of `STRING_FIELDS` and items of `LIST_FIELDS` joined with NUL, None is SOH.
+
+New `TrackDetails` fields must be appended to `DETAILS_LAYOUT` (at most 64 fields): readers skip unknown trailing
+fields of a record and fields missing in older data get `TrackDetails` defaults, so version is bumped
+only for incompatible changes.
+"""
+import struct
+import typing as tp
+
+from pydantic import TypeAdapter
+
+from .meta import TrackMeta
+
+CODEC_VERSION = 1
+CODEC_FILE_FORMAT = "tmb" # Extension of S3 objects with encoded meta
+MAGIC = b"TMB"
+
+STRING_FIELDS = ["album_name", "album_id", "album_release_date", "track_id", "track_name"]
+LIST_FIELDS = ["artist_name", "artist_id", "genres"]
+DETAILS_LAYOUT = [
+    ("duration_ms", "q"), ("explicit", "?"), ("popularity", "q"), ("is_local", "?"),
+    ("danceability", "d"), ("energy", "d"), ("loudness", "d"), ("mode", "q"),
+    ("speechiness", "d"), ("acousticness", "d"), ("instrumentalness", "d"), ("valence", "d"),
+    ("tempo", "d"), ("time_signature", "d"),
+    ("bars_number", "q"), ("bars_mean_duration", "d"),
+    ("beats_number", "q"), ("beats_mean_duration", "d"),
+    ("tatums_number", "q"), ("tatums_mean_duration", "d"),
+    ("sections_number", "q"), ("sections_mean_duration", "d"), ("sections_mean_tempo", "d"),
+    ("sections_mean_key", "d"), ("sections_mean_mode", "d"), ("sections_mean_time_signature", "d"),
+    ("segments_number", "q"), ("segments_mean_duration", "d"), ("segments_mean_pitch", "d"),
+    ("segments_max_pitch", "d"), ("segments_min_pitch", "d"), ("segments_mean_timbre", "d"),
+    ("segments_max_timbre", "d"), ("segments_min_timbre", "d"),
+]
+# Nulls of details are stored in uint64 bitmap
+if len(DETAILS_LAYOUT) > 64:
+    raise ValueError(f"Null bitmap fits 64 details fields, got {len(DETAILS_LAYOUT)}.")
+
+_HEADER = struct.Struct("<3sBBI")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_RECORD_HEADER = struct.Struct("<" + "I" * (len(LIST_FIELDS) + 1))
+_SEPARATOR = "\x00"
+_NONE = "\x01"
+_DETAILS_NAMES = [name for name, _ in DETAILS_LAYOUT]
+_DETAILS_DEFAULTS = {"explicit": False, "is_local": False} # Non nullable fields
+_META_LIST_ADAPTER = TypeAdapter(list[TrackMeta])
+
+
+def _get_details_struct(n_fields: int) -> struct.Struct:
+    return struct.Struct("<" + "".join(fmt for _, fmt in DETAILS_LAYOUT[:n_fields]))
+
+
+_DETAILS_STRUCT = _get_details_struct(len(DETAILS_LAYOUT))
+
+
+def _encode_record(meta: TrackMeta) -> bytes:
+    strings = [getattr(meta, name) for name in STRING_FIELDS]
+    lists = [getattr(meta, name) for name in LIST_FIELDS]
+    for values in lists:
+        strings.extend(values)
+    if any(value is not None and (_SEPARATOR in value or value == _NONE) for value in strings):
+        raise ValueError(f"Strings of track {meta.track_id} contain control characters.")
+    blob = _SEPARATOR.join(_NONE if value is None else value for value in strings).encode()
+
+    details = meta.track_details
+    bitmap, values = 0, []
+    for i, name in enumerate(_DETAILS_NAMES):
+        value = getattr(details, name)
+        if value is None:
+            bitmap |= 1 << i
+            value = 0
+        values.append(value)
+
+    return b"".join([
+        _RECORD_HEADER.pack(*map(len, lists), len(blob)),
+        blob,
+        _UINT64.pack(bitmap),
+        _DETAILS_STRUCT.pack(*values),
+    ])
+
+
+def _decode_record(data: memoryview, offset: int, details_struct: struct.Struct) -> dict[str, tp.Any]:
+    *list_sizes, blob_size = _RECORD_HEADER.unpack_from(data, offset)
+    offset += _RECORD_HEADER.size
+    strings = str(data[offset:offset + blob_size], "utf-8").split(_SEPARATOR)
+    strings = [None if value == _NONE else value for value in strings]
+    offset += blob_size
+
+    params = dict(zip(STRING_FIELDS, strings))
+    start = len(STRING_FIELDS)
+    for name, size in zip(LIST_FIELDS, list_sizes):
+        params[name] = strings[start:start + size]
+        start += size
+
+    (bitmap,) = _UINT64.unpack_from(data, offset)
+    values = details_struct.unpack_from(data, offset + _UINT64.size)
+    if bitmap:
+        values = [
+            _DETAILS_DEFAULTS.get(name) if bitmap >> i & 1 else value
+            for i, (name, value) in enumerate(zip(_DETAILS_NAMES, values))
+        ]
+    params["track_details"] = dict(zip(_DETAILS_NAMES, values))
+    return params
+
+
+def encode_batch(meta_list: tp.Sequence[TrackMeta]) -> bytes:
+    """Encode batch of meta.
+
+    Args:
+        meta_list: tracks meta
+
+    Returns:
+        Encoded batch with header of current `CODEC_VERSION`
+    """
+    chunks = [_HEADER.pack(MAGIC, CODEC_VERSION, len(DETAILS_LAYOUT), len(meta_list))]
+    for meta in meta_list:
+        record = _encode_record(meta)
+        chunks.append(_UINT32.pack(len(record)))
+        chunks.append(record)
+    return b"".join(chunks)
+
+
+def decode_batch(data: bytes) -> list[TrackMeta]:
+    """Decode and validate batch of meta encoded by `encode_batch`.
+
+    Details fields unknown to this version are skipped, fields missing in older data get `TrackDetails` defaults.
+
+    Args:
+        data: encoded batch
+
+    Returns:
+        Decoded meta
+    """
+    data = memoryview(data)
+    magic, version, n_fields, n_records = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Data isn't encoded track meta.")
+    if version > CODEC_VERSION:
+        raise ValueError(f"Unsupported codec version {version}, latest supported is {CODEC_VERSION}.")
+
+    details_struct = _get_details_struct(min(n_fields, len(DETAILS_LAYOUT)))
+    offset = _HEADER.size
+    records = []
+    for _ in range(n_records):
+        (size,) = _UINT32.unpack_from(data, offset)
+        offset += _UINT32.size
+        records.append(_decode_record(data, offset, details_struct))
+        # Fields of newer versions are skipped
+        offset += size
+    # Whole batch is validated in one call of pydantic-core
+    return _META_LIST_ADAPTER.validate_python(records)
+
+
+def encode_meta(meta: TrackMeta) -> bytes:
+    """Encode single meta, see `encode_batch`."""
+    return encode_batch([meta])
+
+
+def decode_meta(data: bytes) -> TrackMeta:
+    """Decode single meta encoded by `encode_meta`."""
+    meta_list = decode_batch(data)
+    if len(meta_list) != 1:
+        raise ValueError(f"Expected single track meta, got {len(meta_list)}.")
+    return meta_list[0]
+
@@ -0,0 +1,289 @@
+"""Module with columnar conversion of track meta batches.
+
+Columns are filled straight from `TrackMeta`/`TrackDetails` attributes into preallocated arrays
+with explicit types: integer features are nullable ints, flags are nullable booleans and `genre` is categorical.
+Float features are float64 in dataframes, so serving features match ones models are trained on,
+and float32 in arrow tables and `TrackBatch`. Missing meta (None in batch) gives nulls.
+`TrackBatch` keeps the same columns in memory instead of list of `TrackMeta` objects.
+"""
+import typing as tp
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .meta import TrackDetails, TrackMeta
+
+STRING_COLUMNS = ["album_name", "album_id", "album_release_date"]
+LIST_COLUMNS = ["artist_name", "artist_id"]
+
+
+def _get_python_type(annotation: tp.Any) -> type:
+    # Annotations are like `int | None`, take first type
+    return tp.get_args(annotation)[0] if tp.get_args(annotation) else annotation
+
+
+DETAILS_TYPES = {name: _get_python_type(field.annotation) for name, field in TrackDetails.model_fields.items()}
+FLOAT_COLUMNS = [name for name, python_type in DETAILS_TYPES.items() if python_type is float]
+INT_COLUMNS = [name for name, python_type in DETAILS_TYPES.items() if python_type is int]
+BOOL_COLUMNS = [name for name, python_type in DETAILS_TYPES.items() if python_type is bool]
+
+# Same order as in `TrackMeta.to_dict`
+META_COLUMNS = [
+    *STRING_COLUMNS, *LIST_COLUMNS, "track_id", "track_name", "genres",
+    *DETAILS_TYPES, "genre", "href",
+]
+
+ARROW_TYPES = {bool: pa.bool_(), int: pa.int64(), float: pa.float32()}
+PANDAS_TYPES = {bool: "boolean", int: "Int64", float: np.float64}
+
+
+class _Column(tp.NamedTuple):
+    values: np.ndarray
+    mask: np.ndarray | None = None # True for missing values, for ints and bools only
+
+
+def _get_values(objects: list[tp.Any], name: str) -> list[tp.Any]:
+    return [getattr(obj, name) if obj is not None else None for obj in objects]
+
+
+def _get_numeric_column(values: list[tp.Any], python_type: type, float_dtype: type = np.float32) -> _Column:
+    n_rows = len(values)
+    if python_type is float:
+        # None is converted to NaN by numpy
+        return _Column(np.fromiter(values, dtype=float_dtype, count=n_rows))
+    mask = np.fromiter((value is None for value in values), dtype=bool, count=n_rows)
+    dtype = np.int64 if python_type is int else bool
+    data = np.fromiter((value or 0 for value in values), dtype=dtype, count=n_rows)
+    return _Column(data, mask if mask.any() else None)
+
+
+def _get_object_column(values: list[tp.Any]) -> _Column:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return _Column(array)
+
+
+def get_columns(
+    meta_list: tp.Sequence[TrackMeta | None],
+    float_dtype: type = np.float32,
+    genres: tp.Sequence[str | None] | None = None,
+) -> dict[str, _Column]:
+    """Fill column arrays from batch of meta, columns follow `META_COLUMNS`.
+
+    `genre` column is taken from `genres` (like genre folders of tracks on S3) or first genre of meta.
+    """
+    meta_list = list(meta_list)
+    details_list = [meta.track_details if meta is not None else None for meta in meta_list]
+
+    columns = {}
+    for name in [*STRING_COLUMNS, *LIST_COLUMNS, "track_id", "track_name", "genres"]:
+        columns[name] = _get_object_column(_get_values(meta_list, name))
+    for name, python_type in DETAILS_TYPES.items():
+        columns[name] = _get_numeric_column(_get_values(details_list, name), python_type, float_dtype)
+    if genres is None:
+        genres = [meta.genres[0] if meta is not None and meta.genres else None for meta in meta_list]
+    columns["genre"] = _get_object_column(list(genres))
+    columns["href"] = _get_object_column(_get_values(meta_list, "href"))
+    return columns
+
+
+def _column_to_pandas(name: str, column: _Column) -> tp.Any:
+    if name == "genre":
+        return pd.Categorical(column.values)
+    python_type = DETAILS_TYPES.get(name)
+    if python_type is None:
+        return column.values
+    if python_type is float:
+        return column.values.astype(PANDAS_TYPES[float], copy=False)
+    mask = column.mask if column.mask is not None else np.zeros(len(column.values), dtype=bool)
+    if python_type is int:
+        return pd.arrays.IntegerArray(column.values, mask)
+    return pd.arrays.BooleanArray(column.values, mask)
+
+
+def _column_to_arrow(name: str, column: _Column) -> pa.Array:
+    if name == "genre":
+        return pa.array(column.values, type=pa.string(), from_pandas=True).dictionary_encode()
+    if name in LIST_COLUMNS or name == "genres":
+        return pa.array(column.values, type=pa.list_(pa.string()))
+    python_type = DETAILS_TYPES.get(name)
+    if python_type is None:
+        return pa.array(column.values, type=pa.string())
+    # NaN of float features is stored as null
+    mask = np.isnan(column.values) if python_type is float else column.mask
+    return pa.array(column.values, type=ARROW_TYPES[python_type], mask=mask)
+
+
+def meta_to_pandas(meta_list: tp.Sequence[TrackMeta | None]) -> pd.DataFrame:
+    """Create dataframe from batch of meta.
+
+    Args:
+        meta_list: tracks meta, None for tracks without meta
+
+    Returns:
+        Dataframe with `META_COLUMNS`, same as built from `TrackMeta.to_dict` rows but with explicit types
+    """
+    columns = get_columns(meta_list, float_dtype=PANDAS_TYPES[float])
+    return pd.DataFrame(
+        {name: _column_to_pandas(name, column) for name, column in columns.items()},
+        copy=False,
+    )
+
+
+def meta_to_arrow(meta_list: tp.Sequence[TrackMeta | None]) -> pa.Table:
+    """Create arrow table from batch of meta.
+
+    Args:
+        meta_list: tracks meta, None for tracks without meta
+
+    Returns:
+        Arrow table with `META_COLUMNS`, `genre` is dictionary encoded
+    """
+    columns = get_columns(meta_list)
+    return pa.table({name: _column_to_arrow(name, column) for name, column in columns.items()})
+
+
+class TrackBatch:
+    """Struct of arrays container for many tracks meta.
+
+    Numeric `TrackDetails` fields are stored in numpy arrays (ints and flags with null masks),
+    ids, names and lists are stored in arrow arrays. Slices are views, `TrackMeta` objects
+    are materialized only on access, their float features have float32 precision.
+    """
+
+    def __init__(self, numeric: dict[str, _Column], strings: dict[str, pa.Array]):
+        """Constructor of batch, use `TrackBatch.from_meta` to create batch from meta.
+
+        Args:
+            numeric: columns of `TrackDetails` fields
+            strings: arrow arrays of other `META_COLUMNS`
+        """
+        self._numeric = numeric
+        self._strings = strings
+
+    @classmethod
+    def from_meta(cls, meta_list: tp.Sequence[TrackMeta], genres: tp.Sequence[str] | None = None) -> "TrackBatch":
+        """Create batch from tracks meta, `genres` override first genre of each meta."""
+        columns = get_columns(meta_list, genres=genres)
+        numeric = {name: columns.pop(name) for name in DETAILS_TYPES}
+        strings = {name: _column_to_arrow(name, column) for name, column in columns.items()}
+        return cls(numeric, strings)
+
+    @classmethod
+    def concat(cls, batches: tp.Sequence["TrackBatch"]) -> "TrackBatch":
+        """Concatenate batches into one."""
+        if not batches:
+            return cls.from_meta([])
+        numeric = {}
+        for name in DETAILS_TYPES:
+            columns = [batch._numeric[name] for batch in batches]
+            values = np.concatenate([column.values for column in columns])
+            mask = None
+            if any(column.mask is not None for column in columns):
+                mask = np.concatenate([
+                    column.mask if column.mask is not None else np.zeros(len(column.values), dtype=bool)
+                    for column in columns
+                ])
+            numeric[name] = _Column(values, mask)
+        strings = {}
+        for name in batches[0]._strings:
+            arrays = [batch._strings[name] for batch in batches]
+            if name == "genre":
+                # Dictionaries of batches differ
+                arrays = [array.cast(pa.string()) for array in arrays]
+                strings[name] = pa.concat_arrays(arrays).dictionary_encode()
+            else:
+                strings[name] = pa.concat_arrays(arrays)
+        return cls(numeric, strings)
+
+    def __len__(self) -> int:
+        """Number of tracks in batch."""
+        return len(self._strings["track_id"])
+
+    def _take(self, index: slice | np.ndarray) -> "TrackBatch":
+        numeric = {
+            name: _Column(column.values[index], column.mask[index] if column.mask is not None else None)
+            for name, column in self._numeric.items()
+        }
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self._take(np.arange(start, stop, step))
+            strings = {name: array.slice(start, max(stop - start, 0)) for name, array in self._strings.items()}
+        elif index.dtype == bool:
+            strings = {name: array.filter(pa.array(index)) for name, array in self._strings.items()}
+        else:
+            strings = {name: array.take(pa.array(index)) for name, array in self._strings.items()}
+        return TrackBatch(numeric, strings)
+
+    def __getitem__(self, index: int | slice | tp.Sequence[int] | np.ndarray) -> "TrackMeta | TrackBatch":
+        """Return meta of track by position or sub-batch by slice, indices or boolean mask."""
+        if isinstance(index, int | np.integer):
+            return self._get_meta(int(index))
+        if isinstance(index, slice):
+            return self._take(index)
+        return self._take(np.asarray(index))
+
+    def filter(self, mask: np.ndarray | pd.Series) -> "TrackBatch":
+        """Return sub-batch of tracks where mask is True."""
+        return self._take(np.asarray(mask, dtype=bool))
+
+    def _get_meta(self, i: int) -> TrackMeta:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} is out of range for batch of {len(self)} tracks.")
+        details = {}
+        for name, column in self._numeric.items():
+            if column.mask is not None and column.mask[i]:
+                details[name] = None
+            else:
+                value = column.values[i].item()
+                details[name] = None if value != value else value # NaN of float features
+        fields = {name: self._strings[name][i].as_py() for name in [*STRING_COLUMNS, *LIST_COLUMNS]}
+        # Validation in pydantic-core is faster than `model_construct`, see `tracks.meta.loads_meta`
+        return TrackMeta(
+            **fields,
+            track_id=self._strings["track_id"][i].as_py(),
+            track_name=self._strings["track_name"][i].as_py(),
+            genres=self._strings["genres"][i].as_py(),
+            track_details=TrackDetails(**details),
+        )
+
+    def __iter__(self) -> tp.Iterator[TrackMeta]:
+        """Return iterator for tracks meta."""
+        for i in range(len(self)):
+            yield self._get_meta(i)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by batch arrays."""
+        n_bytes = sum(array.nbytes for array in self._strings.values())
+        for column in self._numeric.values():
+            n_bytes += column.values.nbytes + (column.mask.nbytes if column.mask is not None else 0)
+        return n_bytes
+
+    def _iter_columns(self) -> tp.Iterator[tuple[str, tp.Any]]:
+        for name in META_COLUMNS:
+            yield name, self._numeric[name] if name in self._numeric else self._strings[name]
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Create dataframe like `meta_to_pandas`, int and flag columns share memory with batch."""
+        data = {}
+        for name, column in self._iter_columns():
+            if name in self._numeric:
+                data[name] = _column_to_pandas(name, column)
+            elif name == "genre":
+                # Sorted categories like in `meta_to_pandas`
+                data[name] = pd.Categorical(column.cast(pa.string()).to_numpy(zero_copy_only=False))
+            else:
+                data[name] = _get_object_column(column.to_pylist()).values
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self) -> pa.Table:
+        """Create arrow table like `meta_to_arrow`."""
+        return pa.table({
+            name: _column_to_arrow(name, column) if name in self._numeric else column
+            for name, column in self._iter_columns()
+        })
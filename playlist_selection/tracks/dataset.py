@@ -1,21 +1,36 @@
 """Module with dataset implementation."""
-import itertools
-import tempfile
+import queue
+import threading
+import time
 import typing as tp
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from types import MappingProxyType
 
 import botocore
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from tqdm.auto import tqdm
 
 from ..logging_config import get_logger
 from .audio import Track
-from .meta import TrackMeta
+from .catalog import CATALOG_ROW_GROUP_SIZE, catalog_from_pandas, write_catalog
+from .codec import CODEC_FILE_FORMAT, decode_batch
+from .columnar import TrackBatch, meta_to_pandas
+from .decoding import AUDIO_SAMPLE_RATE, AudioCache
+from .dedupe import deduplicate_tracks
+from .features import AudioFeaturesExtractor, FeaturesManifest
+from .manifest import ObjectInfo, ScanManifest, ScanReport
+from .meta import PACKED_SHARDS_FOLDER, TrackMeta, loads_meta
 
 LOGGER = get_logger(__name__)
 
+SCAN_N_JOBS = 10 # Default size of botocore connection pool
+LIST_N_JOBS = 8 # Number of genre prefixes listed concurrently
+LIST_QUEUE_SIZE = 4 # Number of listed pages buffered per genre prefix
+
 class BaseDataset(ABC):
     """Base class for all dataset classes."""
 
@@ -39,61 +54,207 @@ class S3Dataset(BaseDataset):
         s3_client: "botocore.client.S3",
         bucket_name: str,
         prefix: str,
+        n_jobs: int = SCAN_N_JOBS,
+        list_n_jobs: int = LIST_N_JOBS,
     ):
         """Constructor of s3 dataset.
 
         Args:
-        s3_client: boto3 connection to s3;
+        s3_client: boto3 connection to s3, client pool size should be not less than n_jobs + list_n_jobs
+            (see playlist_selection.storage.get_s3_client);
         bucket_name: bucket name with tracks;
-        prefix: prefix for tracks.
+        prefix: prefix for tracks;
+        n_jobs: number of concurrent downloads while scanning;
+        list_n_jobs: number of genre prefixes listed concurrently.
         """
         self._s3_client = s3_client
         self.bucket_name = bucket_name
         self.prefix = prefix
+        self.n_jobs = n_jobs
+        self.list_n_jobs = list_n_jobs
 
-    def _get_pages(self) -> tp.Any:
+    def _get_pages(self, prefix: str, delimiter: str | None = None) -> tp.Any:
         paginator = self._s3_client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix)
-        return pages
+        params = dict(Bucket=self.bucket_name, Prefix=prefix)
+        if delimiter:
+            params["Delimiter"] = delimiter
+        return paginator.paginate(**params)
+
+    def _iter_objects(self) -> tp.Iterator[dict[str, tp.Any]]:
+        """List objects under prefix.
+
+        Genre prefixes `{prefix}/{genre}/` are discovered with delimiter and paginated concurrently,
+        so downloads start before listing ends. Pages of each prefix are buffered in bounded queue and
+        yielded prefix by prefix, so objects come in the same (key) order on every run.
+        """
+        root = self.prefix.rstrip("/") + "/"
+        genre_prefixes = []
+        for page in self._get_pages(root, delimiter="/"):
+            # Objects right under prefix, they aren't in any genre prefix
+            yield from page.get("Contents", [])
+            genre_prefixes.extend(common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", []))
+        if not genre_prefixes:
+            return
+
+        stop = threading.Event()
+
+        def put(pages: queue.Queue, item: tp.Any) -> bool:
+            # Listing stops without blocking on full queue once consumer is gone
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def list_prefix(prefix: str, pages: queue.Queue):
+            try:
+                for page in self._get_pages(prefix):
+                    if not put(pages, page.get("Contents", [])):
+                        return
+                put(pages, None)
+            except Exception as e:
+                put(pages, e)
 
-    def _load_meta(self, key: str, temp_path: str) -> TrackMeta:
-        self._s3_client.download_file(Filename=temp_path, Key=key, Bucket=self.bucket_name)
-        meta = TrackMeta.load_from_json(temp_path)
-        return meta
+        # Prefixes are submitted in order, so prefix consumed next is always listed by some thread
+        queues = [queue.Queue(maxsize=LIST_QUEUE_SIZE) for _ in genre_prefixes]
+        with ThreadPoolExecutor(max_workers=min(self.list_n_jobs, len(genre_prefixes))) as executor:
+            for prefix, pages in zip(genre_prefixes, queues):
+                executor.submit(list_prefix, prefix, pages)
+            try:
+                for pages in queues:
+                    while (contents := pages.get()) is not None:
+                        if isinstance(contents, Exception):
+                            raise contents
+                        yield from contents
+            finally:
+                stop.set()
 
-    def _scan(self, temp_path: str):
-        pages = self._get_pages()
-        objects = itertools.chain.from_iterable(map(lambda page: page["Contents"], pages))
+    @staticmethod
+    def _parse_key(key: str) -> tuple[str, str, str]:
+        """Split object key into genre, track folder name and file format."""
+        file_name = key.split("/")[-1]
+        file_format = file_name.split(".")[-1]
+        _key = key[:key.rfind("/")]
+        _prefix, genre, name = _key.split("/", maxsplit=2)
+        return genre, name, file_format
+
+    def _load_meta(self, key: str) -> list[TrackMeta]:
+        """Download meta object into memory and decode it.
+
+        Object is either single track json, NDJSON shard with many tracks or their binary encoding,
+        see SpotifyParser.load_to_s3.
+        """
+        body = self._s3_client.get_object(Key=key, Bucket=self.bucket_name)["Body"].read()
+        if key.endswith(f".{CODEC_FILE_FORMAT}"):
+            return decode_batch(body)
+        return loads_meta(body, ndjson=key.endswith(".ndjson"))
+
+    def _scan(self, manifest: ScanManifest | None = None) -> tuple[dict[str, dict[str, tp.Any]], ScanManifest]:
+        """List objects and download meta concurrently.
+
+        Genre prefixes are listed by `list_n_jobs` threads into bounded queues (see `_iter_objects`),
+        which are consumed in the current thread while meta objects are downloaded in thread pool,
+        at most 2 * n_jobs downloads are in flight. Downloads are collected in listing order,
+        so tracks order and their first genre don't depend on download timings. Meta of objects
+        unchanged since `manifest` is taken from its snapshot without download.
+        """
         dataset = defaultdict(dict)
-        for obj in tqdm(objects):
-            key = obj["Key"]
-
-            # TODO: prettify
-            file_name = key.split("/")[-1]
-            file_format = file_name.split(".")[-1]
-            _key = key[:key.rfind("/")]
-            _prefix, genre, name = _key.split("/", maxsplit=2)
-
-            if name in dataset:
-                pass
-            else:
-                dataset[name]["genre"] = genre
-
-            if file_format == "json":
-                dataset[name]["meta"] = self._load_meta(key=key, temp_path=temp_path)
-            elif file_format == "mp3":
-                dataset[name]["audio_path"] = key
-            else:
-                LOGGER.warning("Unknown file format %s with key %s.", file_format, key)
-        return dataset
-
-    def scan(self):
-        """Scan tracks data from s3."""
-        with tempfile.NamedTemporaryFile() as temp_dir:
-            dataset = self._scan(temp_path=temp_dir.name)
+        new_manifest = ScanManifest(bucket_name=self.bucket_name, prefix=self.prefix)
+        previous_objects = manifest.objects if manifest else {}
+        report = ScanReport()
+        start_time = time.perf_counter()
+
+        def add_genre(name: str, genre: str):
+            obj = dataset[name]
+            obj.setdefault("genre", genre)
+            genre_labels = obj.setdefault("genre_labels", [])
+            if genre not in genre_labels:
+                genre_labels.append(genre)
+
+        def add_meta(key: str, genre: str, name: str, metas: list[TrackMeta]):
+            new_manifest.snapshot[key] = metas
+            for meta in metas:
+                # Shards contain many tracks, so use real folder name of each track
+                track_name = meta.folder_name if name == PACKED_SHARDS_FOLDER else name
+                add_genre(track_name, genre)
+                dataset[track_name]["meta"] = meta
+
+        def collect(future: Future):
+            add_meta(*in_flight.pop(future), future.result())
+
+        in_flight: dict[Future, tuple[str, str, str]] = {}
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor, tqdm(unit="obj") as progress:
+            for obj in self._iter_objects():
+                key = obj["Key"]
+                genre, name, file_format = self._parse_key(key)
+                progress.update()
+
+                object_info = ObjectInfo.from_listing(obj)
+                new_manifest.objects[key] = object_info
+                if key not in previous_objects:
+                    report.n_added += 1
+                    is_changed = True
+                elif previous_objects[key] != object_info:
+                    report.n_changed += 1
+                    is_changed = True
+                else:
+                    report.n_unchanged += 1
+                    is_changed = False
+
+                if file_format in ("json", "ndjson", CODEC_FILE_FORMAT):
+                    if not is_changed and key in manifest.snapshot:
+                        add_meta(key, genre, name, manifest.snapshot[key])
+                    else:
+                        if len(in_flight) >= 2 * self.n_jobs:
+                            # Oldest download
+                            collect(next(iter(in_flight)))
+                        in_flight[executor.submit(self._load_meta, key)] = (key, genre, name)
+                    if name == PACKED_SHARDS_FOLDER:
+                        continue
+                elif file_format != "mp3":
+                    LOGGER.warning("Unknown file format %s with key %s.", file_format, key)
+                    continue
+
+                add_genre(name, genre)
+                if file_format == "mp3":
+                    dataset[name]["audio_path"] = key
+
+            while in_flight:
+                collect(next(iter(in_flight)))
+
+        report.n_removed = len(previous_objects.keys() - new_manifest.objects.keys())
+        report.elapsed_seconds = time.perf_counter() - start_time
+        n_objects = len(new_manifest.objects)
+        LOGGER.info(
+            "Scanned %s objects (%.1f objects/s): %s.",
+            n_objects, n_objects / report.elapsed_seconds if report.elapsed_seconds else 0.0, report,
+        )
+        self.scan_report_ = report
+        return dataset, new_manifest
+
+    def scan(self, manifest: ScanManifest | None = None):
+        """Scan tracks data from s3.
+
+        Args:
+        manifest: manifest of previous scan, if passed only new or changed objects are downloaded.
+            After scan actual manifest is available as `manifest_` attribute, it can be persisted
+            with `ScanManifest.save` or `ScanManifest.save_to_s3`.
+        """
+        if manifest is not None and (manifest.bucket_name, manifest.prefix) != (self.bucket_name, self.prefix):
+            raise ValueError(f"Manifest of s3://{manifest.bucket_name}/{manifest.prefix} doesn't match dataset.")
+
+        dataset, self.manifest_ = self._scan(manifest=manifest)
         self.dataset_ = MappingProxyType(dataset)
         return self
 
+    def rescan(self):
+        """Incrementally update dataset scanned before."""
+        if not hasattr(self, "manifest_"):
+            raise RuntimeError("Scan dataset with .scan() method.")
+        return self.scan(manifest=self.manifest_)
+
     def __iter__(self) -> tp.Iterator[Track]:
         """Return iterator for tracks."""
         if not hasattr(self, "dataset_"):
@@ -104,27 +265,97 @@ class S3Dataset(BaseDataset):
             # maybe use .audio here
             yield key, obj
 
-    def to_pandas(self) -> pd.DataFrame:
-        """Generate pandas dataframe with dataset info."""
+    def iter_tracks(self) -> tp.Iterator[Track]:
+        """Return iterator for tracks with both meta and audio."""
         if not hasattr(self, "dataset_"):
             raise RuntimeError("Scan dataset with .scan() method.")
 
-        data = []
-        for key, obj in self.dataset_.items():
-            row = dict(key=key)
+        for obj in self.dataset_.values():
+            if "meta" in obj and "audio_path" in obj:
+                yield Track(meta=obj["meta"], audio_path=obj["audio_path"])
 
-            meta: TrackMeta | None = obj.get("meta")
-            if meta:
-                row.update(meta.to_dict())
+    def iter_audio(
+        self,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        cache: AudioCache | None = None,
+    ) -> tp.Iterator[tuple[Track, np.ndarray]]:
+        """Return iterator for tracks with decoded audio, see `Track.get_audio`.
 
-            row["genre"] = obj["genre"]
-            row["audio_path"] = obj.get("audio_path")
+        Args:
+        sample_rate: sample rate of decoded audio;
+        cache: cache of decoded audio, with cache repeated iterations don't download audio.
+        """
+        for track in self.iter_tracks():
+            audio = track.get_audio(
+                s3_client=self._s3_client, bucket_name=self.bucket_name, sample_rate=sample_rate, cache=cache,
+            )
+            yield track, audio
 
-            data.append(row)
+    def extract_audio_features(self, output_dir: str, **extractor_params) -> FeaturesManifest:
+        """Extract audio features of tracks to parquet shards, see `tracks.features.AudioFeaturesExtractor`.
 
-        df = pd.DataFrame(data)
+        Args:
+        output_dir: local directory for shards, extraction is resumed if it already has shards;
+        extractor_params: other params of AudioFeaturesExtractor.
+        """
+        extractor = AudioFeaturesExtractor(
+            s3_client=self._s3_client, bucket_name=self.bucket_name, output_dir=output_dir, **extractor_params,
+        )
+        return extractor.extract(self.iter_tracks())
+
+    def to_pandas(self, deduplicate: bool = False, by_name: bool = False) -> pd.DataFrame:
+        """Generate pandas dataframe with dataset info.
+
+        Args:
+        deduplicate: collapse tracks crawled under several genre folders into one canonical row
+            with merged `genre_labels`, see `tracks.dedupe.deduplicate_tracks`. Report is available
+            as `dedupe_report_` attribute;
+        by_name: also collapse tracks with same normalized name and first artist.
+        """
+        if not hasattr(self, "dataset_"):
+            raise RuntimeError("Scan dataset with .scan() method.")
+
+        objects = self.dataset_.values()
+        df = meta_to_pandas([obj.get("meta") for obj in objects])
+        df.insert(0, "key", list(self.dataset_.keys()))
+        # Genre of track folder on S3 overrides first genre from meta
+        df["genre"] = pd.Categorical([obj["genre"] for obj in objects])
+        df["genre_labels"] = [obj["genre_labels"] for obj in objects]
+        df["audio_path"] = [obj.get("audio_path") for obj in objects]
+        if deduplicate:
+            df, self.dedupe_report_ = deduplicate_tracks(df, by_name=by_name)
+            LOGGER.info("Deduplicated tracks: %s.", self.dedupe_report_)
         return df
 
+    def to_batch(self) -> TrackBatch:
+        """Pack meta of scanned tracks into compact `TrackBatch`, tracks without meta are skipped.
+
+        Genre of track folder on S3 overrides first genre from meta, like in `to_pandas`.
+        """
+        if not hasattr(self, "dataset_"):
+            raise RuntimeError("Scan dataset with .scan() method.")
+        objects = [obj for obj in self.dataset_.values() if "meta" in obj]
+        return TrackBatch.from_meta([obj["meta"] for obj in objects], genres=[obj["genre"] for obj in objects])
+
+    def to_parquet(
+        self,
+        where: str | tp.BinaryIO,
+        row_group_size: int = CATALOG_ROW_GROUP_SIZE,
+        deduplicate: bool = True,
+        by_name: bool = False,
+    ) -> pa.Table:
+        """Export typed parquet snapshot of dataset, see `tracks.catalog`.
+
+        Args:
+        where: path or file-like object to write to;
+        row_group_size: number of rows in parquet row group;
+        deduplicate: write one canonical row per track, see `S3Dataset.to_pandas`;
+        by_name: also collapse tracks with same normalized name and first artist.
+        """
+        table = catalog_from_pandas(self.to_pandas(deduplicate=deduplicate, by_name=by_name))
+        write_catalog(table, where, row_group_size=row_group_size)
+        return table
+
 def get_meta_features(meta_list: list[TrackMeta]) -> pd.DataFrame:
-    """Create dataframe with features from meta."""
-    return pd.DataFrame(list(map(TrackMeta.to_dict, meta_list)))
+    """Create dataframe with features from meta, see `tracks.columnar.meta_to_pandas`."""
+    return meta_to_pandas(meta_list)
@@ -0,0 +1,165 @@
+"""Module with audio decoding and on-disk cache of decoded audio.
+
+Audio is decoded with ffmpeg subprocess (ffmpeg binary should be available in PATH) to mono float32 PCM.
+Decoded audio is saved to `.npy` files keyed by object ETag and opened as memory maps, so repeated
+reads neither download nor decode audio again. Size of cache is bounded, least recently used files
+are evicted.
+"""
+import contextlib
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+import typing as tp
+
+import numpy as np
+
+AUDIO_SAMPLE_RATE = 22_050 # Default sample rate of decoded audio
+AUDIO_CACHE_DIR = os.path.join(tempfile.gettempdir(), "playlist_selection", "audio") # Default cache directory
+AUDIO_CACHE_MAX_BYTES = 10 * 2 ** 30 # Default max size of cache directory
+FFMPEG_BINARY = "ffmpeg"
+STREAM_CHUNK_SIZE = 1 << 16 # Size of chunks fed to ffmpeg
+
+
+def decode_audio(
+    source: str | tp.Iterable[bytes],
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+    ffmpeg_binary: str = FFMPEG_BINARY,
+) -> np.ndarray:
+    """Decode audio to mono float32 array.
+
+    Args:
+        source: path to local file or iterable of encoded audio chunks, like S3 `Body.iter_chunks()`;
+            chunks are streamed to ffmpeg while they are downloaded
+        sample_rate: sample rate of decoded audio
+        ffmpeg_binary: path to ffmpeg
+
+    Returns:
+        Array of shape (n_samples,)
+    """
+    is_path = isinstance(source, str)
+    command = [
+        ffmpeg_binary, "-nostdin", "-loglevel", "error",
+        "-i", source if is_path else "pipe:0",
+        "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1",
+    ]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL if is_path else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    feed_errors = []
+
+    def feed():
+        # Separate thread, otherwise full stdout pipe blocks writing to stdin
+        try:
+            for chunk in source:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg exited, error is reported with its return code
+            pass
+        except Exception as e:
+            # Download failed, ffmpeg would decode truncated audio
+            feed_errors.append(e)
+            process.kill()
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                process.stdin.close()
+
+    feeder = None
+    if not is_path:
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+    stderr = []
+    stderr_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+
+    pcm = process.stdout.read()
+    process.wait()
+    stderr_reader.join()
+    if feeder is not None:
+        feeder.join()
+    if feed_errors:
+        raise feed_errors[0]
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed with code {process.returncode}: {stderr[0].decode(errors='replace')}")
+    return np.frombuffer(pcm, dtype=np.float32)
+
+
+class AudioCache:
+    """On-disk cache of decoded audio with LRU eviction.
+
+    Cache hit updates modification time of file, so it's time of last use. After each `set` least
+    recently used files are removed until cache fits `max_bytes`. Cache directory can be shared by
+    processes: memory maps of evicted files stay valid until they are closed.
+    """
+
+    def __init__(self, cache_dir: str = AUDIO_CACHE_DIR, max_bytes: int | None = AUDIO_CACHE_MAX_BYTES):
+        """Constructor of cache.
+
+        Args:
+            cache_dir: directory for `.npy` files, created if doesn't exist
+            max_bytes: max total size of cached files, unbounded if None
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_path(self, key: str, etag: str, sample_rate: int) -> str:
+        digest = hashlib.sha1(f"{key}\n{etag}\n{sample_rate}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def get(self, key: str, etag: str, sample_rate: int) -> np.memmap | None:
+        """Return read-only memory map of cached audio or None if audio isn't cached.
+
+        Args:
+            key: S3 key or local path of audio
+            etag: ETag of S3 object or other version of audio, changed audio gets new cache entry
+            sample_rate: sample rate of decoded audio
+        """
+        path = self._get_path(key, etag, sample_rate)
+        try:
+            os.utime(path)
+            return np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            # Not cached or evicted by other process
+            return None
+
+    def set(self, key: str, etag: str, sample_rate: int, audio: np.ndarray) -> np.memmap:
+        """Save decoded audio to cache and return its memory map, see `AudioCache.get`."""
+        path = self._get_path(key, etag, sample_rate)
+        # Write to temporary file first, so concurrent readers never see partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                np.save(fout, audio)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        audio = np.load(path, mmap_mode="r")
+        self.evict()
+        return audio
+
+    def evict(self):
+        """Remove least recently used files until cache fits `max_bytes`."""
+        if self.max_bytes is None:
+            return
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".npy"):
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total_bytes -= size
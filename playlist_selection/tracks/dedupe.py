@@ -0,0 +1,122 @@
+"""Module with deduplication of tracks catalog.
+
+Same Spotify track is crawled under several genre folders, duplicates are collapsed to the first
+(canonical) row in single pass over hash maps of keys, genre labels of duplicates are merged
+into `genre_labels` of canonical row.
+"""
+import re
+import typing as tp
+
+import pandas as pd
+from pydantic import BaseModel, Field
+
+_BRACKETS_PATTERN = re.compile(r"\(.*?\)|\[.*?\]")
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_track_name(value: tp.Any) -> str:
+    """Normalize track or artist name, like 'Song (Remastered 2011) - Live' -> 'song'."""
+    if not isinstance(value, str):
+        return ""
+    value = _BRACKETS_PATTERN.sub(" ", value.casefold()).split(" - ")[0]
+    return _NON_WORD_PATTERN.sub(" ", value).strip()
+
+
+class DedupeReport(BaseModel):
+    """Statistics of catalog deduplication."""
+
+    n_rows: int = Field(default=0)
+    n_unique: int = Field(default=0)
+    n_duplicates_by_id: int = Field(default=0)
+    n_duplicates_by_name: int = Field(default=0)
+    bytes_before: int = Field(default=0)
+    bytes_after: int = Field(default=0)
+
+    @property
+    def duplicate_rate(self) -> float:
+        """Share of duplicate rows."""
+        return (self.n_rows - self.n_unique) / self.n_rows if self.n_rows else 0.0
+
+    @property
+    def index_size_saving(self) -> float:
+        """Share of rows removed from KNN index and mapping, index size is linear in number of rows."""
+        return self.duplicate_rate
+
+    def __str__(self) -> str:
+        """Human readable report for logs."""
+        return (
+            f"{self.n_rows} rows -> {self.n_unique} unique tracks, duplicate rate {self.duplicate_rate:.1%} "
+            f"({self.n_duplicates_by_id} by track_id, {self.n_duplicates_by_name} by name), "
+            f"index size saving {self.index_size_saving:.1%}, "
+            f"{self.bytes_before / 2 ** 20:.1f} -> {self.bytes_after / 2 ** 20:.1f} MiB"
+        )
+
+
+def _get_labels(row_labels: tp.Any, row_genre: tp.Any) -> list[str]:
+    if row_labels is not None and not isinstance(row_labels, float):
+        return list(row_labels)
+    return [row_genre] if isinstance(row_genre, str) else []
+
+
+def deduplicate_tracks(dataset: pd.DataFrame, by_name: bool = False) -> tuple[pd.DataFrame, DedupeReport]:
+    """Collapse duplicate tracks.
+
+    Args:
+        dataset: dataframe from `S3Dataset.to_pandas()`, rows without track_id are kept as is
+        by_name: also collapse tracks with same normalized track name and first artist,
+            like remasters and reuploads with different track_id
+
+    Returns:
+        Deduplicated dataframe with merged `genre_labels` and report
+    """
+    report = DedupeReport(n_rows=len(dataset), bytes_before=int(dataset.memory_usage(deep=True).sum()))
+    track_ids = dataset["track_id"].tolist()
+    labels = [
+        _get_labels(row_labels, row_genre)
+        for row_labels, row_genre in zip(
+            dataset["genre_labels"] if "genre_labels" in dataset else [None] * len(dataset),
+            dataset["genre"].tolist() if "genre" in dataset else [None] * len(dataset),
+        )
+    ]
+    name_keys = [None] * len(dataset)
+    if by_name:
+        name_keys = [
+            f"{normalize_track_name(track_name)}\x00{normalize_track_name(artists[0] if len(artists) else None)}"
+            if isinstance(track_name, str) and artists is not None and not isinstance(artists, float) else None
+            for track_name, artists in zip(dataset["track_name"], dataset["artist_name"])
+        ]
+
+    canonical_by_id: dict[str, int] = {}
+    canonical_by_name: dict[str, int] = {}
+    canonical_rows: list[int] = []
+    for row, (track_id, name_key) in enumerate(zip(track_ids, name_keys)):
+        canonical = None
+        if isinstance(track_id, str):
+            canonical = canonical_by_id.get(track_id)
+            if canonical is not None:
+                report.n_duplicates_by_id += 1
+        if canonical is None and name_key is not None:
+            canonical = canonical_by_name.get(name_key)
+            if canonical is not None:
+                report.n_duplicates_by_name += 1
+                if isinstance(track_id, str):
+                    canonical_by_id.setdefault(track_id, canonical)
+
+        if canonical is None:
+            canonical_rows.append(row)
+            if isinstance(track_id, str):
+                canonical_by_id[track_id] = row
+            if name_key is not None:
+                canonical_by_name[name_key] = row
+            continue
+
+        canonical_labels = labels[canonical]
+        canonical_labels.extend(label for label in labels[row] if label not in canonical_labels)
+
+    result = dataset.iloc[canonical_rows].copy()
+    result["genre_labels"] = [labels[row] for row in canonical_rows]
+    result.reset_index(drop=True, inplace=True)
+
+    report.n_unique = len(result)
+    report.bytes_after = int(result.memory_usage(deep=True).sum())
+    return result, report
@@ -0,0 +1,381 @@
+"""Module with audio features extraction.
+
+Features are computed with numpy from decoded audio: mean and std of log-mel bands, mean and std
+of chroma and tempo estimated from onset strength autocorrelation. Extraction over `S3Dataset`
+is fanned out to process pool and written to parquet shards by hash bucket of track_id with manifest
+of shards checksums, so new tracks change only their buckets and rerun of interrupted extraction
+skips shards already written without failed tracks.
+"""
+import contextlib
+import hashlib
+import os
+import tempfile
+import time
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import botocore
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, Field
+
+from ..logging_config import get_logger
+from .audio import Track
+from .decoding import AUDIO_SAMPLE_RATE, AudioCache, decode_audio
+
+LOGGER = get_logger(__name__)
+
+N_FFT = 2048 # Size of STFT frame
+HOP_LENGTH = 512 # Step between STFT frames
+N_MELS = 64 # Number of mel bands
+N_CHROMA = 12
+STFT_BLOCK_SIZE = 1024 # Number of frames transformed at once, bounds memory for long tracks
+TEMPO_MIN_BPM = 40
+TEMPO_MAX_BPM = 240
+FEATURES_N_SHARDS = 64 # Number of hash buckets of track_id, each bucket is written to single shard
+FEATURES_N_JOBS = os.cpu_count() or 1
+FEATURES_MANIFEST_NAME = "_manifest.json"
+
+AUDIO_FEATURES = [
+    *(f"mel_mean_{i}" for i in range(N_MELS)),
+    *(f"mel_std_{i}" for i in range(N_MELS)),
+    *(f"chroma_mean_{i}" for i in range(N_CHROMA)),
+    *(f"chroma_std_{i}" for i in range(N_CHROMA)),
+    "audio_tempo",
+]
+
+
+def _hz_to_mel(frequency: np.ndarray) -> np.ndarray:
+    return 2595.0 * np.log10(1.0 + frequency / 700.0)
+
+
+def _mel_to_hz(mel: np.ndarray) -> np.ndarray:
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+
+def get_mel_filters(sample_rate: int, n_fft: int = N_FFT, n_mels: int = N_MELS) -> np.ndarray:
+    """Return triangular mel filterbank of shape (n_mels, n_fft // 2 + 1)."""
+    fft_frequencies = np.fft.rfftfreq(n_fft, d=1.0 / sample_rate)
+    mel_frequencies = _mel_to_hz(np.linspace(0.0, _hz_to_mel(sample_rate / 2.0), n_mels + 2))
+    lower, center, upper = mel_frequencies[:-2, None], mel_frequencies[1:-1, None], mel_frequencies[2:, None]
+    rising = (fft_frequencies - lower) / (center - lower)
+    falling = (upper - fft_frequencies) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def get_chroma_filters(sample_rate: int, n_fft: int = N_FFT) -> np.ndarray:
+    """Return binary map of STFT bins to pitch classes of shape (12, n_fft // 2 + 1), C is first."""
+    fft_frequencies = np.fft.rfftfreq(n_fft, d=1.0 / sample_rate)
+    filters = np.zeros((N_CHROMA, len(fft_frequencies)), dtype=np.float32)
+    # Range of piano keys
+    bins = np.flatnonzero((fft_frequencies >= 27.5) & (fft_frequencies <= 4186.0))
+    midi = 69 + 12 * np.log2(fft_frequencies[bins] / 440.0)
+    filters[np.round(midi).astype(int) % N_CHROMA, bins] = 1.0
+    return filters
+
+
+def _iter_power_spectrum(audio: np.ndarray) -> tp.Iterator[np.ndarray]:
+    if len(audio) < N_FFT:
+        audio = np.pad(audio, (0, N_FFT - len(audio)))
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP_LENGTH]
+    window = np.hanning(N_FFT).astype(np.float32)
+    for start in range(0, len(frames), STFT_BLOCK_SIZE):
+        spectrum = np.fft.rfft(frames[start:start + STFT_BLOCK_SIZE] * window, axis=1)
+        yield (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+
+
+def estimate_tempo(log_mel: np.ndarray, sample_rate: int) -> float:
+    """Estimate tempo in BPM from log-mel spectrogram of shape (n_frames, n_mels)."""
+    onset_strength = np.maximum(0.0, np.diff(log_mel, axis=0)).mean(axis=1)
+    if len(onset_strength) < 2:
+        return float("nan")
+    onset_strength = onset_strength - onset_strength.mean()
+    n_fft = 1 << int(np.ceil(np.log2(2 * len(onset_strength))))
+    spectrum = np.fft.rfft(onset_strength, n=n_fft)
+    autocorrelation = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n=n_fft)[:len(onset_strength)]
+
+    frames_per_minute = 60.0 * sample_rate / HOP_LENGTH
+    lags = np.arange(
+        max(1, int(frames_per_minute / TEMPO_MAX_BPM)),
+        min(len(autocorrelation), int(frames_per_minute / TEMPO_MIN_BPM) + 1),
+    )
+    if len(lags) == 0:
+        return float("nan")
+    bpm = frames_per_minute / lags
+    # Log-normal prior around 120 BPM reduces octave errors
+    weights = np.exp(-0.5 * np.log2(bpm / 120.0) ** 2)
+    return float(bpm[np.argmax(autocorrelation[lags] * weights)])
+
+
+def compute_audio_features(audio: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """Compute audio features.
+
+    Args:
+        audio: mono audio of shape (n_samples,)
+        sample_rate: sample rate of audio
+
+    Returns:
+        float32 array of features in `AUDIO_FEATURES` order
+    """
+    mel_filters = get_mel_filters(sample_rate)
+    chroma_filters = get_chroma_filters(sample_rate)
+    log_mel_blocks, chroma_blocks = [], []
+    for power in _iter_power_spectrum(np.asarray(audio, dtype=np.float32)):
+        log_mel_blocks.append(np.log(power @ mel_filters.T + 1e-10))
+        chroma = power @ chroma_filters.T
+        chroma_blocks.append(chroma / (chroma.max(axis=1, keepdims=True) + 1e-10))
+    log_mel = np.concatenate(log_mel_blocks)
+    chroma = np.concatenate(chroma_blocks)
+
+    return np.concatenate([
+        log_mel.mean(axis=0), log_mel.std(axis=0),
+        chroma.mean(axis=0), chroma.std(axis=0),
+        [estimate_tempo(log_mel, sample_rate)],
+    ]).astype(np.float32)
+
+
+def _extract_track_features(
+    audio_path: str,
+    etag: str | None,
+    body: bytes | None,
+    sample_rate: int,
+    cache: AudioCache | None,
+) -> np.ndarray:
+    """Decode audio and compute features in pool process, audio is taken from cache without body."""
+    audio = None
+    if body is None and cache is not None:
+        audio = cache.get(audio_path, etag, sample_rate)
+    if audio is None:
+        audio = decode_audio([body], sample_rate=sample_rate)
+        if cache is not None:
+            audio = cache.set(audio_path, etag, sample_rate, audio)
+    return compute_audio_features(audio, sample_rate=sample_rate)
+
+
+class ShardInfo(BaseModel):
+    """Info of written features shard."""
+
+    track_ids_sha1: str = Field()
+    sha256: str = Field()
+    n_tracks: int = Field()
+    n_failed: int = Field(default=0)
+
+
+class FeaturesManifest(BaseModel):
+    """Manifest of features shards."""
+
+    sample_rate: int = Field()
+    n_shards: int = Field(default=FEATURES_N_SHARDS)
+    features: list[str] = Field(default_factory=lambda: list(AUDIO_FEATURES))
+    shards: dict[str, ShardInfo] = Field(default_factory=dict)
+
+    @classmethod
+    def load(cls, output_dir: str) -> "FeaturesManifest | None":
+        """Load manifest from directory with shards, None if there is no manifest."""
+        path = os.path.join(output_dir, FEATURES_MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as fin:
+            return cls.model_validate_json(fin.read())
+
+    def save(self, output_dir: str):
+        """Save manifest to directory with shards."""
+        _write_atomic(os.path.join(output_dir, FEATURES_MANIFEST_NAME), orjson.dumps(self.model_dump()))
+
+
+def _write_atomic(path: str, data: bytes):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fout:
+            fout.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def get_shard_index(track_id: str, n_shards: int) -> int:
+    """Return hash bucket of track, it doesn't depend on other tracks and is stable between runs."""
+    return int.from_bytes(hashlib.sha1(track_id.encode()).digest()[:8], "little") % n_shards
+
+
+def _get_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioFeaturesExtractor:
+    """Extract audio features of `S3Dataset` tracks to parquet shards."""
+
+    def __init__(
+        self,
+        s3_client: "botocore.client.S3",
+        bucket_name: str,
+        output_dir: str,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        n_shards: int = FEATURES_N_SHARDS,
+        n_jobs: int = FEATURES_N_JOBS,
+        cache: AudioCache | None = None,
+    ):
+        """Constructor of extractor.
+
+        Args:
+            s3_client: boto3 S3 client, pool size should be not less than 2 * n_jobs;
+            bucket_name: bucket name with audio;
+            output_dir: local directory for shards and manifest;
+            sample_rate: sample rate of decoded audio;
+            n_shards: number of hash buckets of track_id, each bucket is written to single shard;
+            n_jobs: number of processes decoding audio and computing features;
+            cache: cache of decoded audio, it's shared by pool processes.
+        """
+        self._s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.n_shards = n_shards
+        self.n_jobs = n_jobs
+        self.cache = cache
+
+    def _fetch(self, track: Track) -> tuple[str, str | None, bytes | None]:
+        """Download audio unless it's cached, return args for `_extract_track_features`."""
+        etag = None
+        if self.cache is not None:
+            etag = self._s3_client.head_object(Bucket=self.bucket_name, Key=track.audio_path)["ETag"]
+            if self.cache.get(track.audio_path, etag, self.sample_rate) is not None:
+                return track.audio_path, etag, None
+        response = self._s3_client.get_object(Bucket=self.bucket_name, Key=track.audio_path)
+        return track.audio_path, response["ETag"], response["Body"].read()
+
+    def _extract_shard(self, tracks: list[Track], process_pool: ProcessPoolExecutor) -> tuple[np.ndarray, int]:
+        def extract(track: Track) -> np.ndarray:
+            try:
+                args = self._fetch(track)
+                return process_pool.submit(_extract_track_features, *args, self.sample_rate, self.cache).result()
+            except Exception as e:
+                LOGGER.warning("Failed to extract features of %s: %s", track.audio_path, e)
+                return np.full(len(AUDIO_FEATURES), np.nan, dtype=np.float32)
+
+        # Each thread downloads audio and waits for its features, so at most 2 * n_jobs bodies are in memory
+        with ThreadPoolExecutor(max_workers=2 * self.n_jobs) as thread_pool:
+            features = np.stack(list(thread_pool.map(extract, tracks)))
+        # Failed tracks are counted here, not in threads, so no lock is needed
+        n_failed = int(np.isnan(features).all(axis=1).sum())
+        return features, n_failed
+
+    def _write_shard(self, path: str, track_ids: list[str], features: np.ndarray):
+        columns = {"track_id": pa.array(track_ids, type=pa.string())}
+        columns.update((name, pa.array(features[:, i])) for i, name in enumerate(AUDIO_FEATURES))
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(pa.table(columns), temp_path, compression="zstd")
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def extract(self, tracks: tp.Iterable[Track]) -> FeaturesManifest:
+        """Extract features of tracks, shards which are already written with same tracks are skipped.
+
+        Shards with failed tracks (NaN rows) are extracted again.
+
+        Args:
+            tracks: tracks with audio, like `S3Dataset.iter_tracks()`; tracks are assigned to shards
+                by hash of track_id, so added or removed tracks change only their own shards
+
+        Returns:
+            Manifest of written shards, it's also saved to output directory
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        shards: dict[int, dict[str, Track]] = {}
+        for track in tracks:
+            shards.setdefault(get_shard_index(track.meta.track_id, self.n_shards), {})[track.meta.track_id] = track
+        previous_manifest = manifest = FeaturesManifest.load(self.output_dir)
+        if (
+            manifest is None
+            or manifest.sample_rate != self.sample_rate
+            or manifest.n_shards != self.n_shards
+            or manifest.features != AUDIO_FEATURES
+        ):
+            manifest = FeaturesManifest(sample_rate=self.sample_rate, n_shards=self.n_shards)
+        # Shards of incompatible manifest are rewritten or removed
+        stale_shard_names = set() if previous_manifest is None else set(previous_manifest.shards)
+
+        start_time = time.perf_counter()
+        shard_names = set()
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as process_pool:
+            for shard_number, shard_index in enumerate(sorted(shards), start=1):
+                track_ids = sorted(shards[shard_index])
+                shard_tracks = [shards[shard_index][track_id] for track_id in track_ids]
+                track_ids_sha1 = hashlib.sha1("\n".join(track_ids).encode()).hexdigest()
+                shard_name = f"part-{shard_index:05d}.parquet"
+                shard_names.add(shard_name)
+                shard_path = os.path.join(self.output_dir, shard_name)
+
+                shard_info = manifest.shards.get(shard_name)
+                if (
+                    shard_info is not None
+                    and shard_info.track_ids_sha1 == track_ids_sha1
+                    and shard_info.n_failed == 0
+                    and os.path.exists(shard_path)
+                    and _get_sha256(shard_path) == shard_info.sha256
+                ):
+                    LOGGER.info("Shard %s is up to date, skip it.", shard_name)
+                    continue
+
+                features, n_failed = self._extract_shard(shard_tracks, process_pool)
+                self._write_shard(shard_path, track_ids, features)
+                manifest.shards[shard_name] = ShardInfo(
+                    track_ids_sha1=track_ids_sha1,
+                    sha256=_get_sha256(shard_path),
+                    n_tracks=len(track_ids),
+                    n_failed=n_failed,
+                )
+                manifest.save(self.output_dir)
+                elapsed_seconds = time.perf_counter() - start_time
+                LOGGER.info(
+                    "Shard %s/%s is written, %s failed tracks, %.1fs elapsed.",
+                    shard_number, len(shards), n_failed, elapsed_seconds,
+                )
+
+        # Shards left from previous runs over other tracks
+        for shard_name in (stale_shard_names | manifest.shards.keys()) - shard_names:
+            manifest.shards.pop(shard_name, None)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.output_dir, shard_name))
+        manifest.save(self.output_dir)
+        return manifest
+
+
+def read_audio_features(output_dir: str, verify: bool = True) -> pd.DataFrame:
+    """Read features shards written by `AudioFeaturesExtractor`.
+
+    Result is meant to be merged to meta dataset by track_id, like
+    `dataset.merge(read_audio_features(output_dir), on="track_id", how="left")`,
+    numeric feature columns are picked by `KnnModel` preprocessor as is.
+
+    Args:
+        output_dir: directory with shards and manifest
+        verify: whether to check shards checksums
+
+    Returns:
+        Dataframe with track_id and float32 `AUDIO_FEATURES` columns
+    """
+    manifest = FeaturesManifest.load(output_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"There is no features manifest in {output_dir}.")
+    paths = []
+    for shard_name, shard_info in sorted(manifest.shards.items()):
+        path = os.path.join(output_dir, shard_name)
+        if verify and _get_sha256(path) != shard_info.sha256:
+            raise ValueError(f"Checksum of shard {path} doesn't match manifest.")
+        paths.append(path)
+    if not paths:
+        return pd.DataFrame(columns=["track_id", *manifest.features])
+    return pa.concat_tables([pq.read_table(path) for path in paths]).to_pandas()
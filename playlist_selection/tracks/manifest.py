@@ -0,0 +1,82 @@
+"""Module with manifest of scanned S3 objects."""
+import datetime
+import typing as tp
+
+import botocore
+import orjson
+from pydantic import BaseModel, Field
+
+from .meta import TrackMeta
+
+
+class ObjectInfo(BaseModel):
+    """Version info of single S3 object."""
+
+    etag: str = Field()
+    last_modified: datetime.datetime = Field()
+    size: int = Field()
+
+    @classmethod
+    def from_listing(cls, obj: dict[str, tp.Any]) -> "ObjectInfo":
+        """Create info from `list_objects_v2` content item."""
+        return cls(etag=obj["ETag"], last_modified=obj["LastModified"], size=obj["Size"])
+
+
+class ScanManifest(BaseModel):
+    """Manifest of objects seen by S3Dataset scan with decoded meta snapshot.
+
+    Used for incremental rescans: only new or changed objects are downloaded,
+    meta of unchanged objects is taken from snapshot.
+    """
+
+    bucket_name: str = Field()
+    prefix: str = Field()
+    objects: dict[str, ObjectInfo] = Field(default_factory=dict)
+    snapshot: dict[str, list[TrackMeta]] = Field(default_factory=dict, repr=False)
+
+    def dumps(self) -> bytes:
+        """Serialize manifest to json."""
+        return orjson.dumps(self.model_dump())
+
+    @classmethod
+    def loads(cls, data: bytes) -> "ScanManifest":
+        """Deserialize manifest from json, parsed and validated by pydantic-core in one call."""
+        return cls.model_validate_json(data)
+
+    def save(self, filename: str):
+        """Save manifest to local file."""
+        with open(filename, "wb") as fout:
+            fout.write(self.dumps())
+
+    @classmethod
+    def load(cls, filename: str) -> "ScanManifest":
+        """Load manifest from local file."""
+        with open(filename, "rb") as fin:
+            return cls.loads(fin.read())
+
+    def save_to_s3(self, s3_client: "botocore.client.S3", bucket_name: str, key: str):
+        """Save manifest to S3 object."""
+        s3_client.put_object(Bucket=bucket_name, Key=key, Body=self.dumps())
+
+    @classmethod
+    def load_from_s3(cls, s3_client: "botocore.client.S3", bucket_name: str, key: str) -> "ScanManifest":
+        """Load manifest from S3 object."""
+        body = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+        return cls.loads(body)
+
+
+class ScanReport(BaseModel):
+    """Statistics of S3Dataset scan, counts are in S3 objects."""
+
+    n_added: int = Field(default=0)
+    n_changed: int = Field(default=0)
+    n_removed: int = Field(default=0)
+    n_unchanged: int = Field(default=0)
+    elapsed_seconds: float = Field(default=0.0)
+
+    def __str__(self) -> str:
+        """Human readable report."""
+        return (
+            f"{self.n_added} added, {self.n_changed} changed, {self.n_removed} removed, "
+            f"{self.n_unchanged} unchanged objects in {self.elapsed_seconds:.2f}s"
+        )
@@ -2,9 +2,22 @@
 import json
 import re
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 
 S3_SAVE_PREFIX = "tracks" # Директория на s3 куда сохраняем мету
+PACKED_SHARDS_FOLDER = "_packed" # Folder with NDJSON shards of many tracks
+
+_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+_PARTIAL_DATE_PATTERN = re.compile(r'\d{4}(-\d{2})?')
+
+
+def normalize_release_date(value: str | None) -> str | None:
+    """Complete release date with year or month precision (like '1999' or '1999-12') to full date."""
+    if value is None or _DATE_PATTERN.match(value):
+        return value
+    if _PARTIAL_DATE_PATTERN.fullmatch(value):
+        return value + "-01" * (3 - len(value.split("-")))
+    return value
 
 class Song(BaseModel):
     """Basic song info."""
@@ -83,14 +96,13 @@ class TrackMeta(BaseModel):
     genres: list[str] = Field(default_factory=lambda : ["unknown"], repr=True)
     track_details: TrackDetails = Field(default_factory=TrackDetails, repr=False)
 
-    @field_validator("album_release_date")
+    @field_validator("album_release_date", mode="before")
     def _validate_date(cls, value):
-        if re.match(r'\d{4}-\d{2}-\d{2}', value):
+        # Before pattern check, otherwise dates like '1999' are rejected
+        value = normalize_release_date(value)
+        if value is None or not isinstance(value, str) or _DATE_PATTERN.match(value):
             return value
-        elif re.match(r'\d{4}', value):
-            return f"{value}-01-01"
-        else:
-            raise ValueError(f"Incorrect value in album_release_date: '{value}'.")
+        raise ValueError(f"Incorrect value in album_release_date: '{value}'.")
 
     @classmethod
     def load_from_json(cls, filename: str, encoding: str = "utf-8"):
@@ -103,8 +115,12 @@ class TrackMeta(BaseModel):
     def get_s3_save_filename(self, prefix: str | None = None):
         """S3 save directory."""
         prefix = prefix or S3_SAVE_PREFIX
-        folder_name = (self.track_name + self.artist_name[0]).replace(" ", "_")
-        return f"{prefix}/{folder_name}/meta"
+        return f"{prefix}/{self.folder_name}/meta"
+
+    @property
+    def folder_name(self) -> str:
+        """Name of track folder on S3."""
+        return (self.track_name + self.artist_name[0]).replace(" ", "_")
 
     @property
     def href(self) -> str:
@@ -120,3 +136,21 @@ class TrackMeta(BaseModel):
         row["href"] = self.href
         del row["track_details"]
         return row
+
+
+_META_LIST_ADAPTER = TypeAdapter(list[TrackMeta])
+
+
+def loads_meta(data: bytes, ndjson: bool = False) -> list[TrackMeta]:
+    """Decode and validate track meta from json.
+
+    Whole batch is parsed and validated in one call of pydantic-core without intermediate dicts.
+    Speed is on par with `orjson.loads` + `TrackMeta(**params)` per object, see benchmarks in tests.
+
+    :param bytes data: json of one track meta or NDJSON with meta per line
+    :param bool ndjson: whether data is NDJSON
+
+    :return list[TrackMeta] meta_list: decoded meta
+    """
+    documents = [line for line in data.splitlines() if line.strip()] if ndjson else [data]
+    return _META_LIST_ADAPTER.validate_json(b"[" + b",".join(documents) + b"]")
@@ -4,6 +4,8 @@ import boto3
 import numpy as np
 import pandas as pd
 
+from playlist_selection.tracks.catalog import CATALOG_KEY, load_catalog_from_s3
+
 DROP_COLUMNS = [
     "diff_sec",
     "file_size_mb",
@@ -11,19 +13,27 @@ DROP_COLUMNS = [
 ]
 
 def load_dataset_from_s3(
-    dataset_key: str = "dataset/filtered_data_30_11_23.csv",
+    dataset_key: str = CATALOG_KEY,
     bucket: str = "hse-project-playlist-selection",
-    profile_name: str = "project"
+    profile_name: str = "project",
+    columns: list[str] | None = None,
+    filters: list[tuple] | None = None,
 ):
-    """Load and preprocess dataset from S3."""
+    """Load and preprocess dataset from S3.
+
+    Parquet catalog is read with column projection and row group filters, legacy csv datasets are still supported.
+    """
     session = boto3.Session(profile_name=profile_name)
     client = session.client("s3")
 
-    body = client.get_object(Bucket=bucket, Key=dataset_key)["Body"]
-    df = pd.read_csv(body, index_col=0)
+    if dataset_key.endswith(".parquet"):
+        df = load_catalog_from_s3(client, bucket_name=bucket, key=dataset_key, columns=columns, filters=filters)
+    else:
+        body = client.get_object(Bucket=bucket, Key=dataset_key)["Body"]
+        df = pd.read_csv(body, index_col=0)
 
-    for column in "genres", "artist_name":
-        df[column] = df[column].apply(literal_eval)
+        for column in "genres", "artist_name":
+            df[column] = df[column].apply(literal_eval)
 
     df.dropna(inplace=True)
     df["album_release_date"] = pd.to_datetime(df["album_release_date"], format="mixed")
@@ -35,5 +45,5 @@ def get_numeric_features(dataset: pd.DataFrame) -> list[str]:
     """Extract numeric features list from dataset."""
     idx = (dataset.select_dtypes(np.number).sample(50, random_state=42).nunique() == 50).index
     numeric_columns = dataset.loc[:, idx].select_dtypes(np.number).columns
-    numeric_columns = numeric_columns.drop(labels=DROP_COLUMNS).tolist()
+    numeric_columns = numeric_columns.drop(labels=DROP_COLUMNS, errors="ignore").tolist()
     return numeric_columns
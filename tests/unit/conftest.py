@@ -1,12 +1,20 @@
-from collections.abc import AsyncGenerator, Iterable
+import io
+import random
+import time
+from collections.abc import AsyncGenerator, Callable, Iterable
 
 import asgi_lifespan
+import boto3
 import fastapi
 from fastapi.testclient import TestClient
 import httpx
 import pytest
+from moto import mock_aws
 from sqlalchemy.ext import asyncio as sa_asyncio
 
+from playlist_selection.tracks.dataset import S3Dataset
+from playlist_selection.tracks.meta import TrackDetails, TrackMeta
+
 
 
 
@@ -29,3 +37,93 @@ async def client(app: fastapi.FastAPI, shutdown_timeout: int = 10) -> AsyncGener
     async with asgi_lifespan.LifespanManager(app, shutdown_timeout=shutdown_timeout) as manager:
         async with httpx.AsyncClient(app=manager.app, base_url=f"http://localhost:5000") as client:
             yield client
+
+
+def _make_meta(i: int, genres: list[str]) -> TrackMeta:
+    """Track meta with all details filled with random values seeded by track index."""
+    rng = random.Random(i)
+    details = {name: rng.random() for name, field in TrackDetails.model_fields.items() if field.annotation == float | None}
+    details.update(
+        {name: rng.randint(1, 100) for name, field in TrackDetails.model_fields.items() if field.annotation == int | None}
+    )
+    return TrackMeta(
+        album_name=f"album {i % 7}",
+        album_id=f"album_id_{i % 7}",
+        album_release_date=f"{1950 + i % 70}-01-01",
+        artist_name=[f"artist {i % 13}"],
+        artist_id=[f"artist_id_{i % 13}"],
+        track_id=f"track_id_{i}",
+        track_name=f"track {i}",
+        genres=genres,
+        track_details=TrackDetails(**details),
+    )
+
+
+@pytest.fixture
+def make_meta() -> Callable[[int, list[str]], TrackMeta]:
+    return _make_meta
+
+
+class FakePaginator:
+    """Paginator over in-memory keys, pages are listed with random delays."""
+
+    def __init__(self, keys: list[str], page_size: int):
+        self.keys = keys
+        self.page_size = page_size
+
+    def paginate(self, Bucket: str, Prefix: str, Delimiter: str | None = None):  # noqa: N803
+        keys = sorted(key for key in self.keys if key.startswith(Prefix))
+        if Delimiter:
+            prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter)[0] + Delimiter for key in keys})
+            yield {"CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes]}
+            return
+        for start in range(0, len(keys), self.page_size):
+            time.sleep(random.random() * 0.005)
+            yield {"Contents": [
+                {"Key": key, "ETag": f'"{key}"', "Size": 1, "LastModified": "2024-01-01"}
+                for key in keys[start:start + self.page_size]
+            ]}
+
+
+class FakeS3Client:
+    """S3 client over in-memory objects, supports only calls of `S3Dataset`."""
+
+    def __init__(self, objects: dict[str, bytes], page_size: int = 2):
+        self.objects = objects
+        self.page_size = page_size
+
+    def get_paginator(self, name: str) -> FakePaginator:
+        return FakePaginator(list(self.objects), self.page_size)
+
+    def get_object(self, Bucket: str, Key: str) -> dict:  # noqa: N803
+        time.sleep(random.random() * 0.001)
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+@pytest.fixture
+def make_dataset() -> Callable[..., S3Dataset]:
+    """Factory of `S3Dataset` over fake S3 objects.
+
+    Objects are mapping of keys relative to `tracks` prefix, like `rock/track 0-artist/meta.json`,
+    to track meta (saved as json) or raw content.
+    """
+    def make(objects: dict[str, TrackMeta | bytes], **dataset_params) -> S3Dataset:
+        s3_objects = {
+            f"tracks/{key}": value.model_dump_json().encode() if isinstance(value, TrackMeta) else value
+            for key, value in objects.items()
+        }
+        return S3Dataset(s3_client=FakeS3Client(s3_objects), bucket_name="bucket", prefix="tracks", **dataset_params)
+
+    return make
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """Client of mocked S3 with empty `bucket`."""
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="bucket")
+        yield s3_client
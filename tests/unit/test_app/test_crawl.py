@@ -0,0 +1,92 @@
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def eager_app():
+    from app.worker import app
+
+    app.conf.task_always_eager = True
+    app.conf.task_eager_propagates = True
+    yield app
+    app.conf.task_always_eager = False
+    app.conf.task_eager_propagates = False
+
+
+def test_crawl_tasks_are_routed_to_io_queue(eager_app):
+    from app.tasks import crawl
+
+    for name in ("crawl_chunk", "download_chunk"):
+        route = eager_app.amqp.router.route({}, f"app.tasks.crawl.{name}")
+        assert route["queue"].name == crawl.CRAWL_QUEUE
+
+
+def test_start_crawl_fans_out_chunks(eager_app, tmp_path):
+    from app.tasks import crawl
+    from playlist_selection.downloading import DownloadReport
+
+    seeds_path = tmp_path / "tracks.txt"
+    seeds_path.write_text("".join(f"rock\tsong {i}\tartist {i}\n" for i in range(25)))
+    dataset = mock.MagicMock()
+    dataset.to_pandas.return_value = pd.DataFrame({"track_id": ["a", "b"]})
+
+    with (
+        mock.patch.object(crawl.SpotifyCrawler, "crawl_chunk", side_effect=lambda seeds: len(seeds)) as crawl_chunk,
+        mock.patch.object(crawl.YouTubeDownloader, "download_audios", return_value=DownloadReport(n_tracks=1)),
+        mock.patch.object(crawl, "_get_s3_client"),
+        mock.patch.object(crawl.ScanManifest, "load_from_s3", return_value=None),
+        mock.patch.object(crawl, "S3Dataset", return_value=dataset),
+        mock.patch.object(crawl, "save_catalog_to_s3") as save_catalog_to_s3,
+    ):
+        result = crawl.start_crawl(str(seeds_path), chunk_size=10, train_model=False).get()
+
+    assert crawl_chunk.call_count == 3
+    assert save_catalog_to_s3.call_count == 1
+    assert result == {
+        "n_chunks": 3,
+        "n_crawled_tracks": 25,
+        "n_downloaded_tracks": 3,
+        "n_failed_downloads": 0,
+        "n_failed_chunks": 0,
+        "n_catalog_tracks": 2,
+        "model_name": None,
+    }
+
+
+def test_crawl_is_finalized_when_chunk_fails(eager_app, tmp_path):
+    from app.tasks import crawl
+    from playlist_selection.downloading import DownloadReport
+
+    # Eager tasks are retried only without propagation of errors
+    eager_app.conf.task_eager_propagates = False
+
+    seeds_path = tmp_path / "tracks.txt"
+    seeds_path.write_text("".join(f"rock\tsong {i}\tartist {i}\n" for i in range(25)))
+    dataset = mock.MagicMock()
+    dataset.to_pandas.return_value = pd.DataFrame({"track_id": ["a", "b"]})
+
+    def crawl_seeds(seeds):
+        # Chunk with first seed always fails
+        if seeds[0][1].name == "song 0":
+            raise ConnectionError("spotify is unavailable")
+        return len(seeds)
+
+    with (
+        mock.patch.object(crawl.SpotifyCrawler, "crawl_chunk", side_effect=crawl_seeds) as crawl_chunk,
+        mock.patch.object(crawl.YouTubeDownloader, "download_audios", return_value=DownloadReport(n_tracks=1)),
+        mock.patch.object(crawl, "_get_s3_client"),
+        mock.patch.object(crawl.ScanManifest, "load_from_s3", return_value=None),
+        mock.patch.object(crawl, "S3Dataset", return_value=dataset),
+        mock.patch.object(crawl, "save_catalog_to_s3") as save_catalog_to_s3,
+    ):
+        result = crawl.start_crawl(str(seeds_path), chunk_size=10, train_model=False).get()
+
+    # Failed chunk is retried
+    assert crawl_chunk.call_count == 2 + crawl.CRAWL_MAX_RETRIES + 1
+    assert save_catalog_to_s3.call_count == 1
+    assert result["n_chunks"] == 3
+    assert result["n_crawled_tracks"] == 15
+    assert result["n_downloaded_tracks"] == 3
+    assert result["n_failed_chunks"] == 1
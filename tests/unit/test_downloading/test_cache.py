@@ -0,0 +1,103 @@
+import time
+from unittest import mock
+
+import pytest
+from pytube.exceptions import VideoUnavailable
+
+from playlist_selection.downloading import downloader as downloader_module
+from playlist_selection.downloading.cache import SearchCache, SearchResult
+from playlist_selection.downloading.downloader import BaseAudioDumper, YouTubeDownloader
+from playlist_selection.tracks.meta import Song
+
+QUERY = "song by artist" # Query of `SONG`
+SONG = Song(name="song", artist="artist")
+
+
+def test_get_returns_cached_result():
+    cache = SearchCache()
+    assert cache.get(QUERY) is None
+    result = SearchResult(video_id="video_id", itag=140, filesize=1000)
+    cache.set(QUERY, result)
+    assert cache.get(QUERY) == result
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+
+    cache.delete(QUERY)
+    assert cache.get(QUERY) is None
+
+
+def test_query_is_normalized():
+    cache = SearchCache()
+    cache.set("Song  by\tArtist ", SearchResult(video_id="video_id", itag=140))
+    assert cache.get(QUERY) == SearchResult(video_id="video_id", itag=140)
+    assert cache.get("SONG BY ARTIST") is not None
+    cache.delete(" song by ARTIST")
+    assert cache.get(QUERY) is None
+
+
+def test_result_expires():
+    cache = SearchCache(ttl_seconds=0.05)
+    cache.set(QUERY, SearchResult(video_id="video_id", itag=140))
+    assert cache.get(QUERY) is not None
+    time.sleep(0.06)
+    assert cache.get(QUERY) is None
+    # Expired result is replaced by new one
+    cache.set(QUERY, SearchResult(video_id="new_video_id", itag=140))
+    assert cache.get(QUERY).video_id == "new_video_id"
+
+
+def test_cache_is_persistent(tmp_path):
+    path = str(tmp_path / "search.sqlite")
+    cache = SearchCache(path)
+    cache.set(QUERY, SearchResult(video_id="video_id", itag=140))
+    cache.close()
+    assert SearchCache(path).get(QUERY) == SearchResult(video_id="video_id", itag=140)
+
+
+@pytest.fixture
+def cache() -> SearchCache:
+    cache = SearchCache()
+    cache.set(QUERY, SearchResult(video_id="cached_video_id", itag=140, filesize=1000))
+    return cache
+
+
+@pytest.fixture
+def search():
+    """Mocked search finding video with stream of itag 251."""
+    stream = mock.Mock(itag=251, filesize_approx=2000)
+    video = mock.Mock(video_id="new_video_id")
+    video.streams.filter.return_value.first.return_value = stream
+    with mock.patch.object(downloader_module, "Search") as search:
+        search.return_value.results = [video]
+        yield search
+
+
+def test_cached_video_skips_search(cache, search):
+    video = mock.Mock()
+    downloader = YouTubeDownloader(mock.Mock(spec=BaseAudioDumper), search_cache=cache)
+    with mock.patch.object(downloader_module.YouTube, "from_id", return_value=video) as from_id:
+        assert downloader.search_track_audio(SONG) is video.streams.get_by_itag.return_value
+    from_id.assert_called_once_with("cached_video_id")
+    video.streams.get_by_itag.assert_called_once_with(140)
+    search.assert_not_called()
+
+
+def test_unavailable_cached_video_is_searched_again(cache, search):
+    video = mock.Mock()
+    type(video).streams = mock.PropertyMock(side_effect=VideoUnavailable("cached_video_id"))
+    downloader = YouTubeDownloader(mock.Mock(spec=BaseAudioDumper), search_cache=cache)
+    with mock.patch.object(downloader_module.YouTube, "from_id", return_value=video):
+        stream = downloader.search_track_audio(SONG)
+    search.assert_called_once_with(QUERY)
+    assert stream.itag == 251
+    assert cache.get(QUERY) == SearchResult(video_id="new_video_id", itag=251, filesize=2000)
+
+
+def test_missing_cached_stream_is_searched_again(cache, search):
+    video = mock.Mock()
+    video.streams.get_by_itag.return_value = None
+    downloader = YouTubeDownloader(mock.Mock(spec=BaseAudioDumper), search_cache=cache)
+    with mock.patch.object(downloader_module.YouTube, "from_id", return_value=video):
+        assert downloader.search_track_audio(SONG).itag == 251
+    search.assert_called_once_with(QUERY)
+    assert cache.get(QUERY).video_id == "new_video_id"
@@ -0,0 +1,130 @@
+import os
+from unittest import mock
+
+import pytest
+
+from playlist_selection.downloading import downloader as downloader_module
+from playlist_selection.downloading.downloader import BaseAudioDumper, S3AudioDumper, YouTubeDownloader
+from playlist_selection.downloading.manifest import COMPLETED, FAILED, DownloadManifest
+from playlist_selection.tracks.meta import Song
+
+PART_SIZE = 5 * 2 ** 20 # S3 minimum part size
+CONTENT = bytes(range(256)) * (6 * 2 ** 12) # Larger than single part
+
+
+class FakeStream:
+    """Audio stream found by search, downloads `CONTENT` to file."""
+
+    url = "https://example.com/audio"
+
+    def download(self, filename: str):
+        with open(filename, "wb") as fout:
+            fout.write(CONTENT)
+
+
+class LocalAudioDumper(BaseAudioDumper):
+    """Dumper keeping saved audio in memory."""
+
+    def __init__(self):
+        self.saved: dict[str, bytes] = {}
+
+    def dump_audio(self, song: Song, file_path: str):
+        with open(file_path, "rb") as fin:
+            self.saved[self.get_relative_path(song)] = fin.read()
+
+
+def iter_chunks(fail_after: int | None = None):
+    for n_chunks, start in enumerate(range(0, len(CONTENT), 2 ** 20)):
+        if n_chunks == fail_after:
+            raise ConnectionError("connection reset")
+        yield CONTENT[start:start + 2 ** 20]
+
+
+@pytest.fixture
+def s3_dumper(s3_client) -> S3AudioDumper:
+    dumper = S3AudioDumper(
+        schema="https", host="s3.amazonaws.com", bucket_name="bucket", prefix="", part_size=PART_SIZE,
+    )
+    dumper._s3_client = s3_client
+    return dumper
+
+
+def download(dumper: BaseAudioDumper, fail_after: int | None = None):
+    downloader = YouTubeDownloader(dumper)
+    with (
+        mock.patch.object(downloader, "search_track_audio", return_value=FakeStream()),
+        mock.patch.object(downloader_module.request, "stream", side_effect=lambda url: iter_chunks(fail_after)),
+        mock.patch.object(downloader, "download_single_audio", wraps=downloader.download_single_audio) as temp_download,
+    ):
+        report = downloader.download_audios([("artist", "song")], skip_existing=False, progress=False)
+    return report, temp_download
+
+
+def test_stream_to_s3_without_temp_file(s3_client, s3_dumper):
+    report, temp_download = download(s3_dumper)
+    temp_download.assert_not_called()
+    assert report.n_tracks == 1
+    assert report.n_fallbacks == 0
+    assert report.n_bytes == len(CONTENT)
+    assert report.peak_disk_bytes == 0
+    assert s3_client.get_object(Bucket="bucket", Key="song-artist/audio.mp3")["Body"].read() == CONTENT
+
+
+def test_failed_stream_falls_back_to_temp_file(s3_client, s3_dumper):
+    # Stream fails after first part is uploaded
+    report, temp_download = download(s3_dumper, fail_after=len(CONTENT) // 2 ** 20 - 1)
+    temp_download.assert_called_once()
+    assert report.n_tracks == 1
+    assert report.n_failed == 0
+    assert report.n_fallbacks == 1
+    assert report.n_bytes == len(CONTENT)
+    assert report.peak_disk_bytes == len(CONTENT)
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket="bucket")
+    assert s3_client.get_object(Bucket="bucket", Key="song-artist/audio.mp3")["Body"].read() == CONTENT
+
+
+def test_dump_audio_stream_writes_temp_file_by_default():
+    dumper = LocalAudioDumper()
+    report, _ = download(dumper)
+    assert report.n_fallbacks == 0
+    assert dumper.saved == {"song-artist/audio.mp3": CONTENT}
+
+
+def test_temp_files_are_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader_module.tempfile, "tempdir", str(tmp_path))
+    dumper = LocalAudioDumper()
+    report, temp_download = download(dumper, fail_after=2)
+    temp_download.assert_called_once()
+    assert report.n_fallbacks == 1
+    assert dumper.saved == {"song-artist/audio.mp3": CONTENT}
+    assert os.listdir(tmp_path) == []
+
+
+def test_manifest_records_attempts():
+    manifest = DownloadManifest()
+    dumper = LocalAudioDumper()
+    downloader = YouTubeDownloader(dumper, streaming=False)
+    # First song is found by second search, second one is never found
+    search_results = {"song": [ConnectionError("search failed"), FakeStream()]}
+
+    def search(song):
+        if song.name not in search_results:
+            raise ConnectionError("search failed")
+        result = search_results[song.name].pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with mock.patch.object(downloader, "search_track_audio", side_effect=search):
+        report = downloader.download_audios(
+            [("artist", "song"), ("artist", "missing")], manifest=manifest, skip_existing=False,
+            max_retries=1, retry_backoff_seconds=0.0, progress=False,
+        )
+    assert report.n_tracks == 1
+    assert report.n_failed == 1
+    assert manifest.get_statuses(["song-artist/audio.mp3", "missing-artist/audio.mp3"]) == {
+        "song-artist/audio.mp3": COMPLETED, "missing-artist/audio.mp3": FAILED,
+    }
+    # Two searches and download
+    assert manifest.get_attempts("song-artist/audio.mp3") == 3
+    assert manifest.get_attempts("missing-artist/audio.mp3") == 2
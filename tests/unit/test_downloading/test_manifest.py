@@ -0,0 +1,22 @@
+from playlist_selection.downloading.manifest import COMPLETED, FAILED, SKIPPED, DownloadManifest
+
+
+def test_mark_adds_attempts_of_runs():
+    manifest = DownloadManifest()
+    manifest.mark("a/audio.mp3", FAILED, attempts=3, error="ConnectionError()")
+    assert manifest.get_statuses(["a/audio.mp3", "b/audio.mp3"]) == {"a/audio.mp3": FAILED}
+    assert manifest.get_attempts("a/audio.mp3") == 3
+
+    manifest.mark("a/audio.mp3", COMPLETED, attempts=2)
+    assert manifest.get_statuses(["a/audio.mp3"]) == {"a/audio.mp3": COMPLETED}
+    assert manifest.get_attempts("a/audio.mp3") == 5
+    assert manifest.get_attempts("b/audio.mp3") == 0
+
+
+def test_mark_many():
+    manifest = DownloadManifest()
+    manifest.mark_many([f"{i}/audio.mp3" for i in range(1000)], SKIPPED)
+    assert manifest.summary() == {SKIPPED: 1000}
+    assert manifest.get_statuses(f"{i}/audio.mp3" for i in range(1000)) == {
+        f"{i}/audio.mp3": SKIPPED for i in range(1000)
+    }
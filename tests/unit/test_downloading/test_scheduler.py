@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from playlist_selection.downloading.scheduler import AdaptiveLimit, DownloadScheduler
+
+RUN_TIMEOUT_SECONDS = 10.0 # Scheduler run that takes longer is considered hanging
+
+
+def test_limit_increases_additively():
+    limit = AdaptiveLimit(max_limit=8, target_latency_seconds=1.0)
+    assert limit.limit == 4
+    # About +1 after limit fast calls
+    for _ in range(4):
+        limit.record(0.1)
+    assert 4.8 < limit.limit < 5
+    for _ in range(100):
+        limit.record(0.1)
+    assert limit.limit == 8
+
+
+@pytest.mark.parametrize("latency_seconds", [None, 2.0])
+def test_limit_decreases_multiplicatively_once_per_target_latency(latency_seconds):
+    limit = AdaptiveLimit(max_limit=16, target_latency_seconds=0.05, initial_limit=16)
+    limit.record(latency_seconds)
+    assert limit.limit == 8
+    # Calls in flight during same congestion don't decrease limit again
+    limit.record(latency_seconds)
+    assert limit.limit == 8
+    time.sleep(0.06)
+    limit.record(latency_seconds)
+    assert limit.limit == 4
+
+
+def test_limit_is_not_less_than_min_limit():
+    limit = AdaptiveLimit(max_limit=4, target_latency_seconds=0.0, min_limit=2)
+    for _ in range(5):
+        limit.record(None)
+    assert limit.limit == 2
+
+
+def test_acquire_waits_for_free_slot():
+    limit = AdaptiveLimit(max_limit=4, target_latency_seconds=1.0, initial_limit=2)
+    limit.acquire()
+    limit.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limit.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+
+    limit.release()
+    assert acquired.wait(1.0)
+    thread.join()
+    assert limit.in_flight == 2
+    assert limit.peak_in_flight == 2
+
+
+def postprocess(key: str, item: int, result: int) -> tuple[str, int]:
+    return key, item + result
+
+
+def run_scheduler(scheduler: DownloadScheduler, items: list[tuple[str, int]], on_result=None):
+    """Run scheduler in thread, so hanging run fails test instead of blocking it."""
+    output = {}
+    thread = threading.Thread(
+        target=lambda: output.update(stats=scheduler.run(items, on_result=on_result)), daemon=True,
+    )
+    thread.start()
+    thread.join(RUN_TIMEOUT_SECONDS)
+    assert not thread.is_alive(), "scheduler run hangs"
+    return output["stats"]
+
+
+def make_scheduler(**params) -> DownloadScheduler:
+    params = {
+        "search_fn": lambda item: item * 10,
+        "download_fn": lambda item, found: found + 1,
+        "search_max_workers": 4,
+        "download_max_workers": 4,
+        "retry_backoff_seconds": 0.0,
+        "progress": False,
+        **params,
+    }
+    return DownloadScheduler(**params)
+
+
+def test_run_calls_on_result_for_all_items():
+    results = {}
+    stats = run_scheduler(
+        make_scheduler(),
+        [(f"key {i}", i) for i in range(50)],
+        on_result=lambda key, result, error, attempts: results.update({key: (result, error, attempts)}),
+    )
+    assert results == {f"key {i}": (i * 10 + 1, None, 2) for i in range(50)}
+    assert stats.search.n_completed == stats.download.n_completed == 50
+    assert stats.n_bytes == sum(i * 10 + 1 for i in range(50))
+    assert stats.search.peak_in_flight <= 4
+    assert stats.download.peak_in_flight <= 4
+
+
+def test_run_retries_failed_stages():
+    n_calls = {}
+
+    def download(item: int, found: int) -> int:
+        n_calls[item] = n_calls.get(item, 0) + 1
+        # Odd items fail once, item 0 always fails
+        if item == 0 or (item % 2 and n_calls[item] == 1):
+            raise ConnectionError(f"failed {item}")
+        return found
+
+    results = {}
+    stats = run_scheduler(
+        make_scheduler(download_fn=download, max_retries=2),
+        [(f"key {i}", i) for i in range(10)],
+        on_result=lambda key, result, error, attempts: results.update({key: (result, error, attempts)}),
+    )
+    assert isinstance(results["key 0"][1], ConnectionError)
+    assert results["key 0"][2] == 4
+    for i in range(1, 10):
+        assert results[f"key {i}"] == (i * 10, None, 3 if i % 2 else 2)
+    assert stats.download.n_failed == 1
+    assert stats.download.n_retries == 2 + 5
+
+
+def test_run_finishes_when_on_result_raises():
+    finished = []
+
+    def on_result(key, result, error, attempts):
+        if key == "key 3":
+            raise RuntimeError("database is locked")
+        finished.append(key)
+
+    stats = run_scheduler(make_scheduler(), [(f"key {i}", i) for i in range(10)], on_result=on_result)
+    assert sorted(finished) == sorted(f"key {i}" for i in range(10) if i != 3)
+    assert stats.download.n_completed == 10
+
+
+def test_run_postprocesses_downloaded_items():
+    scheduler = make_scheduler(postprocess_fn=postprocess, n_processes=2)
+    stats = run_scheduler(scheduler, [(f"key {i}", i) for i in range(10)])
+    assert scheduler.postprocess_results_ == {f"key {i}": (f"key {i}", i * 11 + 1) for i in range(10)}
+    assert stats.postprocess.n_completed == 10
+
+
+def test_run_counts_failed_postprocess():
+    # Lambda can't be pickled to process pool
+    scheduler = make_scheduler(postprocess_fn=lambda key, item, result: result, n_processes=1)
+    stats = run_scheduler(scheduler, [(f"key {i}", i) for i in range(3)])
+    assert scheduler.postprocess_results_ == {}
+    assert stats.postprocess.n_failed == 3
+    assert stats.download.n_completed == 3
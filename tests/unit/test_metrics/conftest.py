@@ -0,0 +1,35 @@
+import typing as tp
+
+import pytest
+
+from playlist_selection.models import KnnModel
+from playlist_selection.tracks.catalog import catalog_from_pandas, write_catalog
+
+N_TRACKS = 60
+GENRES = ["rock", "jazz", "blues"]
+
+
+@pytest.fixture
+def make_catalog(make_dataset, make_meta) -> tp.Callable[[str, range], str]:
+    def write_tracks_catalog(path: str, indexes: range) -> str:
+        """Write catalog of tracks with given indexes."""
+        dataset = make_dataset({
+            f"{GENRES[i % 3]}/track {i}-artist/meta.json": make_meta(i, [GENRES[i % 3], "pop"]) for i in indexes
+        }).scan()
+        # Small row groups, so catalog is read in several batches
+        write_catalog(catalog_from_pandas(dataset.to_pandas()), path, row_group_size=16)
+        return path
+
+    return write_tracks_catalog
+
+
+@pytest.fixture
+def catalog_path(make_catalog, tmp_path) -> str:
+    return make_catalog(str(tmp_path / "catalog.parquet"), range(N_TRACKS))
+
+
+@pytest.fixture
+def model(catalog_path) -> KnnModel:
+    model = KnnModel(k_neighbors=3, n_components=5)
+    model.train(catalog_path)
+    return model
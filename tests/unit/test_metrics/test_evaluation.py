@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from playlist_selection.metrics.evaluation import (
+    METRIC_TARGETS,
+    drop_query_neighbors,
+    evaluate_model,
+    get_metrics,
+    get_targets,
+    iter_neighbors,
+)
+from playlist_selection.models import KnnModel
+from playlist_selection.tracks.catalog import iter_catalog, read_catalog
+
+N_TRACKS = 60 # Same as in conftest
+
+
+def evaluate_in_memory(model: KnnModel, source: str, train_source: str) -> dict[str, float]:
+    """Evaluate metrics with `compute` over all queries at once."""
+    queries = read_catalog(source)
+    train_ids = [model.mapping[i] for i in range(len(model.mapping))]
+    train_targets = get_targets(read_catalog(train_source), track_ids=train_ids)
+    query_targets = get_targets(queries)
+
+    neighbors_indexes = model.model_pipeline[-1].kneighbors(
+        model.model_pipeline[:-1].transform(queries), return_distance=False,
+    )
+    predictions = []
+    for track_id, indexes in zip(queries["track_id"], neighbors_indexes):
+        indexes = list(indexes)
+        ids = [train_ids[index] for index in indexes]
+        # Query itself or farthest neighbour isn't a prediction
+        del indexes[ids.index(track_id) if track_id in ids else -1]
+        predictions.append(indexes)
+
+    return {
+        metric.name: metric(
+            query_targets[METRIC_TARGETS[metric.name]],
+            np.take(train_targets[METRIC_TARGETS[metric.name]], np.array(predictions), axis=0),
+        )
+        for metric in get_metrics()
+    }
+
+
+def test_iter_catalog_matches_read_catalog(catalog_path):
+    batches = list(iter_catalog(catalog_path, batch_size=16))
+    assert len(batches) == 4
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), read_catalog(catalog_path))
+
+
+def test_drop_query_neighbors():
+    train_ids = np.array(["a", "b", "c", "d"], dtype=object)
+    neighbors_indexes = np.array([[0, 1, 2], [2, 1, 3], [3, 0, 1]])
+    query_ids = np.array(["b", "x", "d"], dtype=object)
+    result = drop_query_neighbors(neighbors_indexes, query_ids, train_ids)
+    np.testing.assert_array_equal(result, [[0, 2], [2, 1], [0, 1]])
+
+
+def test_iter_neighbors_excludes_query(model, catalog_path):
+    batches = list(iter_neighbors(model, catalog_path, batch_size=7))
+    assert sum(len(batch) for batch, _ in batches) == N_TRACKS
+    for batch, neighbors_indexes in batches:
+        assert neighbors_indexes.shape == (len(batch), model.k_neighbors)
+        neighbor_ids = np.vectorize(model.mapping.get)(neighbors_indexes)
+        assert not (neighbor_ids == batch["track_id"].to_numpy().reshape(-1, 1)).any()
+
+
+@pytest.mark.parametrize("batch_size", [7, 1000])
+def test_evaluate_model_matches_in_memory(model, catalog_path, batch_size):
+    results = evaluate_model(model, catalog_path, batch_size=batch_size, progress=False)
+    expected = evaluate_in_memory(model, catalog_path, catalog_path)
+    assert results.keys() == expected.keys()
+    for name, value in expected.items():
+        assert results[name] == pytest.approx(value), name
+
+
+def test_evaluate_model_on_unseen_queries(make_catalog, tmp_path):
+    train_path = make_catalog(str(tmp_path / "train.parquet"), range(40))
+    queries_path = make_catalog(str(tmp_path / "queries.parquet"), range(40, N_TRACKS))
+    model = KnnModel(k_neighbors=3, n_components=5)
+    model.train(train_path)
+
+    results = evaluate_model(model, queries_path, train_source=train_path, batch_size=7, progress=False)
+    expected = evaluate_in_memory(model, queries_path, train_path)
+    for name, value in expected.items():
+        assert results[name] == pytest.approx(value), name
+
+
+def test_evaluate_model_rejects_unknown_metric(model, catalog_path):
+    metric = get_metrics()[0]
+    metric.name = "Unknown"
+    with pytest.raises(ValueError, match="Unknown target"):
+        evaluate_model(model, catalog_path, metrics=[metric], progress=False)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from playlist_selection.metrics import (
+    CorrectArtistShare,
+    CorrectGenreShare,
+    CorrectMultipleGenreShare,
+    SoundParametersDiff,
+    YearMeanDiff,
+)
+from playlist_selection.metrics.sweep import pareto_front
+from playlist_selection.metrics.utils import encode_multi_hot, overlap_mask
+
+N_TRACKS = 100_000
+K_NEIGHBORS = 10
+N_LABELS = 500
+
+
+def set_overlap_share(y_true, y_pred) -> float:
+    """Previous set based implementation."""
+    mask = [
+        [bool(set(true_labels) & set(pred_labels)) for pred_labels in predictions]
+        for true_labels, predictions in zip(y_true, y_pred)
+    ]
+    return np.mean(mask)
+
+
+def pairwise_sound_diff(y_true, y_pred) -> float:
+    """Previous per pair implementation."""
+    def l2_norm(first, second):
+        diff = np.abs(first - second) / np.abs(np.maximum(first, second))
+        return np.sqrt(np.nansum(np.square(diff)))
+
+    return np.array([[l2_norm(true, pred) for pred in preds] for true, preds in zip(y_true, y_pred)]).mean()
+
+
+def make_labels(rng: np.random.Generator, n_rows: int) -> list[list[str]]:
+    return [[f"label_{i}" for i in rng.integers(N_LABELS, size=rng.integers(0, 4))] for _ in range(n_rows)]
+
+
+@pytest.fixture(scope="module")
+def catalog() -> list[list[str]]:
+    return make_labels(np.random.default_rng(0), N_TRACKS)
+
+
+@pytest.fixture(scope="module")
+def neighbors_indexes() -> np.ndarray:
+    return np.random.default_rng(1).integers(N_TRACKS, size=(N_TRACKS, K_NEIGHBORS))
+
+
+@pytest.mark.parametrize("metric_class", [CorrectMultipleGenreShare, CorrectArtistShare])
+def test_overlap_share_matches_sets(metric_class):
+    rng = np.random.default_rng(2)
+    y_true = make_labels(rng, 200)
+    y_pred = np.empty((200, 5), dtype=object)
+    for i in range(200):
+        y_pred[i] = [labels for labels in make_labels(rng, 5)]
+    y_pred[0, 0] = y_true[0] + y_true[0]
+    assert metric_class().compute(y_true, y_pred) == set_overlap_share(y_true, y_pred)
+
+
+def test_overlap_mask_gathers_catalog_rows():
+    catalog_matrix, vocabulary = encode_multi_hot([["rock"], ["pop", "jazz"], []])
+    true_matrix, _ = encode_multi_hot([["jazz", "blues"], ["rock"]], vocabulary)
+    mask = overlap_mask(true_matrix, catalog_matrix, np.array([[1, 2], [0, 1]]))
+    assert mask.tolist() == [[True, False], [True, False]]
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_sound_parameters_diff_matches_pairwise(dtype, chunk_size):
+    rng = np.random.default_rng(3)
+    y_true = rng.normal(size=(100, 6)).astype(dtype)
+    y_pred = rng.normal(size=(100, 4, 6)).astype(dtype)
+    y_true[rng.random(y_true.shape) < 0.1] = np.nan
+    y_pred[rng.random(y_pred.shape) < 0.1] = np.nan
+    y_true[0] = np.nan
+    assert SoundParametersDiff.compute(y_true, y_pred, chunk_size=chunk_size) == pairwise_sound_diff(y_true, y_pred)
+
+
+@pytest.mark.parametrize("metric,y_true,y_pred", [
+    (CorrectGenreShare(), ["rock", "pop", "jazz"] * 10, [["rock", "pop"], ["pop", "pop"], ["rock", "rock"]] * 10),
+    (CorrectArtistShare(), [["a"], ["b", "c"], []] * 10, [[["a"], ["b"]], [["c"], []], [["a"], ["c"]]] * 10),
+    (YearMeanDiff(), [1999, 2005, 2010] * 10, [[1998, 2000], [2005, 2015], [1990, 2011]] * 10),
+])
+def test_update_matches_compute(metric, y_true, y_pred):
+    for start in range(0, len(y_true), 7):
+        metric.update(y_true[start:start + 7], y_pred[start:start + 7])
+    assert metric.result() == pytest.approx(metric(y_true, y_pred))
+    metric.reset()
+    assert np.isnan(metric.result())
+
+
+def test_pareto_front():
+    table = pd.DataFrame({
+        "CorrectGenreShare": [0.5, 0.6, 0.4, 0.6],
+        "YearMeanDiff": [5.0, 3.0, 2.0, 4.0],
+        "query_latency_ms": [1.0, 2.0, 3.0, 2.5],
+    })
+    assert pareto_front(table, "CorrectGenreShare").tolist() == [True, True, False, False]
+    assert pareto_front(table, "YearMeanDiff").tolist() == [True, True, True, False]
+
+
+@pytest.mark.slow
+def test_set_overlap_benchmark(benchmark, catalog, neighbors_indexes):
+    y_pred = [[catalog[i] for i in row] for row in neighbors_indexes]
+    benchmark(set_overlap_share, catalog, y_pred)
+
+
+@pytest.mark.slow
+def test_sparse_overlap_benchmark(benchmark, catalog, neighbors_indexes):
+    y_pred = [[catalog[i] for i in row] for row in neighbors_indexes]
+    share = benchmark(CorrectMultipleGenreShare.compute, catalog, y_pred)
+    assert share == set_overlap_share(catalog, y_pred)
+
+
+@pytest.mark.slow
+def test_sparse_overlap_from_indexes_benchmark(benchmark, catalog, neighbors_indexes):
+    catalog_matrix, _ = encode_multi_hot(catalog)
+    share = benchmark(lambda: overlap_mask(catalog_matrix, catalog_matrix, neighbors_indexes).mean())
+    y_pred = [[catalog[i] for i in row] for row in neighbors_indexes]
+    assert share == set_overlap_share(catalog, y_pred)
@@ -0,0 +1,34 @@
+import pytest
+
+from playlist_selection.metrics.evaluation import evaluate_model, get_metrics
+from playlist_selection.metrics.sweep import SweepConfig, run_sweep
+
+
+def test_run_sweep_matches_evaluate_model(model, catalog_path):
+    configs = [
+        SweepConfig(k_neighbors=model.k_neighbors, metric=model.metric, n_components=model.n_components),
+        SweepConfig(k_neighbors=2, metric="euclidean", n_components=3),
+        # More components than features, skipped
+        SweepConfig(k_neighbors=2, metric="euclidean", n_components=10_000),
+    ]
+    table = run_sweep(catalog_path, configs, n_processes=2, batch_size=7, objective="CorrectGenreShare")
+
+    assert len(table) == 2
+    assert table["pareto"].any()
+    assert (table[["fit_seconds", "query_latency_ms", "peak_memory_mb", "model_size_mb"]] > 0).all().all()
+    assert table["CorrectGenreShare"].is_monotonic_decreasing
+
+    # Same model as in KnnModel pipeline
+    row = table.set_index(["k_neighbors", "metric", "n_components"]).loc[
+        (model.k_neighbors, model.metric, model.n_components)
+    ]
+    expected = evaluate_model(model, catalog_path, progress=False)
+    for metric in get_metrics():
+        assert row[metric.name] == pytest.approx(expected[metric.name]), metric.name
+
+
+def test_run_sweep_evaluates_subset_of_queries(catalog_path):
+    configs = [SweepConfig(k_neighbors=2, metric="cosine", n_components=3)]
+    table = run_sweep(catalog_path, configs, n_processes=1, n_eval_queries=10)
+    assert len(table) == 1
+    assert 0 <= table.loc[0, "CorrectGenreShare"] <= 1
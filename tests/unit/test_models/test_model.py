@@ -0,0 +1,55 @@
+import pytest
+
+from playlist_selection.models import KnnModel
+from playlist_selection.tracks.catalog import catalog_from_pandas, write_catalog
+from playlist_selection.tracks.dataset import S3Dataset
+
+K_NEIGHBORS = 3
+GENRES = ["rock", "jazz", "blues"]
+
+
+@pytest.fixture
+def dataset(make_dataset, make_meta) -> S3Dataset:
+    return make_dataset({
+        f"{GENRES[i % 3]}/track {i}-artist/meta.json": make_meta(i, [GENRES[i % 3], "pop"]) for i in range(30)
+    }).scan()
+
+
+def assert_excludes_queries(predictions: list[str], query_ids: list[str]):
+    assert len(predictions) == len(query_ids) * K_NEIGHBORS
+    for i, query_id in enumerate(query_ids):
+        neighbors = predictions[i * K_NEIGHBORS:(i + 1) * K_NEIGHBORS]
+        assert query_id not in neighbors
+        assert None not in neighbors
+
+
+def test_predict_excludes_query_after_training_on_catalog(dataset, tmp_path):
+    # Catalog stores float32 features, queries have float64 ones
+    catalog_path = str(tmp_path / "catalog.parquet")
+    write_catalog(catalog_from_pandas(dataset.to_pandas()), catalog_path)
+    model = KnnModel(k_neighbors=K_NEIGHBORS, n_components=5)
+    model.train(catalog_path)
+
+    queries = dataset.to_pandas().iloc[:5]
+    assert_excludes_queries(model.predict(queries), queries["track_id"].tolist())
+
+
+def test_predict_keeps_other_queries_as_neighbors(dataset):
+    model = KnnModel(k_neighbors=K_NEIGHBORS, n_components=5)
+    model.train(dataset.to_pandas())
+
+    queries = dataset.to_pandas()
+    predictions = model.predict(queries)
+    assert_excludes_queries(predictions, queries["track_id"].tolist())
+    # Tracks of request are still neighbours of each other
+    assert set(predictions) & set(queries["track_id"])
+
+
+def test_predict_excludes_query_after_training_on_track_batch(dataset):
+    # TrackBatch stores float32 features
+    model = KnnModel(k_neighbors=K_NEIGHBORS, n_components=5)
+    model.train(dataset.to_batch())
+
+    queries = dataset.to_pandas().iloc[:5]
+    assert_excludes_queries(model.predict(queries), queries["track_id"].tolist())
+    assert_excludes_queries(model.predict(dataset.to_batch()), dataset.to_pandas()["track_id"].tolist())
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from playlist_selection.parsing.crawl import CrawlCheckpoint, SpotifyCrawler, read_seeds
+from playlist_selection.tracks.meta import Song, TrackMeta
+
+
+class FakeParser:
+    """Parser returning meta for each song, uploads of `failed_genres` fail."""
+
+    def __init__(self, failed_genres: set[str] | None = None):
+        self.failed_genres = failed_genres or set()
+        self.parsed_songs: list[Song] = []
+        self.saved: dict[str, list[TrackMeta]] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, song_list: list[Song]) -> list[TrackMeta]:
+        with self._lock:
+            self.parsed_songs.extend(song_list)
+        return [
+            TrackMeta(track_id=f"{song.name}-{song.artist}", track_name=song.name, artist_name=[song.artist])
+            for song in song_list
+        ]
+
+    def load_to_s3(self, tracks_meta: list[TrackMeta], prefix: str, **kwargs):
+        genre = prefix.split("/")[-1]
+        if genre in self.failed_genres:
+            raise RuntimeError(f"Failed to save {len(tracks_meta)} objects.")
+        with self._lock:
+            self.saved.setdefault(prefix, []).extend(tracks_meta)
+
+
+@pytest.fixture
+def seeds_path(tmp_path) -> str:
+    genres = ["rock", "pop", "rock", "pop", "jazz", "pop", "rock", "pop", "rock", "pop"]
+    lines = [f"{genre}\ttrack {i}\tartist {i}\n" for i, genre in enumerate(genres)]
+    # Malformed lines
+    lines.insert(3, "rock\ttrack without artist\n")
+    lines.insert(7, "\t\t\n")
+    path = tmp_path / "tracks.txt"
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def make_crawler(parser: FakeParser, checkpoint_path: str) -> SpotifyCrawler:
+    return SpotifyCrawler(
+        parser=parser,
+        schema="http",
+        host="localhost",
+        bucket_name="bucket",
+        checkpoint_path=checkpoint_path,
+        chunk_size=4,
+        n_workers=2,
+    )
+
+
+def test_read_seeds(seeds_path):
+    chunks = list(read_seeds(seeds_path, chunk_size=4))
+    assert [index for index, _ in chunks] == [0, 1, 2]
+    # Malformed lines are skipped, but still count to chunk size
+    assert [len(seeds) for _, seeds in chunks] == [3, 3, 4]
+    assert chunks[0][1][0] == ("rock", Song(name="track 0", artist="artist 0"))
+
+
+def test_crawl_saves_meta_by_genre(seeds_path, tmp_path):
+    parser = FakeParser()
+    checkpoint = make_crawler(parser, str(tmp_path / "checkpoint.json")).run(seeds_path)
+    assert checkpoint.done_chunks == {0, 1, 2}
+    assert checkpoint.n_seeds == checkpoint.n_tracks == 10
+    assert {prefix: len(meta) for prefix, meta in parser.saved.items()} == {
+        "tracks/rock": 4, "tracks/pop": 5, "tracks/jazz": 1,
+    }
+    assert CrawlCheckpoint.load(str(tmp_path / "checkpoint.json")) == checkpoint
+
+
+def test_crawl_resumes_from_checkpoint(seeds_path, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    CrawlCheckpoint(seeds_path=seeds_path, chunk_size=4, done_chunks={0, 2}, n_seeds=7, n_tracks=7).save(
+        checkpoint_path,
+    )
+    parser = FakeParser()
+    checkpoint = make_crawler(parser, checkpoint_path).run(seeds_path)
+    assert sorted(song.name for song in parser.parsed_songs) == ["track 3", "track 4", "track 5"]
+    assert checkpoint.done_chunks == {0, 1, 2}
+    assert checkpoint.n_seeds == checkpoint.n_tracks == 10
+
+
+def test_crawl_rejects_checkpoint_of_other_crawl(seeds_path, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    CrawlCheckpoint(seeds_path=seeds_path, chunk_size=100).save(checkpoint_path)
+    with pytest.raises(ValueError, match="doesn't match crawl"):
+        make_crawler(FakeParser(), checkpoint_path).run(seeds_path)
+
+
+def test_crawl_retries_chunk_with_failed_upload(seeds_path, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    # Only chunk 1 has jazz seeds
+    checkpoint = make_crawler(FakeParser(failed_genres={"jazz"}), checkpoint_path).run(seeds_path)
+    assert checkpoint.done_chunks == {0, 2}
+    assert checkpoint.n_seeds == 7
+    assert CrawlCheckpoint.load(checkpoint_path) == checkpoint
+
+    parser = FakeParser()
+    checkpoint = make_crawler(parser, checkpoint_path).run(seeds_path)
+    assert sorted(song.name for song in parser.parsed_songs) == ["track 3", "track 4", "track 5"]
+    assert checkpoint.done_chunks == {0, 1, 2}
+    assert checkpoint.n_seeds == checkpoint.n_tracks == 10
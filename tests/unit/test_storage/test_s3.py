@@ -0,0 +1,78 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from playlist_selection.storage import s3
+from playlist_selection.storage.s3 import S3BulkWriter, upload_stream
+
+PART_SIZE = 5 * 2 ** 20 # S3 minimum part size
+
+
+def iter_chunks(content: bytes, chunk_size: int = 2 ** 20):
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+
+def get_content(s3_client, key: str) -> bytes:
+    return s3_client.get_object(Bucket="bucket", Key=key)["Body"].read()
+
+
+def test_upload_stream_small_object_with_single_put(s3_client):
+    content = b"audio" * 1000
+    assert upload_stream(s3_client, "bucket", "small.mp3", iter_chunks(content, 100), part_size=PART_SIZE) == 5000
+    assert get_content(s3_client, "small.mp3") == content
+    assert "-" not in s3_client.head_object(Bucket="bucket", Key="small.mp3")["ETag"]
+
+
+def test_upload_stream_completes_multipart_upload(s3_client):
+    content = bytes(range(256)) * (12 * 2 ** 12)
+    n_bytes = upload_stream(s3_client, "bucket", "large.mp3", iter_chunks(content), part_size=PART_SIZE)
+    assert n_bytes == len(content)
+    assert get_content(s3_client, "large.mp3") == content
+    # Multipart ETag has number of parts as suffix
+    assert s3_client.head_object(Bucket="bucket", Key="large.mp3")["ETag"].strip('"').endswith("-3")
+
+
+def test_upload_stream_aborts_multipart_upload_on_error(s3_client):
+    def failing_chunks():
+        yield from iter_chunks(bytes(6 * 2 ** 20))
+        raise ConnectionError("stream closed")
+
+    with pytest.raises(ConnectionError, match="stream closed"):
+        upload_stream(s3_client, "bucket", "failed.mp3", failing_chunks(), part_size=PART_SIZE)
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket="bucket")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket="bucket")
+
+
+def test_bulk_writer_puts_objects(s3_client):
+    objects = [(f"meta/{i}.json", f'{{"i": {i}}}'.encode()) for i in range(50)]
+    report = S3BulkWriter(s3_client, "bucket", n_jobs=4).put_objects(iter(objects))
+    assert report.n_objects == 50
+    assert report.n_failed == 0
+    assert report.n_bytes == sum(len(body) for _, body in objects)
+    for key, body in objects:
+        assert get_content(s3_client, key) == body
+
+
+def test_bulk_writer_retries_and_counts_failed_objects(s3_client, monkeypatch):
+    monkeypatch.setattr(s3, "S3_RETRY_BACKOFF_SECONDS", 0.0)
+    put_object = s3_client.put_object
+    n_calls = {}
+
+    def flaky_put_object(Key: str, **kwargs):  # noqa: N803
+        n_calls[Key] = n_calls.get(Key, 0) + 1
+        # First object always fails, second one fails only once
+        if Key == "0.json" or (Key == "1.json" and n_calls[Key] == 1):
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+        return put_object(Key=Key, **kwargs)
+
+    monkeypatch.setattr(s3_client, "put_object", flaky_put_object)
+    report = S3BulkWriter(s3_client, "bucket", n_jobs=2, max_retries=2).put_objects(
+        (f"{i}.json", b"{}") for i in range(5)
+    )
+    assert report.n_objects == 4
+    assert report.n_failed == 1
+    assert n_calls["0.json"] == 3
+    assert n_calls["1.json"] == 2
+    assert [obj["Key"] for obj in s3_client.list_objects_v2(Bucket="bucket")["Contents"]] == [
+        "1.json", "2.json", "3.json", "4.json",
+    ]
@@ -0,0 +1,89 @@
+import pickle
+import struct
+
+import orjson
+import pytest
+
+from playlist_selection.tracks import codec
+from playlist_selection.tracks.meta import TrackDetails, TrackMeta, loads_meta
+
+N_TRACKS = 1000
+
+
+@pytest.fixture(scope="module")
+def meta_list() -> list[TrackMeta]:
+    details = {name: 0.5 for name, field in TrackDetails.model_fields.items() if field.annotation == float | None}
+    return [
+        TrackMeta(
+            album_name="альбом",
+            album_id="album_id",
+            album_release_date="1999-12-03",
+            artist_name=["artist", "feat"],
+            artist_id=["artist_id", "feat_id"],
+            track_id=f"track_id_{i}",
+            track_name=f"track {i}",
+            genres=["rock"],
+            track_details=TrackDetails(duration_ms=1000, popularity=50, explicit=bool(i % 2), **details),
+        )
+        for i in range(N_TRACKS)
+    ]
+
+
+def test_roundtrip(meta_list):
+    assert codec.decode_batch(codec.encode_batch(meta_list)) == meta_list
+    assert codec.decode_meta(codec.encode_meta(meta_list[0])) == meta_list[0]
+    assert codec.decode_meta(codec.encode_meta(TrackMeta())) == TrackMeta()
+
+
+def test_encoding_is_smaller_than_json(meta_list):
+    json_size = sum(len(orjson.dumps(meta.model_dump())) for meta in meta_list)
+
+    assert len(codec.encode_batch(meta_list)) < json_size / 2
+
+
+def test_older_data_is_decoded(meta_list):
+    data = bytearray(codec.encode_batch(meta_list[:1]))
+    # Drop last details field like it was encoded before the field was added
+    struct.pack_into("<B", data, 4, len(codec.DETAILS_LAYOUT) - 1)
+    struct.pack_into("<I", data, codec._HEADER.size, struct.unpack_from("<I", data, codec._HEADER.size)[0] - 8)
+    decoded = codec.decode_batch(bytes(data[:-8]))
+
+    assert decoded[0].track_details.segments_min_timbre is None
+    assert decoded[0].track_details.segments_max_timbre == 0.5
+
+
+def test_newer_version_is_rejected(meta_list):
+    data = bytearray(codec.encode_batch(meta_list[:1]))
+    data[3] = codec.CODEC_VERSION + 1
+
+    with pytest.raises(ValueError, match="Unsupported codec version"):
+        codec.decode_batch(bytes(data))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("method", ["codec", "json", "pickle"])
+def test_encode_benchmark(benchmark, meta_list, method):
+    encoders = {
+        "codec": codec.encode_batch,
+        "json": lambda meta_list: b"\n".join(orjson.dumps(meta.model_dump()) for meta in meta_list),
+        "pickle": pickle.dumps,
+    }
+    data = benchmark(encoders[method], meta_list)
+    benchmark.extra_info["size_per_track"] = len(data) / N_TRACKS
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("method", ["codec", "json", "pickle"])
+def test_decode_benchmark(benchmark, meta_list, method):
+    data = {
+        "codec": codec.encode_batch(meta_list),
+        "json": b"\n".join(orjson.dumps(meta.model_dump()) for meta in meta_list),
+        "pickle": pickle.dumps(meta_list),
+    }[method]
+    decoders = {
+        "codec": codec.decode_batch,
+        "json": lambda data: loads_meta(data, ndjson=True),
+        "pickle": pickle.loads,
+    }
+
+    assert benchmark(decoders[method], data) == meta_list
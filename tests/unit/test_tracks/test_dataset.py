@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from playlist_selection.tracks.columnar import TrackBatch
+from playlist_selection.tracks.dataset import S3Dataset
+
+
+@pytest.fixture
+def dataset(make_dataset, make_meta) -> S3Dataset:
+    return make_dataset({
+        "rock/track 0-artist/meta.json": make_meta(0, ["pop", "rock"]),
+        "jazz/track 1-artist/meta.json": make_meta(1, []),
+        "pop/track 2-artist/audio.mp3": b"",
+    }).scan()
+
+
+def test_to_batch_uses_folder_genre(dataset):
+    batch = dataset.to_batch()
+    assert len(batch) == 2
+    assert batch.to_pandas()["genre"].tolist() == ["jazz", "rock"]
+    assert batch.to_pandas()["genre"].tolist() == dataset.to_pandas().dropna(subset="track_id")["genre"].tolist()
+
+
+def test_from_meta_genre_defaults_to_first_meta_genre(make_meta):
+    batch = TrackBatch.from_meta([make_meta(0, ["pop", "rock"]), make_meta(1, [])])
+    assert batch.to_pandas()["genre"].tolist()[0] == "pop"
+    assert batch.to_arrow()["genre"].to_pylist() == ["pop", None]
+
+
+@pytest.fixture
+def s3_objects(make_meta) -> dict:
+    objects = {}
+    for i in range(24):
+        genre = ["jazz", "pop", "rock"][i % 3]
+        objects[f"{genre}/track {i}-artist/meta.json"] = make_meta(i, [genre])
+        objects[f"{genre}/track {i}-artist/audio.mp3"] = b""
+        # Same track in several genre folders
+        if i % 4 == 0:
+            objects[f"blues/track {i}-artist/audio.mp3"] = b""
+    return objects
+
+
+def test_iter_objects_is_ordered_by_key(make_dataset, s3_objects):
+    dataset = make_dataset(s3_objects, list_n_jobs=3)
+    for _ in range(3):
+        assert [obj["Key"] for obj in dataset._iter_objects()] == sorted(f"tracks/{key}" for key in s3_objects)
+
+
+def test_scan_is_deterministic(make_dataset, s3_objects):
+    dataset = make_dataset(s3_objects, n_jobs=4)
+    first = dataset.scan().to_pandas()
+    assert first.loc[first["track_name"] == "track 0", "genre"].tolist() == ["blues"]
+    for _ in range(3):
+        pd.testing.assert_frame_equal(dataset.scan().to_pandas(), first)
@@ -0,0 +1,134 @@
+import os
+import shutil
+import wave
+from unittest import mock
+
+import boto3
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from playlist_selection.tracks import audio as audio_module
+from playlist_selection.tracks.audio import Track
+from playlist_selection.tracks.decoding import AudioCache, decode_audio
+from playlist_selection.tracks.meta import TrackMeta
+
+SAMPLE_RATE = 8000
+N_SAMPLES = SAMPLE_RATE // 2
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg isn't installed")
+
+
+@pytest.fixture
+def sine() -> np.ndarray:
+    return 0.5 * np.sin(2 * np.pi * 440.0 * np.arange(N_SAMPLES) / SAMPLE_RATE)
+
+
+@pytest.fixture
+def wav_path(tmp_path, sine) -> str:
+    path = str(tmp_path / "audio.wav")
+    with wave.open(path, "wb") as fout:
+        fout.setnchannels(1)
+        fout.setsampwidth(2)
+        fout.setframerate(SAMPLE_RATE)
+        fout.writeframes((sine * 32767).astype("<i2").tobytes())
+    return path
+
+
+def iter_chunks(path: str, chunk_size: int = 1000):
+    with open(path, "rb") as fin:
+        while chunk := fin.read(chunk_size):
+            yield chunk
+
+
+def test_decode_audio_from_path(wav_path, sine):
+    audio = decode_audio(wav_path, sample_rate=SAMPLE_RATE)
+    assert audio.dtype == np.float32
+    assert len(audio) == N_SAMPLES
+    np.testing.assert_allclose(audio, sine, atol=1e-3)
+
+
+def test_decode_audio_from_stream(wav_path):
+    audio = decode_audio(iter_chunks(wav_path), sample_rate=SAMPLE_RATE)
+    np.testing.assert_array_equal(audio, decode_audio(wav_path, sample_rate=SAMPLE_RATE))
+
+
+def test_decode_audio_resamples(wav_path):
+    assert len(decode_audio(wav_path, sample_rate=SAMPLE_RATE // 2)) == pytest.approx(N_SAMPLES // 2, abs=10)
+
+
+def test_decode_audio_reraises_stream_error(wav_path):
+    def failing_chunks():
+        yield next(iter_chunks(wav_path))
+        raise ConnectionError("download failed")
+
+    with pytest.raises(ConnectionError, match="download failed"):
+        decode_audio(failing_chunks(), sample_rate=SAMPLE_RATE)
+
+
+def test_decode_audio_fails_on_invalid_data():
+    with pytest.raises(RuntimeError, match="ffmpeg failed"):
+        decode_audio([b"not an audio" * 100], sample_rate=SAMPLE_RATE)
+
+
+def test_audio_cache(tmp_path, sine):
+    cache = AudioCache(str(tmp_path / "cache"))
+    assert cache.get("key", "etag", SAMPLE_RATE) is None
+
+    cached = cache.set("key", "etag", SAMPLE_RATE, sine.astype(np.float32))
+    assert isinstance(cached, np.memmap)
+    np.testing.assert_array_equal(cache.get("key", "etag", SAMPLE_RATE), cached)
+    # Changed audio or other sample rate is other entry
+    assert cache.get("key", "new_etag", SAMPLE_RATE) is None
+    assert cache.get("key", "etag", SAMPLE_RATE * 2) is None
+
+
+def test_audio_cache_evicts_least_recently_used(tmp_path):
+    audio = np.zeros(1000, dtype=np.float32)
+    cache = AudioCache(str(tmp_path / "cache"), max_bytes=int(2.5 * audio.nbytes))
+    for key in ("first", "second"):
+        cache.set(key, "etag", SAMPLE_RATE, audio)
+    # Use makes first entry more recent than second one
+    os.utime(cache._get_path("second", "etag", SAMPLE_RATE), ns=(0, 0))
+    assert cache.get("first", "etag", SAMPLE_RATE) is not None
+
+    cache.set("third", "etag", SAMPLE_RATE, audio)
+    assert cache.get("second", "etag", SAMPLE_RATE) is None
+    assert cache.get("first", "etag", SAMPLE_RATE) is not None
+    assert cache.get("third", "etag", SAMPLE_RATE) is not None
+    assert len(os.listdir(cache.cache_dir)) == 2
+
+
+def make_track(audio_path: str) -> Track:
+    return Track(meta=TrackMeta(track_id="track_id", track_name="track", artist_name=["artist"]), audio_path=audio_path)
+
+
+def test_track_get_audio_from_local_file_is_cached(wav_path, tmp_path):
+    track = make_track(wav_path)
+    cache = AudioCache(str(tmp_path / "cache"))
+    expected = decode_audio(wav_path, sample_rate=SAMPLE_RATE)
+
+    np.testing.assert_array_equal(track.get_audio(sample_rate=SAMPLE_RATE, cache=cache), expected)
+    with mock.patch.object(audio_module, "decode_audio") as decode:
+        np.testing.assert_array_equal(track.get_audio(sample_rate=SAMPLE_RATE, cache=cache), expected)
+    decode.assert_not_called()
+
+
+def test_track_get_audio_from_s3(wav_path, tmp_path):
+    track = make_track("rock/track-artist/audio.wav")
+    expected = decode_audio(wav_path, sample_rate=SAMPLE_RATE)
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="bucket")
+        s3_client.upload_file(Filename=wav_path, Bucket="bucket", Key=track.audio_path)
+        cache = AudioCache(str(tmp_path / "cache"))
+
+        audio = track.get_audio(s3_client=s3_client, bucket_name="bucket", sample_rate=SAMPLE_RATE, cache=cache)
+        np.testing.assert_array_equal(audio, expected)
+        with mock.patch.object(s3_client, "get_object") as get_object:
+            audio = track.get_audio(s3_client=s3_client, bucket_name="bucket", sample_rate=SAMPLE_RATE, cache=cache)
+        get_object.assert_not_called()
+        np.testing.assert_array_equal(audio, expected)
+
+        with pytest.raises(ValueError, match="bucket_name"):
+            track.get_audio(s3_client=s3_client, sample_rate=SAMPLE_RATE)
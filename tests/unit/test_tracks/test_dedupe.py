@@ -0,0 +1,34 @@
+import pandas as pd
+
+from playlist_selection.tracks.dedupe import deduplicate_tracks, normalize_track_name
+
+
+def get_dataset() -> pd.DataFrame:
+    return pd.DataFrame({
+        "track_id": ["a", "b", "a", "c", None],
+        "track_name": ["Song", "Other", "Song", "Song (Remastered 2011) - Live", None],
+        "artist_name": [["Artist"], ["Artist"], ["Artist"], ["ARTIST"], None],
+        "genre": pd.Categorical(["rock", "pop", "jazz", "metal", "rock"]),
+        "genre_labels": [["rock"], ["pop"], ["jazz", "rock"], ["metal"], ["rock"]],
+    })
+
+
+def test_normalize_track_name():
+    assert normalize_track_name("Song (Remastered 2011) - Live") == "song"
+    assert normalize_track_name("Hello,  World!") == "hello world"
+    assert normalize_track_name(None) == ""
+
+
+def test_deduplicate_by_id():
+    result, report = deduplicate_tracks(get_dataset())
+    assert result["track_id"].tolist() == ["a", "b", "c", None]
+    assert result["genre_labels"].tolist() == [["rock", "jazz"], ["pop"], ["metal"], ["rock"]]
+    assert (report.n_rows, report.n_unique, report.n_duplicates_by_id, report.n_duplicates_by_name) == (5, 4, 1, 0)
+    assert report.duplicate_rate == 0.2
+
+
+def test_deduplicate_by_name():
+    result, report = deduplicate_tracks(get_dataset(), by_name=True)
+    assert result["track_id"].tolist() == ["a", "b", None]
+    assert result["genre_labels"].tolist()[0] == ["rock", "jazz", "metal"]
+    assert report.n_duplicates_by_name == 1
@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from playlist_selection.tracks import features as features_module
+
+from playlist_selection.tracks.audio import Track
+from playlist_selection.tracks.decoding import AUDIO_SAMPLE_RATE
+from playlist_selection.tracks.features import (
+    AUDIO_FEATURES,
+    AudioFeaturesExtractor,
+    FeaturesManifest,
+    compute_audio_features,
+    get_shard_index,
+    read_audio_features,
+)
+from playlist_selection.tracks.meta import TrackMeta
+
+N_SHARDS = 4
+
+
+def make_track(i: int) -> Track:
+    meta = TrackMeta(
+        album_name="album",
+        album_release_date="1999",
+        artist_name=["artist"],
+        track_id=f"track_id_{i}",
+        track_name=f"track {i}",
+        genres=["rock"],
+    )
+    return Track(meta=meta, audio_path=f"track {i}-artist/audio.mp3")
+
+
+class FakeExtractor(AudioFeaturesExtractor):
+    """Extractor computing features from track index, tracks in `failed_ids` fail."""
+
+    def __init__(self, output_dir: str, failed_ids: set[str] | None = None):
+        super().__init__(s3_client=None, bucket_name="bucket", output_dir=output_dir, n_shards=N_SHARDS, n_jobs=1)
+        self.failed_ids = failed_ids or set()
+        self.extracted_ids: list[str] = []
+
+    def _extract_shard(self, tracks, process_pool):
+        self.extracted_ids.extend(track.meta.track_id for track in tracks)
+        features = np.array([
+            np.full(len(AUDIO_FEATURES), np.nan if track.meta.track_id in self.failed_ids else float(i))
+            for i, track in enumerate(tracks)
+        ], dtype=np.float32)
+        return features, sum(track.meta.track_id in self.failed_ids for track in tracks)
+
+
+def test_compute_audio_features_finds_pitch_class():
+    time = np.arange(AUDIO_SAMPLE_RATE * 2) / AUDIO_SAMPLE_RATE
+    audio = np.sin(2 * np.pi * 440.0 * time).astype(np.float32)
+    features = compute_audio_features(audio)
+    assert features.shape == (len(AUDIO_FEATURES),)
+    assert features.dtype == np.float32
+    chroma_mean = features[AUDIO_FEATURES.index("chroma_mean_0"):AUDIO_FEATURES.index("chroma_mean_0") + 12]
+    # A is 9th pitch class from C
+    assert np.argmax(chroma_mean) == 9
+
+
+def test_shard_index_is_stable():
+    assert get_shard_index("track_id_1", N_SHARDS) == get_shard_index("track_id_1", N_SHARDS)
+    assert {get_shard_index(f"track_id_{i}", N_SHARDS) for i in range(100)} == set(range(N_SHARDS))
+
+
+def test_extract_shard_counts_failed_tracks(tmp_path):
+    tracks = [make_track(i) for i in range(200)]
+    extractor = AudioFeaturesExtractor(s3_client=None, bucket_name="bucket", output_dir=str(tmp_path), n_jobs=8)
+
+    def fetch(track):
+        if int(track.meta.track_name.split()[-1]) % 3 == 0:
+            raise ConnectionError("download failed")
+        return track.audio_path, "etag", b""
+
+    def extract_features(audio_path, *args):
+        return np.full(len(AUDIO_FEATURES), float(audio_path.split()[1].split("-")[0]), dtype=np.float32)
+
+    with (
+        mock.patch.object(extractor, "_fetch", side_effect=fetch),
+        mock.patch.object(features_module, "_extract_track_features", side_effect=extract_features),
+        ThreadPoolExecutor(max_workers=2) as pool,
+    ):
+        features, n_failed = extractor._extract_shard(tracks, pool)
+    assert n_failed == 67
+    assert np.isnan(features[::3]).all()
+    np.testing.assert_array_equal(features[1::3, 0], np.arange(1, 200, 3))
+
+
+def test_extract_writes_all_tracks(tmp_path):
+    tracks = [make_track(i) for i in range(20)]
+    manifest = FakeExtractor(str(tmp_path)).extract(tracks)
+    assert sum(shard_info.n_tracks for shard_info in manifest.shards.values()) == 20
+    assert FeaturesManifest.load(str(tmp_path)) == manifest
+
+    features = read_audio_features(str(tmp_path))
+    assert sorted(features["track_id"]) == sorted(track.meta.track_id for track in tracks)
+    assert list(features.columns) == ["track_id", *AUDIO_FEATURES]
+
+
+def test_extract_resumes_only_changed_shards(tmp_path):
+    tracks = [make_track(i) for i in range(20)]
+    FakeExtractor(str(tmp_path)).extract(tracks)
+
+    extractor = FakeExtractor(str(tmp_path))
+    extractor.extract(tracks)
+    assert extractor.extracted_ids == []
+
+    # New track changes only its own shard
+    new_track = make_track(20)
+    extractor.extract([*tracks, new_track])
+    new_shard = get_shard_index(new_track.meta.track_id, N_SHARDS)
+    assert sorted(extractor.extracted_ids) == sorted(
+        track.meta.track_id for track in [*tracks, new_track]
+        if get_shard_index(track.meta.track_id, N_SHARDS) == new_shard
+    )
+
+
+def test_extract_retries_shards_with_failed_tracks(tmp_path):
+    tracks = [make_track(i) for i in range(20)]
+    manifest = FakeExtractor(str(tmp_path), failed_ids={"track_id_3"}).extract(tracks)
+    assert sum(shard_info.n_failed for shard_info in manifest.shards.values()) == 1
+    assert read_audio_features(str(tmp_path))["mel_mean_0"].isna().sum() == 1
+
+    extractor = FakeExtractor(str(tmp_path))
+    manifest = extractor.extract(tracks)
+    failed_shard = get_shard_index("track_id_3", N_SHARDS)
+    assert "track_id_3" in extractor.extracted_ids
+    assert all(get_shard_index(track_id, N_SHARDS) == failed_shard for track_id in extractor.extracted_ids)
+    assert sum(shard_info.n_failed for shard_info in manifest.shards.values()) == 0
+    assert not read_audio_features(str(tmp_path))["mel_mean_0"].isna().any()
+
+
+def test_extract_removes_stale_shards(tmp_path):
+    FakeExtractor(str(tmp_path)).extract([make_track(i) for i in range(20)])
+    manifest = FakeExtractor(str(tmp_path)).extract([make_track(0)])
+    assert list(manifest.shards.values())[0].n_tracks == 1
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+
+def test_read_audio_features_verifies_checksum(tmp_path):
+    manifest = FakeExtractor(str(tmp_path)).extract([make_track(0)])
+    (shard_name,) = manifest.shards
+    (tmp_path / shard_name).write_bytes(b"corrupted")
+    with pytest.raises(ValueError, match="Checksum"):
+        read_audio_features(str(tmp_path))
@@ -0,0 +1,69 @@
+import orjson
+import pytest
+
+from playlist_selection.tracks.meta import TrackDetails, TrackMeta, loads_meta
+
+N_TRACKS = 1000
+
+
+@pytest.fixture(scope="module")
+def ndjson() -> bytes:
+    details = {name: 0.5 for name, field in TrackDetails.model_fields.items() if field.annotation == float | None}
+    meta_list = [
+        TrackMeta(
+            album_name="album",
+            album_id="album_id",
+            album_release_date="1999",
+            artist_name=["artist"],
+            artist_id=["artist_id"],
+            track_id=f"track_id_{i}",
+            track_name=f"track {i}",
+            genres=["rock"],
+            track_details=TrackDetails(duration_ms=1000, popularity=50, **details),
+        )
+        for i in range(N_TRACKS)
+    ]
+    return b"\n".join(orjson.dumps(meta.model_dump()) for meta in meta_list)
+
+
+@pytest.mark.parametrize("value,expected", [
+    ("1999", "1999-01-01"),
+    ("1999-12", "1999-12-01"),
+    ("1999-12-03", "1999-12-03"),
+    (None, None),
+])
+def test_release_date_normalization(value, expected):
+    assert TrackMeta(album_release_date=value).album_release_date == expected
+
+
+def test_loads_meta(ndjson):
+    meta_list = loads_meta(ndjson, ndjson=True)
+
+    assert meta_list == [TrackMeta(**orjson.loads(line)) for line in ndjson.splitlines()]
+    assert loads_meta(ndjson.splitlines()[0]) == meta_list[:1]
+
+
+@pytest.mark.slow
+def test_loads_meta_benchmark(benchmark, ndjson):
+    meta_list = benchmark(loads_meta, ndjson, ndjson=True)
+
+    assert len(meta_list) == N_TRACKS
+
+
+@pytest.mark.slow
+def test_per_object_validation_benchmark(benchmark, ndjson):
+    meta_list = benchmark(lambda: [TrackMeta(**orjson.loads(line)) for line in ndjson.splitlines()])
+
+    assert len(meta_list) == N_TRACKS
+
+
+@pytest.mark.slow
+def test_model_construct_benchmark(benchmark, ndjson):
+    def construct(line: bytes) -> TrackMeta:
+        params = orjson.loads(line)
+        params["track_details"] = TrackDetails.model_construct(**params["track_details"])
+        return TrackMeta.model_construct(**params)
+
+    meta_list = benchmark(lambda: [construct(line) for line in ndjson.splitlines()])
+
+    assert len(meta_list) == N_TRACKS